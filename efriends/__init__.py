@@ -3,8 +3,13 @@ from efriends.texts import Texts
 from efriends.structs import Structs
 from efriends.utils import Utils
 from efriends.logger import Logger
-from efriends.cipher import Cipher
+from efriends.metrics import Metrics
+from efriends.profiler import Profiler
+from efriends.cipher import Cipher, CipherSuite
 from efriends.dbase import Dbase
+from efriends.imagecache import ImageCache
+from efriends.scheduler import Scheduler
+from efriends.sessionstore import SessionStore
 from efriends.reports import Reports
 from efriends.controls import Controls
 from efriends.views import Views
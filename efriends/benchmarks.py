@@ -0,0 +1,613 @@
+# coding: utf-8     # noqa: E902
+#!/usr/bin/python3  # noqa: E265
+
+"""
+Performance benchmarks for efriends.
+
+Every benchmark runs against synthetic databases written to a
+scratch directory, never against the user's own efriends.db.
+Results are printed as JSON so runs can be compared over time;
+--out also writes them to a file.
+
+Run from the efriends directory, like:
+`python3 benchmarks.py db --citizens 2000 --depths 10 --out db.json`
+`python3 benchmarks.py history --citizens 2000 --depths 1 10 50`
+`python3 benchmarks.py profiles --citizens 2000`
+`python3 benchmarks.py dims --citizens 2000 --depths 10`
+`python3 benchmarks.py fingerprints --citizens 20000`
+`python3 benchmarks.py collect --citizens 200 --latency-ms 150`
+
+The collect benchmark runs Controls end-to-end against a local
+stand-in for eRepublik (see erepstub.py), with $HOME pointed at the
+scratch directory for the duration of the run.
+
+Module:    benchmarks.py
+Class:     Benchmarks/0  inherits object
+Author:    PQ <pq_rfw @ pm.me>
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sqlite3 as sq3
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+from os import path
+from pprint import pprint as pp  # noqa: F401
+
+from controls import Controls
+from dbase import Dbase
+from erepstub import ErepStub
+from metrics import Metrics
+from structs import Structs
+from utils import Utils
+
+MT = Metrics()
+ST = Structs()
+UT = Utils()
+
+
+class Benchmarks(object):
+    """Synthetic data generators and timers for efriends."""
+
+    def __init__(self, p_work_dir: str = None):
+        """Initialize Benchmarks object.
+
+        Args:
+            p_work_dir (str, optional): where to write scratch databases.
+                Defaults to a new temporary directory.
+        """
+        self.work_dir = p_work_dir if p_work_dir is not None\
+            else tempfile.mkdtemp(prefix="efriends_bench_")
+        self.base_dttm = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+    def format_ts(self, p_minutes: int) -> str:
+        """Make an audit timestamp some minutes after the base time.
+
+        Args:
+            p_minutes (int): offset from base time
+
+        Returns:
+            str: UTC date time (YYYY-MM-DD HH:mm:ss.SSSSS ZZ)
+        """
+        dttm = self.base_dttm + timedelta(minutes=p_minutes)
+        return dttm.strftime("%Y-%m-%d %H:%M:%S.%f")[:-1] + " +00:00"
+
+    def make_citizen_data(self,
+                          p_profile_id: int,
+                          p_version: int) -> dict:
+        """Make one plausible-looking citizen "data" record.
+
+        Args:
+            p_profile_id (int): synthetic eRepublik profile ID
+            p_version (int): version number, drives changing values
+
+        Returns:
+            dict: mirrors ST.CitizenFields
+        """
+        rnd = random.Random(p_profile_id)
+        party = rnd.randint(1, 300)
+        unit = rnd.randint(1, 500)
+        data = dict()
+        for cnm in ST.CitizenFields.keys():
+            data[cnm] = None
+        data.update({
+            "profile_id": str(p_profile_id),
+            "name": "citizen_{}".format(p_profile_id),
+            "is_user_friend": str(rnd.random() < 0.1),
+            "is_alive": "True",
+            "is_adult": "True",
+            "avatar_link": "https://cdn.example/{}.jpg".format(p_profile_id),
+            "level": str(rnd.randint(1, 50) + p_version),
+            "xp": str(rnd.randint(100, 9000) + p_version * 150),
+            "friends_count": str(rnd.randint(0, 900) + p_version),
+            "achievements_count": str(rnd.randint(0, 80)),
+            "citizenship_country": "Country_{}".format(party % 40),
+            "residence_city": "City_{}".format(unit % 200),
+            "residence_region": "Region_{}".format(unit % 90),
+            "residence_country": "Country_{}".format(unit % 40),
+            "is_in_congress": "False",
+            "is_party_member": "True",
+            "party_name": "Party {}".format(party),
+            "party_url": "https://www.erepublik.com/en/party/p-{}/1".format(
+                party),
+            "party_avatar_link": "https://cdn.example/party/{}.jpg".format(
+                party),
+            "party_orientation": "Center",
+            "militia_name": "Unit {}".format(unit),
+            "militia_url": "https://www.erepublik.com/en/military/" +
+                           "military-unit/{}/overview".format(unit),
+            "militia_size": str(rnd.randint(5, 300)),
+            "militia_avatar_link": "https://cdn.example/mu/{}.jpg".format(
+                unit),
+            "military_rank": "Captain",
+            "aircraft_rank": "Airman",
+            "ground_rank": "Colonel"})
+        return data
+
+    def make_legacy_db(self,
+                       p_citizens: int,
+                       p_depth: int) -> str:
+        """Generate a main db in the original single-table layout.
+
+        Every citizen gets p_depth versions. All but the newest
+        are logically deleted, exactly as the upsert path leaves them.
+
+        Args:
+            p_citizens (int): number of distinct profile IDs
+            p_depth (int): number of versions per citizen
+
+        Returns:
+            str: full path to the generated db file
+        """
+        db_file = path.join(self.work_dir, "legacy_{}_{}.db".format(
+            p_citizens, p_depth))
+        DB = Dbase(db_file)
+        DB.create_tables(db_file)
+        col_nms = ST.CitizenFields.keys() + ST.AuditFields.keys()
+        sql = "INSERT INTO citizen ({}) VALUES ({});".format(
+            ", ".join(col_nms), ", ".join(["?"] * len(col_nms)))
+        rows = list()
+        for pid in range(1, p_citizens + 1):
+            oid = UT.get_uid()
+            create_ts = self.format_ts(pid)
+            for ver in range(p_depth):
+                data = self.make_citizen_data(pid, ver)
+                upd_ts = self.format_ts(pid + ver * 1440)
+                del_ts = self.format_ts(pid + (ver + 1) * 1440)\
+                    if ver < p_depth - 1 else None
+                audit = {"uid": UT.get_uid(),
+                         "hash_id": UT.get_hash(str(data)),
+                         "oid": oid,
+                         "create_ts": create_ts,
+                         "update_ts": upd_ts,
+                         "delete_ts": del_ts}
+                rows.append([data[c] for c in ST.CitizenFields.keys()] +
+                            [audit[c] for c in ST.AuditFields.keys()])
+        conn = sq3.connect(db_file)
+        with conn:
+            conn.executemany(sql, rows)
+        conn.close()
+        return db_file
+
+    def make_main_db(self,
+                     p_citizens: int,
+                     p_depth: int) -> str:
+        """Generate a main db in the current schema.
+
+        Built in the original layout, then taken through every
+        migration, exactly as an upgraded user DB would be.
+
+        Args:
+            p_citizens (int): number of distinct profile IDs
+            p_depth (int): number of versions per citizen
+
+        Returns:
+            str: full path to the generated db file
+        """
+        db_file = self.make_legacy_db(p_citizens, p_depth)
+        Dbase(db_file).migrate_db(db_file)
+        return db_file
+
+    def time_calls(self,
+                   p_func: object,
+                   p_args_list: list) -> dict:
+        """Time a function over a list of argument tuples.
+
+        Args:
+            p_func (object): callable to time
+            p_args_list (list): of tuples, one per call
+
+        Returns:
+            dict: calls, total_s, per_call_ms, p50_ms, p95_ms
+        """
+        call_ms = list()
+        for args in p_args_list:
+            start = time.perf_counter()
+            p_func(*args)
+            call_ms.append((time.perf_counter() - start) * 1000)
+        total = sum(call_ms) / 1000
+        call_ms.sort()
+        return {"calls": len(p_args_list),
+                "total_s": round(total, 4),
+                "per_call_ms": round(total * 1000 / len(p_args_list), 4),
+                "p50_ms": round(call_ms[len(call_ms) // 2], 4),
+                "p95_ms": round(call_ms[int(len(call_ms) * 0.95)], 4)}
+
+    def bench_history_depth(self,
+                            p_citizens: int = 1000,
+                            p_depths: list = None,
+                            p_lookups: int = 200) -> list:
+        """Compare profile_id lookups before and after the history split.
+
+        "legacy" is the old MAX(update_ts) query over every version.
+        "current" is query_citizen_by_profile_id on citizen_current,
+        after migrating the very same database.
+
+        Args:
+            p_citizens (int): number of distinct profile IDs
+            p_depths (list): versions per citizen to try
+            p_lookups (int): lookups to time per depth
+
+        Returns:
+            list: of dicts, one per depth
+        """
+        col_nms_txt = ", ".join(ST.CitizenFields.keys() +
+                                ST.AuditFields.keys())
+        legacy_sql = "SELECT {}, MAX(update_ts) FROM citizen ".format(
+            col_nms_txt) + "WHERE profile_id = ? AND delete_ts IS NULL;"
+
+        def legacy_lookup(p_profile_id: str):
+            conn = sq3.connect(db_file)
+            result = conn.execute(legacy_sql, [p_profile_id]).fetchall()
+            conn.close()
+            return DB.format_query_result("citizen", result)
+
+        results = list()
+        rnd = random.Random(42)
+        for depth in (p_depths or [1, 5, 20]):
+            db_file = self.make_legacy_db(p_citizens, depth)
+            DB = Dbase(db_file)
+            args = [(str(rnd.randint(1, p_citizens)),)
+                    for _ in range(p_lookups)]
+            legacy = self.time_calls(legacy_lookup, args)
+            start = time.perf_counter()
+            DB.migrate_db(db_file)
+            migrate_s = time.perf_counter() - start
+            current = self.time_calls(DB.query_citizen_by_profile_id, args)
+            results.append({
+                "citizens": p_citizens,
+                "depth": depth,
+                "history_rows": p_citizens * depth,
+                "migrate_s": round(migrate_s, 4),
+                "legacy_ms": legacy["per_call_ms"],
+                "current_ms": current["per_call_ms"],
+                "speedup": round(legacy["per_call_ms"] /
+                                 current["per_call_ms"], 2)})
+        return results
+
+    def bench_db_profiles(self,
+                          p_citizens: int = 1000,
+                          p_lookups: int = 500) -> list:
+        """Compare write throughput and read latency per tuning profile.
+
+        "sqlite_default" is what connections got before profiles
+        existed: rollback journal, synchronous=FULL, small cache.
+
+        Args:
+            p_citizens (int): number of citizens to add, then update
+            p_lookups (int): profile_id lookups to time
+
+        Returns:
+            list: of dicts, one per profile
+        """
+        sqlite_default = {"journal_mode": "DELETE", "synchronous": "FULL",
+                          "cache_size": -2000, "mmap_size": 0,
+                          "temp_store": "DEFAULT"}
+        runs = [("sqlite_default", ST.DbProfile.SAFE, sqlite_default)]
+        for prof in (ST.DbProfile.SAFE, ST.DbProfile.NORMAL,
+                     ST.DbProfile.BULK):
+            runs.append((prof, prof, None))
+        results = list()
+        rnd = random.Random(42)
+        for run_nm, profile, overrides in runs:
+            db_file = path.join(self.work_dir,
+                                "profile_{}.db".format(run_nm))
+            DB = Dbase(db_file)
+            DB.set_db_profile(profile, overrides)
+            DB.create_main_db()
+            adds = self.time_calls(
+                DB.write_db,
+                [("add", "citizen", self.make_citizen_data(pid, 0))
+                 for pid in range(1, p_citizens + 1)])
+            upds = list()
+            for pid in range(1, p_citizens + 1):
+                rec = DB.query_citizen_by_profile_id(str(pid))
+                upds.append(("upd", "citizen", self.make_citizen_data(pid, 1),
+                             rec["audit"]["oid"]))
+            upds = self.time_calls(DB.write_db, upds)
+            reads = self.time_calls(
+                DB.query_citizen_by_profile_id,
+                [(str(rnd.randint(1, p_citizens)),)
+                 for _ in range(p_lookups)])
+            results.append({
+                "profile": run_nm,
+                "adds_per_s": round(
+                    adds["calls"] / max(adds["total_s"], 0.0001), 1),
+                "upds_per_s": round(
+                    upds["calls"] / max(upds["total_s"], 0.0001), 1),
+                "read_ms": reads["per_call_ms"]})
+        return results
+
+    def bench_dims(self,
+                   p_citizens: int = 1000,
+                   p_depth: int = 10,
+                   p_lookups: int = 20) -> dict:
+        """Compare size and group-by time before and after lookup tables.
+
+        The same database is measured with migrations up to typed
+        columns, then again after migrate_citizen_dims. Both sizes
+        are taken after a VACUUM. "after" also times the same
+        group-bys done on lookup keys, then joined to the lookups.
+
+        Args:
+            p_citizens (int): number of distinct profile IDs
+            p_depth (int): number of versions per citizen
+            p_lookups (int): times to run each group-by query
+
+        Returns:
+            dict: sizes in bytes and per-query times in ms
+        """
+        group_sqls = {
+            "party_history":
+                "SELECT party_name, COUNT(*) FROM citizen_history " +
+                "GROUP BY party_name;",
+            "country_current":
+                "SELECT citizenship_country, COUNT(*) FROM citizen " +
+                "GROUP BY citizenship_country;"}
+        keyed_sqls = {
+            "party_history_keyed":
+                "SELECT p.name, f.cnt FROM (SELECT party_id, COUNT(*) cnt " +
+                "FROM citizen_history_fact GROUP BY party_id) f " +
+                "LEFT JOIN party p ON p.party_id = f.party_id;",
+            "country_current_keyed":
+                "SELECT l.country, f.cnt FROM (SELECT citizenship_id, " +
+                "COUNT(*) cnt FROM citizen_current_fact " +
+                "GROUP BY citizenship_id) f " +
+                "LEFT JOIN location l ON l.location_id = f.citizenship_id;"}
+
+        def measure(p_db_file: str, p_sqls: dict) -> dict:
+            conn = sq3.connect(p_db_file)
+            conn.execute("VACUUM;")
+            stats = {"bytes": path.getsize(p_db_file)}
+            for sql_nm, sql in p_sqls.items():
+                stats[sql_nm + "_ms"] = self.time_calls(
+                    lambda: conn.execute(sql).fetchall(),
+                    [()] * p_lookups)["per_call_ms"]
+            conn.close()
+            return stats
+
+        db_file = self.make_legacy_db(p_citizens, p_depth)
+        DB = Dbase(db_file)
+        all_migrations = DB.migrations
+        DB.migrations = all_migrations[:all_migrations.index(
+            DB.migrate_citizen_dims)]
+        DB.migrate_db(db_file)
+        before = measure(db_file, group_sqls)
+        DB.migrations = all_migrations
+        DB.migrate_db(db_file)
+        after = measure(db_file, {**group_sqls, **keyed_sqls})
+        return {"citizens": p_citizens,
+                "depth": p_depth,
+                "before": before,
+                "after": after,
+                "size_ratio": round(after["bytes"] / before["bytes"], 3)}
+
+    def bench_fingerprints(self,
+                           p_citizens: int = 10000) -> list:
+        """Compare row fingerprints per second for each algorithm.
+
+        "legacy" is the original hash_id: all non-empty values
+        run together into one string, then SHA-256.
+
+        Args:
+            p_citizens (int): number of citizen rows to fingerprint
+
+        Returns:
+            list: of dicts, one per algorithm
+        """
+        DB = Dbase(path.join(self.work_dir, "fingerprints.db"))
+        rows = [DB.cast_data_values("citizen", self.make_citizen_data(pid, 0))
+                for pid in range(1, p_citizens + 1)]
+
+        def legacy(p_row: dict) -> str:
+            return UT.get_hash("".join(
+                [str(val) for val in p_row.values()
+                 if val not in (None, "None", "")]))
+
+        runs = [("legacy", legacy)]
+        for algo in ST.FingerprintAlgo.keys():
+            algo_nm = getattr(ST.FingerprintAlgo, algo)
+            runs.append((algo_nm, lambda p_row, p_algo=algo_nm:
+                         UT.get_fingerprint(list(p_row.values()), p_algo)))
+        results = list()
+        for run_nm, func in runs:
+            timing = self.time_calls(func, [(row,) for row in rows])
+            results.append({
+                "algo": run_nm,
+                "per_s": round(
+                    timing["calls"] / max(timing["total_s"], 0.0001),
+                    1)})
+        return results
+
+    def bench_db_layer(self,
+                       p_citizens: int = 1000,
+                       p_depth: int = 5,
+                       p_ops: int = 200) -> dict:
+        """Time the main Dbase read, write and report paths.
+
+        Args:
+            p_citizens (int): number of distinct profile IDs
+            p_depth (int): number of versions per citizen
+            p_ops (int): calls to time per operation
+
+        Returns:
+            dict: "env" describing the run, "results" per operation
+        """
+        db_file = self.make_main_db(p_citizens, p_depth)
+        DB = Dbase(db_file)
+        rnd = random.Random(42)
+        pids = [str(rnd.randint(1, p_citizens)) for _ in range(p_ops)]
+        upd_pids = rnd.sample(range(1, p_citizens + 1),
+                              min(p_ops, p_citizens))
+        oids = dict((pid, DB.query_citizen_by_profile_id(
+            str(pid))["audit"]["oid"]) for pid in upd_pids)
+        results = dict()
+        results["query_citizen_by_profile_id"] = self.time_calls(
+            DB.query_citizen_by_profile_id, [(pid,) for pid in pids])
+        results["query_citizen_by_name"] = self.time_calls(
+            DB.query_citizen_by_name,
+            [("citizen_{}".format(pid),) for pid in pids])
+        results["query_for_profile_id_list"] = self.time_calls(
+            DB.query_for_profile_id_list, [()] * max(5, p_ops // 20))
+        results["write_db_add"] = self.time_calls(
+            DB.write_db,
+            [("add", "citizen", self.make_citizen_data(pid, 0))
+             for pid in range(p_citizens + 1, p_citizens + p_ops + 1)])
+        results["write_db_upd"] = self.time_calls(
+            DB.write_db,
+            [("upd", "citizen", self.make_citizen_data(pid, p_depth),
+              oids[pid]) for pid in upd_pids])
+        results["write_db_upd_unchanged"] = self.time_calls(
+            DB.write_db,
+            [("upd", "citizen", self.make_citizen_data(pid, p_depth),
+              oids[pid]) for pid in upd_pids])
+        results["write_db_del"] = self.time_calls(
+            DB.write_db,
+            [("del", "citizen", None, oids[pid]) for pid in upd_pids])
+        col_nms_txt = ", ".join(ST.CitizenFields.keys() +
+                                ST.AuditFields.keys())
+        conn = sq3.connect(db_file)
+        raw_rows = conn.execute("SELECT {} FROM citizen_history;".format(
+            col_nms_txt)).fetchall()
+        conn.close()
+        batches = [(raw_rows[ix:ix + 100],)
+                   for ix in range(0, len(raw_rows), 100)][:p_ops]
+        results["format_query_result_100_rows"] = self.time_calls(
+            lambda p_rows: DB.format_query_result("citizen", p_rows),
+            batches)
+        saved_sqls = {
+            "count_by_country":
+                "SELECT COUNT(name) AS Citizens,\n" +
+                "       citizenship_country AS Country\n" +
+                "  FROM citizen\n WHERE delete_ts IS NULL and is_alive = 1" +
+                "\n GROUP BY country\n ORDER BY citizens DESC, " +
+                "country ASC;",
+            "party_levels":
+                "SELECT party_name, COUNT(*) AS citizens, " +
+                "AVG(level) AS avg_level\n  FROM citizen\n" +
+                " GROUP BY party_name ORDER BY citizens DESC;"}
+        for sql_nm, sql in saved_sqls.items():
+            sql_file = path.join(self.work_dir, sql_nm + ".sql")
+            with open(sql_file, "w") as sqf:
+                sqf.write(sql)
+            results["saved_sql_" + sql_nm] = self.time_calls(
+                DB.query_citizen_sql, [(sql_file,)] * max(5, p_ops // 10))
+        return {"env": {"citizens": p_citizens,
+                        "depth": p_depth,
+                        "ops": p_ops,
+                        "schema_version": len(DB.migrations),
+                        "sqlite": sq3.sqlite_version,
+                        "python": platform.python_version(),
+                        "ts": UT.get_utc_ts()},
+                "results": results}
+
+    def bench_collection(self,
+                         p_citizens: int = 100,
+                         p_latency_ms: float = 0.0,
+                         p_error_rate: float = 0.0,
+                         p_rate_limit: float = 0.0,
+                         p_request_delay: float = 0.0) -> dict:
+        """Time friends and ID-list refreshes against a local eRep stub.
+
+        Args:
+            p_citizens (int): size of the user's friends list
+            p_latency_ms (float): stub latency per request
+            p_error_rate (float): share of stub requests that 503
+            p_rate_limit (float): stub requests per second. 0 = no limit.
+            p_request_delay (float): Controls pause between citizens.
+                The app uses 0.3 seconds.
+
+        Returns:
+            dict: "env" describing the run, "results" per refresh
+        """
+        home = path.join(self.work_dir, "home")
+        os.makedirs(home, exist_ok=True)
+        prev_home = os.environ.get("HOME")
+        os.environ["HOME"] = home
+        stub = ErepStub(p_friends=p_citizens, p_latency_ms=p_latency_ms,
+                        p_error_rate=p_error_rate, p_rate_limit=p_rate_limit)
+        stub.start()
+        results = dict()
+        try:
+            CN = Controls()
+            CN.set_erep_headers()
+            CN.set_base_urls(stub.erep_url, stub.etools_url)
+            CN.request_delay = p_request_delay
+            CN.configure_database()
+            CN.write_user_rec("1000", "bench@example.com", "bench")
+            runs = (("friends", lambda: CN.get_erep_friends_data("1000")),
+                    ("id_list", CN.refresh_ctzn_data_from_db))
+            for run_nm, run_func in runs:
+                start = time.perf_counter()
+                with redirect_stdout(io.StringIO()):
+                    run_func()
+                elapsed = time.perf_counter() - start
+                snap = MT.get_snapshot()
+                stored = snap["counters"]["rows_added"] +\
+                    snap["counters"]["rows_updated"] +\
+                    snap["counters"]["rows_unchanged"]
+                results[run_nm] = {
+                    "citizens": stored,
+                    "elapsed_s": round(elapsed, 4),
+                    "citizens_per_s": round(stored / elapsed, 2),
+                    "counters": snap["counters"],
+                    "timers": snap["timers"]}
+        finally:
+            stub.stop()
+            if prev_home is not None:
+                os.environ["HOME"] = prev_home
+        return {"env": {"citizens": p_citizens,
+                        "latency_ms": p_latency_ms,
+                        "error_rate": p_error_rate,
+                        "rate_limit": p_rate_limit,
+                        "request_delay": p_request_delay,
+                        "python": platform.python_version(),
+                        "ts": UT.get_utc_ts()},
+                "stub": stub.stats,
+                "results": results}
+
+
+# ======================
+# Main
+# ======================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="efriends benchmarks")
+    parser.add_argument("bench", choices=["db", "history", "profiles",
+                                          "dims", "fingerprints", "collect"])
+    parser.add_argument("--citizens", type=int, default=1000)
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    parser.add_argument("--request-delay", type=float, default=0.0)
+    parser.add_argument("--out", default=None,
+                        help="also write the JSON results to this file")
+    args = parser.parse_args()
+    BM = Benchmarks()
+    if args.bench == "db":
+        result = BM.bench_db_layer(args.citizens, args.depths[0],
+                                   args.lookups)
+    elif args.bench == "history":
+        result = BM.bench_history_depth(args.citizens, args.depths,
+                                        args.lookups)
+    elif args.bench == "profiles":
+        result = BM.bench_db_profiles(args.citizens, args.lookups)
+    elif args.bench == "dims":
+        result = BM.bench_dims(args.citizens, args.depths[0], args.lookups)
+    elif args.bench == "fingerprints":
+        result = BM.bench_fingerprints(args.citizens)
+    elif args.bench == "collect":
+        result = BM.bench_collection(args.citizens, args.latency_ms,
+                                     args.error_rate, args.rate_limit,
+                                     args.request_delay)
+    print(json.dumps(result, indent=2))
+    if args.out is not None:
+        with open(args.out, "w") as outf:
+            json.dump(result, outf, indent=2)
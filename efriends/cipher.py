@@ -5,14 +5,90 @@
 Basic encryption methods.
 
 Module:    cipher
-Class:     Cipher
+Class:     Cipher, CipherSuite
 Author:    PQ <pq_rfw @ pm.me>
 """
+from functools import lru_cache
 from pprint import pprint as pp  # noqa: F401
 
 from cryptography.fernet import Fernet
 
 
+class CipherSuite(object):
+    """Encrypt/decrypt strings and rows with one key.
+
+    The Fernet object is built once, when the suite is created.
+    """
+
+    def __init__(self, p_key: bytes):
+        """Initialize CipherSuite object.
+
+        Args:
+            p_key (bytes): encryption key to bind to
+        """
+        self.fernet = Fernet(p_key)
+
+    def encrypt(self, p_plaintext: str) -> str:
+        """Return encrypted version of the plaintext.
+
+        Args:
+            p_plaintext (string): data to be encrypted
+
+        Returns:
+            string: encrypted version of data
+        """
+        encoded_bytes = self.fernet.encrypt(bytes(p_plaintext, 'utf-8'))
+        return encoded_bytes.decode("utf-8")
+
+    def decrypt(self, p_encrypted: str) -> str:
+        """Return decrypted version of the encrypted data.
+
+        Args:
+            p_encrypted (string):  data encrypted using encrypt()
+
+        Returns:
+            string: decrypted value
+        """
+        decoded_str = self.fernet.decrypt(bytes(p_encrypted, 'utf-8'))
+        return decoded_str.decode("utf-8")
+
+    def encrypt_row(self,
+                    p_row: dict,
+                    p_skip_cols: tuple = ("encrypt_key",)) -> dict:
+        """Encrypt every non-empty value of a row.
+
+        Args:
+            p_row (dict): column name: plaintext value
+            p_skip_cols (tuple): columns to leave as-is
+
+        Returns:
+            dict: copy of the row with encrypted values
+        """
+        row = dict(p_row)
+        for cnm, val in p_row.items():
+            if cnm not in p_skip_cols and val not in (None, "None", ""):
+                row[cnm] = self.encrypt(str(val))
+        return row
+
+    def decrypt_row(self,
+                    p_row: dict,
+                    p_skip_cols: tuple = ("encrypt_key",)) -> dict:
+        """Decrypt every non-empty value of a row.
+
+        Args:
+            p_row (dict): column name: encrypted value
+            p_skip_cols (tuple): columns to leave as-is
+
+        Returns:
+            dict: copy of the row with decrypted values
+        """
+        row = dict(p_row)
+        for cnm, val in p_row.items():
+            if cnm not in p_skip_cols and val not in (None, "None", ""):
+                row[cnm] = self.decrypt(val)
+        return row
+
+
 class Cipher(object):
     """Generic methods to encrypt/decrypt a string."""
 
@@ -26,6 +102,19 @@ class Cipher(object):
         encrypt_key = Fernet.generate_key()
         return encrypt_key
 
+    @classmethod
+    @lru_cache(maxsize=8)
+    def get_suite(cls, p_key: bytes) -> CipherSuite:
+        """Get the cipher suite bound to a key, reused across calls.
+
+        Args:
+            p_key (bytes): encryption key
+
+        Returns:
+            CipherSuite: bound to p_key
+        """
+        return CipherSuite(p_key)
+
     @classmethod
     def encrypt(cls, p_plaintext: str, p_key: bytes) -> str:
         """Return encrypted version of the plaintext.
@@ -37,9 +126,7 @@ class Cipher(object):
         Returns:
             string: encrypted version of data
         """
-        cipher_suite = Fernet(p_key)
-        encoded_bytes = cipher_suite.encrypt(bytes(p_plaintext, 'utf-8'))
-        return encoded_bytes.decode("utf-8")
+        return cls.get_suite(p_key).encrypt(p_plaintext)
 
     @classmethod
     def decrypt(cls, p_encrypted: str, p_key: str) -> str:
@@ -52,7 +139,4 @@ class Cipher(object):
         Returns:
             string: decrypted value
         """
-        cipher_suite = Fernet(p_key)
-        decoded_str = cipher_suite.decrypt(bytes(p_encrypted, 'utf-8'))
-        decoded_str = decoded_str.decode("utf-8")
-        return decoded_str
+        return cls.get_suite(p_key).decrypt(p_encrypted)
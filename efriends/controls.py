@@ -8,10 +8,13 @@ Module:    controls.py
 Class:     Controls/0  inherits object
 Author:    PQ <pq_rfw @ pm.me>
 """
+import codecs
 import json
+import os
 import sys
 import time
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from copy import copy
 from os import path
 from pathlib import Path
@@ -21,11 +24,17 @@ import requests
 
 from dbase import Dbase
 from logger import Logger
+from metrics import Metrics
+from scheduler import Scheduler
+from sessionstore import SessionStore
 from structs import Structs
 from texts import Texts
 from utils import Utils
 
 DB = Dbase()
+MT = Metrics()
+SC = Scheduler()
+SS = SessionStore()
 ST = Structs()
 TX = Texts()
 UT = Utils()
@@ -37,6 +46,27 @@ class Controls(object):
     def __init__(self):
         """Initialize Controls object."""
         self.logme = False
+        self.user_rec_ttl = 300.0
+        self.user_rec_cache = None
+        self.metrics_to_file = False
+        # Pause between eRep calls, so as not to look like a DDOS attack.
+        self.request_delay = 0.3
+        # Extra tries for a 429 or 5xx answer from eRep.
+        self.request_retries = 2
+        # Runs that try an ID before it goes to the dead-letter list.
+        self.job_max_attempts = 3
+        # Profile requests a scheduled refresh run may spend.
+        self.refresh_budget = 200
+        # Hops a friend-of-friend crawl goes out from its seeds.
+        self.crawl_depth = 1
+        # Seconds a checked eRep session is trusted without a new check.
+        self.session_check_ttl = 60.0
+        self.session_checked = None
+        # Days a remote name lookup is trusted, if found or not found.
+        self.name_found_ttl_days = 30.0
+        self.name_missing_ttl_days = 1.0
+        self.set_base_urls(os.environ.get("EFRIENDS_EREP_URL"),
+                           os.environ.get("EFRIENDS_ETOOLS_URL"))
 
     def check_python_version(self):
         """Validate Python version."""
@@ -63,9 +93,26 @@ class Controls(object):
                           'Ubuntu Chromium/31.0.1650.63 ' +
                           'Chrome/31.0.1650.63 Safari/537.36'}
         self.etools_rqst = requests.Session()
+        self.set_base_urls()
+
+    def set_base_urls(self,
+                      p_erep_url: str = None,
+                      p_etools_url: str = None):
+        """Point eRepublik and erepublik.tools calls at other servers.
+
+        Used to run against a local stand-in, e.g. erepstub.py.
+        None leaves a URL as it is.
+
+        Args:
+            p_erep_url (str, optional): replaces TX.urls.u_erep
+            p_etools_url (str, optional): replaces TX.urls.u_etools
+        """
+        if p_erep_url:
+            TX.urls.u_erep = p_erep_url.rstrip("/")
+        if p_etools_url:
+            TX.urls.u_etools = p_etools_url.rstrip("/")
         self.etools_ctzn_bynm_url =\
-            "https://api.erepublik.tools/v0/citizen?" +\
-            "name=~NAME~&page=1&key=~KEY~"
+            TX.urls.u_etools + "/citizen?name=~NAME~&page=1&key=~KEY~"
 
     def configure_database(self):
         """Instantiate Dbase object.
@@ -102,10 +149,26 @@ class Controls(object):
             aud = UT.make_namedtuple("aud", p_data_rows["audit"])
             return (dat, aud)
 
-    def get_user_db_record(self) -> tuple:
-        """Query data base for most current user record, decrypted."""
-        return self.convert_data_record(
-            DB.query_user())
+    def get_user_db_record(self, p_refresh: bool = False) -> tuple:
+        """Query data base for most current user record, decrypted.
+
+        The decrypted record is kept in memory for user_rec_ttl
+        seconds, and dropped whenever write_user_rec() runs.
+
+        Args:
+            p_refresh (bool): If True, ignore the cached record.
+        """
+        cache = self.user_rec_cache
+        if not p_refresh and cache is not None\
+                and UT.get_monotonic() < cache[0]:
+            MT.incr("user_cache_hits")
+            return cache[1]
+        MT.incr("user_cache_misses")
+        user_rec = self.convert_data_record(DB.query_user())
+        if user_rec[0] is not None:
+            self.user_rec_cache =\
+                (UT.get_monotonic() + self.user_rec_ttl, user_rec)
+        return user_rec
 
     def get_ctzn_db_rec_by_id(self, p_profile_id: str) -> tuple:
         """Query data base for most current citizen record.
@@ -126,11 +189,14 @@ class Controls(object):
             DB.query_citizen_by_name(p_citzn_nm))
 
     def enable_logging(self,
-                       p_log_level: str = 'INFO'):
+                       p_log_level: str = 'INFO',
+                       p_component_levels: dict = None):
         """Assign log file location. Instantiate Logger object.
 
         Args:
             p_log_level (str): valid logging level key. Default=INFO.
+            p_component_levels (dict): Optional. {component: level key}
+                to override p_log_level, e.g. {"dbase": "DEBUG"}
         """
         if not self.logme:
             if p_log_level is None or p_log_level not in ST.LogLevel.keys():
@@ -143,7 +209,8 @@ class Controls(object):
                     raise Exception(IOError, msg)
                 log_full_path = path.join(log_path, TX.dbs.log_name)
                 self.logme = True
-                self.LOG = Logger(log_full_path, log_level)
+                self.LOG = Logger(log_full_path, log_level,
+                                  p_component_levels)
                 self.LOG.set_log()
                 msg = TX.logm.ll_log_loc + log_full_path
                 self.LOG.write_log(ST.LogLevel.INFO, msg)
@@ -168,6 +235,66 @@ class Controls(object):
         self.enable_logging(p_log_level)
         return self.logme
 
+    def write_run_summary(self, p_run_nm: str) -> dict:
+        """Emit metrics of the current run to the log and metrics file.
+
+        The metrics file is written only if self.metrics_to_file is True.
+
+        Args:
+            p_run_nm (str): name of the run, e.g. friends, id_list
+
+        Returns:
+            dict: the summary, as from Metrics.get_snapshot()
+        """
+        metrics_file = None
+        if self.metrics_to_file:
+            metrics_file = path.join(UT.get_home(), TX.dbs.log_path,
+                                     TX.dbs.metrics_name)
+        return MT.write_summary(p_run_nm,
+                                self.LOG if self.logme else None,
+                                metrics_file)
+
+    def request_erep(self,
+                     p_session: object,
+                     p_method: str,
+                     p_url: str,
+                     **p_kwargs) -> object:
+        """Send an HTTP request, recording its latency and outcome.
+
+        A 429 or 5xx answer is tried again up to self.request_retries
+        times, waiting as asked by Retry-After or else backing off.
+
+        Args:
+            p_session (object): requests.Session, or the requests module
+            p_method (str): get, post
+            p_url (str): full URL
+            p_kwargs: passed on to requests
+
+        Returns:
+            object: requests.Response
+        """
+        for attempt in range(self.request_retries + 1):
+            if attempt > 0:
+                MT.incr("retries")
+            MT.incr("http_requests")
+            try:
+                with MT.timer("http", p_histogram=True):
+                    response = getattr(p_session, p_method)(p_url,
+                                                            **p_kwargs)
+            except requests.RequestException:
+                MT.incr("http_errors")
+                raise
+            if response.status_code < 400:
+                break
+            MT.incr("http_errors")
+            if response.status_code != 429 and response.status_code < 500:
+                break
+            if attempt < self.request_retries:
+                wait = response.headers.get("Retry-After", "")
+                time.sleep(min(float(wait), 5.0) if wait.isdigit()
+                           else 0.5 * 2 ** attempt)
+        return response
+
     def create_bkupdb(self):
         """Create backup database."""
         bkup_path = path.join(UT.get_home(), TX.dbs.bkup_path)
@@ -180,25 +307,143 @@ class Controls(object):
             raise Exception(IOError, msg)
         DB.backup_db()
 
+    def purge_db_history(self,
+                         p_keep_days: int = 30,
+                         p_vacuum: str = "incremental") -> str:
+        """Remove superseded row versions from the database.
+
+        Args:
+            p_keep_days (int): keep versions deleted within this many days
+            p_vacuum (str): none, full, incremental
+
+        Returns:
+            str: detail-level message about what was reclaimed
+        """
+        purge = DB.purge_db(p_keep_days, p_vacuum)
+        msg = TX.msg.n_rows_purged + str(purge.rows_purged)
+        msg += "\n{}{}".format(TX.msg.n_bytes_reclaimed,
+                               purge.bytes_reclaimed)
+        msg += "\n{}{}".format(TX.msg.n_bytes_free, purge.bytes_free)
+        if self.logme:
+            self.LOG.write_log(ST.LogLevel.INFO, msg.replace("\n", " "))
+        return msg
+
     def logout_erep(self):
-        """Logout from eRepublik. Assume 302 (redirect) is good response."""
+        """Logout from eRepublik. Assume 302 (redirect) is good response.
+
+        The saved session is forgotten whatever eRep answers.
+        """
         if self.erep_csrf_token is not None:
             formdata = {'_token': self.erep_csrf_token,
                         "remember": '1',
                         'commit': 'Logout'}
-            response = self.erep_rqst.post(TX.urls.u_erep + "/logout",
-                                           data=formdata,
-                                           allow_redirects=True)
+            response = self.request_erep(self.erep_rqst, "post",
+                                         TX.urls.u_erep + "/logout",
+                                         data=formdata,
+                                         allow_redirects=False)
             if self.logme:
                 msg = TX.logm.ll_logout_cd + str(response.status_code)
                 self.LOG.write_log(ST.LogLevel.INFO, msg)
+            self.erep_csrf_token = None
+            self.session_checked = None
+            SS.clear()
             if response.status_code == 302:
-                self.erep_csrf_token = None
-                response = self.erep_rqst.get(TX.urls.u_erep)
+                response = self.request_erep(self.erep_rqst, "get",
+                                             TX.urls.u_erep)
                 if self.logme:
                     msg = TX.logm.ll_save_logout_resp
                     self.LOG.write_log(ST.LogLevel.INFO, msg)
 
+    def open_erep_session(self, p_usrd: namedtuple):
+        """Make sure self.erep_rqst is logged in to eRepublik as the user.
+
+        A session checked within self.session_check_ttl seconds is
+        used as-is. Otherwise the session in memory, or else the one
+        saved by SessionStore, is checked with one GET of the landing
+        page. Only if that fails is there a full login, and the new
+        session is saved for next time.
+
+        Args:
+            p_usrd (namedtuple): decrypted user "data" record
+        """
+        if self.erep_csrf_token is not None\
+                and self.session_checked is not None\
+                and UT.get_monotonic() - self.session_checked <\
+                self.session_check_ttl:
+            MT.incr("session_reuses")
+            return
+        if self.erep_csrf_token is None:
+            self.erep_csrf_token = SS.load(self.erep_rqst,
+                                           p_usrd.user_erep_profile_id,
+                                           p_usrd.encrypt_key)
+        if self.erep_csrf_token is not None\
+                and self.check_erep_session(p_usrd.user_erep_profile_id):
+            MT.incr("session_reuses")
+        else:
+            MT.incr("session_logins")
+            self.erep_rqst.cookies.clear()
+            self.erep_csrf_token = None
+            self.login_erep(p_usrd.user_erep_email,
+                            p_usrd.user_erep_password)
+        SS.save(self.erep_rqst, self.erep_csrf_token,
+                p_usrd.user_erep_profile_id, p_usrd.encrypt_key)
+        self.session_checked = UT.get_monotonic()
+
+    def check_erep_session(self, p_profile_id: str) -> bool:
+        """Check that the session is still logged in, as the user.
+
+        The landing page of a logged-in session carries the user's
+        citizen ID and a fresh CSRF token, which is kept.
+
+        Args:
+            p_profile_id (str): user's eRep profile ID
+
+        Returns:
+            bool: True if still logged in, else False
+        """
+        response = self.request_erep(self.erep_rqst, "get", TX.urls.u_erep,
+                                     allow_redirects=False)
+        if response.status_code != 200\
+                or "var csrfToken = '" not in response.text\
+                or '"citizenId":{},'.format(p_profile_id)\
+                not in response.text:
+            if self.logme:
+                msg = TX.logm.ll_session_stale + str(response.status_code)
+                self.LOG.write_log(ST.LogLevel.INFO, msg)
+            return False
+        self.get_token(response.text)
+        return True
+
+    def login_erep(self,
+                   p_email: str,
+                   p_password: str) -> str:
+        """Log in to eRepublik and keep the session's CSRF token.
+
+        Args:
+            p_email (str): User login email address
+            p_password (str): User login password
+
+        Raises:
+            ConnectionError if eRep does not accept the login
+
+        Returns:
+            str: full response.text from eRep landing page GET
+        """
+        formdata = {'citizen_email': p_email,
+                    'citizen_password': p_password,
+                    "remember": '1', 'commit': 'Login'}
+        response = self.request_erep(self.erep_rqst, "post",
+                                     TX.urls.u_erep + "/login",
+                                     data=formdata, allow_redirects=False)
+        if self.logme:
+            msg = TX.logm.ll_login_cd + str(response.status_code)
+            self.LOG.write_log(ST.LogLevel.INFO, msg)
+        if response.status_code != 302:
+            raise Exception(ConnectionError, TX.shit.f_login_failed)
+        response = self.request_erep(self.erep_rqst, "get", TX.urls.u_erep)
+        self.get_token(response.text)
+        return response.text
+
     def get_token(self, response_text: str):
         """Get/save CSRF token.
 
@@ -267,7 +512,7 @@ class Controls(object):
             text: full response.text from eRep login GET  or  None
         """
         self.logout_erep()
-        time.sleep(.300)
+        time.sleep(self.request_delay)
         response_text = False
         if p_use_response_file:
             response_text = self.get_cached_login_file()
@@ -276,28 +521,12 @@ class Controls(object):
                     msg = TX.logm.ll_cached_login
                     self.LOG.write_log(ST.LogLevel.INFO, msg)
         if not response_text:
-            formdata = {'citizen_email': p_email,
-                        'citizen_password': p_password,
-                        "remember": '1', 'commit': 'Login'}
-            login_url = TX.urls.u_erep + "/login"
-            response = self.erep_rqst.post(login_url,
-                                           data=formdata,
-                                           allow_redirects=False)
-            if self.logme:
-                msg = TX.logm.ll_login_cd + str(response.status_code)
-                self.LOG.write_log(ST.LogLevel.INFO, msg)
-            if response.status_code == 302:
-                response = self.erep_rqst.get(TX.urls.u_erep)
-                self.get_token(response.text)
-                response_text = response.text
-                if p_use_response_file:
-                    cache_file = path.join(UT.get_home(), TX.dbs.cache_path,
-                                           "login_response")
-                    with open(cache_file, "w") as f:
-                        f.write(response.text)
-            else:
-                msg = TX.shit.f_login_failed
-                raise Exception(ConnectionError, msg)
+            response_text = self.login_erep(p_email, p_password)
+            if p_use_response_file:
+                cache_file = path.join(UT.get_home(), TX.dbs.cache_path,
+                                       "login_response")
+                with open(cache_file, "w") as f:
+                    f.write(response_text)
         id_info = self.parse_user_info(response_text)
         self.logout_erep()
         return id_info
@@ -316,10 +545,10 @@ class Controls(object):
         Returns:
             bool: True if apikey works, else False
         """
-        url = "https://api.erepublik.tools/v0/citizen/"
+        url = TX.urls.u_etools + "/citizen/"
         url += str(p_profile_id)
         url += "?key={}".format(str(p_api_key))
-        response = requests.get(url)
+        response = self.request_erep(requests, "get", url)
         response_text = json.loads(response.text)
         if response.status_code in (400, 404):
             msg = TX.shit.f_apikey_failed + response_text["message"]
@@ -337,26 +566,27 @@ class Controls(object):
         # if self.erep_csrf_token is not None:
         #     self.logout_erep()
         try:
-            self.LOG.close_logs()
+            self.LOG.close_log()
         except Exception:
             pass
 
-    def convert_val(self, p_erep_value) -> str:
-        """Convert eRep/JSON values to Python & SQL-friendly strings.
+    def convert_val(self, p_erep_value):
+        """Convert eRep/JSON values to Python values.
+
+        Final typing to the DB column happens in DB.write_db.
 
         Args:
             p_erep_value (any): true, false, "", [], numbers
         """
         val = p_erep_value
         if p_erep_value == "true":
-            val = "True"
+            val = True
         elif p_erep_value == "false":
-            val = "False"
-        elif isinstance(p_erep_value, int) or isinstance(p_erep_value, float):
-            val = str(p_erep_value)
+            val = False
+        elif isinstance(p_erep_value, float):
+            val = int(p_erep_value)
         elif p_erep_value in ("", [], {}, "[]", "{}"):
-            val = "None"
-        val = val.replace("'", "_")
+            val = None
         return val
 
     def get_basic_citizen_profile(self,
@@ -540,15 +770,14 @@ class Controls(object):
             ValueError if profile ID returns 404 from eRepublik
 
         Returns:
-            dict: modeled on ST.CitizenFields dataclass
+            dict: modeled on ST.CitizenFields dataclass, or empty dict
+                if eRepublik could not be reached
         """
-        citrec = dict()
-        for cnm in ST.CitizenFields.keys():
-            citrec[cnm] = copy(getattr(ST.CitizenFields, cnm))
         cache_file = path.join(UT.get_home(), TX.dbs.cache_path,
                                "profile_response_{}".format(p_profile_id))
         if Path(cache_file).exists() and p_use_file:
-            with open(cache_file) as pf:
+            MT.incr("profile_cache_hits")
+            with open(cache_file) as pf, MT.timer("parse"):
                 profile_data = json.loads(pf.read())
             if self.logme:
                 msg = TX.logm.ll_cached_profile + str(p_profile_id)
@@ -556,25 +785,146 @@ class Controls(object):
         else:
             profile_url = TX.urls.u_erep +\
                 "/main/citizen-profile-json/" + p_profile_id
-            response = requests.get(profile_url)
+            response = self.request_erep(requests, "get", profile_url)
+            MT.incr("profile_cache_misses")
             if response.status_code == 404:
                 msg = TX.shit.f_profile_id_failed + p_profile_id
                 raise Exception(ValueError, msg)
-            profile_data = json.loads(response.text)
+            if response.status_code != 200:
+                if self.logme:
+                    msg = TX.logm.ll_profile_rqst_cd +\
+                        "{} {}".format(p_profile_id, response.status_code)
+                    self.LOG.write_log(ST.LogLevel.WARNING, msg)
+                return dict()
+            with MT.timer("parse"):
+                profile_data = json.loads(response.text)
             with open(cache_file, "w") as f:
                 f.write(str(response.text))
             if self.logme:
                 msg = TX.logm.ll_profile_file_cached + p_profile_id
                 self.LOG.write_log(ST.LogLevel.DEBUG, msg)
+        return self.extract_citizen_profile(profile_data, p_profile_id)
+
+    def extract_citizen_profile(self,
+                                profile_data: dict,
+                                p_profile_id: str) -> dict:
+        """Extract all stored citizen values from a profile response.
+
+        Args:
+            profile_data (dict): returned from eRep
+            p_profile_id (str): citizen ID
 
+        Returns:
+            dict: modeled on ST.CitizenFields dataclass
+        """
+        citrec = dict()
+        for cnm in ST.CitizenFields.keys():
+            citrec[cnm] = copy(getattr(ST.CitizenFields, cnm))
         citrec["profile_id"] = p_profile_id
-        citrec = self.get_basic_citizen_profile(profile_data, citrec)
-        citrec = self.get_citizen_location_data(profile_data, citrec)
-        citrec = self.get_citizen_party_data(profile_data, citrec)
-        citrec = self.get_citizen_military_data(profile_data, citrec)
-        citrec = self.get_citizen_press_data(profile_data, citrec)
+        with MT.timer("extract"):
+            citrec = self.get_basic_citizen_profile(profile_data, citrec)
+            citrec = self.get_citizen_location_data(profile_data, citrec)
+            citrec = self.get_citizen_party_data(profile_data, citrec)
+            citrec = self.get_citizen_military_data(profile_data, citrec)
+            citrec = self.get_citizen_press_data(profile_data, citrec)
         return citrec
 
+    @classmethod
+    def read_profile_file(cls, p_file_path: str) -> tuple:
+        """Parse and extract one cached profile response.
+
+        Runs in a worker process of reextract_profile_cache(), so it
+        builds its own Controls object.
+
+        Args:
+            p_file_path (str): full path to a profile_response_<id> file
+
+        Returns:
+            tuple: (str: profile ID, dict: as from
+                extract_citizen_profile(), or None if the file could
+                not be read)
+        """
+        profile_id = path.basename(p_file_path).split("_")[-1]
+        try:
+            with open(p_file_path) as pf:
+                profile_data = json.loads(pf.read())
+            return (profile_id,
+                    cls().extract_citizen_profile(profile_data, profile_id))
+        except (OSError, ValueError, KeyError, TypeError):
+            return (profile_id, None)
+
+    def reextract_profile_cache(self,
+                                p_workers: int = None,
+                                p_batch_size: int = 500) -> tuple:
+        """Rebuild citizen rows from the cached profile responses.
+
+        Use after the extract logic or ST.CitizenFields changes, to
+        backfill without calling eRep. Files are parsed and extracted
+        on a pool of worker processes. Results are compared, by hash,
+        with each citizen's current row; only changed and new citizens
+        are written, as new versions, in batched transactions. The
+        is_user_friend flag is kept from the DB.
+
+        Args:
+            p_workers (int, optional): worker processes. Defaults to
+                one per CPU.
+            p_batch_size (int): rows written per transaction
+
+        Returns:
+            tuple: (bool: True if every file was read OK, else False,
+                    str: detail-level message)
+        """
+        cache_dir = path.join(UT.get_home(), TX.dbs.cache_path)
+        files = (entry.path for entry in os.scandir(cache_dir)
+                 if entry.name.startswith("profile_response_")
+                 and entry.name.split("_")[-1].isdigit())
+        current = DB.query_citizen_hashes()
+        counts = {"files": 0, "bad": 0, "unchanged": 0}
+        batches = {"add": list(), "upd": list()}
+
+        def write_batch(p_db_action: str):
+            DB.write_db_batch(p_db_action, "citizen", batches[p_db_action])
+            batches[p_db_action] = list()
+
+        MT.reset()
+        started = UT.get_monotonic()
+        pool = ProcessPoolExecutor(max_workers=p_workers)
+        with pool, DB.use_db_profile(ST.DbProfile.BULK):
+            for profile_id, citrec in pool.map(self.read_profile_file,
+                                               files, chunksize=64):
+                counts["files"] += 1
+                if citrec is None:
+                    counts["bad"] += 1
+                    continue
+                oid, hash_id, is_friend = current.get(profile_id,
+                                                      (None, None, False))
+                citrec["is_user_friend"] = bool(is_friend)
+                if oid is None:
+                    batches["add"].append((citrec, None))
+                elif DB.get_citizen_hash(citrec) == hash_id:
+                    counts["unchanged"] += 1
+                    continue
+                else:
+                    batches["upd"].append((citrec, oid))
+                for db_action in batches:
+                    if len(batches[db_action]) >= p_batch_size:
+                        write_batch(db_action)
+            for db_action in batches:
+                write_batch(db_action)
+        elapsed_s = UT.get_monotonic() - started
+        self.write_run_summary("reextract")
+        msg = TX.msg.n_files_read + str(counts["files"])
+        msg += "\n{}{}".format(TX.msg.n_files_per_s,
+                               round(counts["files"] / elapsed_s, 1)
+                               if elapsed_s > 0 else 0)
+        rows = MT.get_snapshot()["counters"]
+        msg += "\n{}{}".format(TX.msg.n_rows_added, rows["rows_added"])
+        msg += "\n{}{}".format(TX.msg.n_rows_updated, rows["rows_updated"])
+        msg += "\n{}{}".format(TX.msg.n_rows_unchanged, counts["unchanged"])
+        if counts["bad"]:
+            msg += "\n{}{}".format(TX.msg.n_files_bad, counts["bad"])
+        return (not counts["bad"], msg)
+
     def write_user_rec(self,
                        p_profile_id: str,
                        p_erep_email: str,
@@ -596,11 +946,12 @@ class Controls(object):
         urec["user_erep_password"] = p_erep_passw
         if p_erep_apikey is not None:
             urec["user_tools_api_key"] = p_erep_apikey
-        _, usra = self.get_user_db_record()
+        _, usra = self.get_user_db_record(p_refresh=True)
         if usra is None:
             DB.write_db("add", "user", urec, p_oid=None)
         else:
             DB.write_db("upd", "user", urec, p_oid=usra.oid)
+        self.user_rec_cache = None
 
     def write_ctzn_rec(self, p_citrec: dict):
         """Add or modify citizen record to database.
@@ -623,46 +974,114 @@ class Controls(object):
         response. A regular profile request only returns the
         first 20 friends.
 
-        Do interactive login, not using cached response,
-        because CSRF token must be fresh.
+        The logged-in session is reused across runs, see
+        open_erep_session(). If eRep turns the post away because the
+        session ended anyway, log in again and post once more.
+
+        The response is streamed. Each chunk is saved to the cache
+        file and yielded as it arrives.
 
         Args:
             p_profile_id (str): citizen ID
         Returns:
-            response text
+            generator: response text chunks
         """
         usrd, _ = self.get_user_db_record()
-        self.verify_citizen_credentials(usrd.user_erep_email,
-                                        usrd.user_erep_password,
-                                        p_use_response_file=False,
-                                        p_logout=False)
         msg_url =\
             "{}/main/messages-compose/{}".format(TX.urls.u_erep, p_profile_id)
         msg_headers = {
             "Referer": msg_url,
             "X-Requested-With": "XMLHttpRequest"}
-        send_message = {
-            "_token": self.erep_csrf_token,
-            "citizen_name": p_profile_id,
-            "citizen_subject": "This is a test",
-            "citizen_message": "This is a test"}
-        msg_response = self.erep_rqst.post(msg_url, data=send_message,
-                                           headers=msg_headers,
-                                           allow_redirects=False)
-        if self.logme:
-            msg = TX.logm.ll_friends_cd + str(msg_response.status_code)
-            self.LOG.write_log(ST.LogLevel.INFO, msg)
+        for _ in range(2):
+            self.open_erep_session(usrd)
+            send_message = {
+                "_token": self.erep_csrf_token,
+                "citizen_name": p_profile_id,
+                "citizen_subject": "This is a test",
+                "citizen_message": "This is a test"}
+            msg_response = self.request_erep(self.erep_rqst, "post",
+                                             msg_url,
+                                             data=send_message,
+                                             headers=msg_headers,
+                                             allow_redirects=False,
+                                             stream=True)
+            if self.logme:
+                msg = TX.logm.ll_friends_cd + str(msg_response.status_code)
+                self.LOG.write_log(ST.LogLevel.INFO, msg)
+            if msg_response.status_code not in (301, 302, 401, 403):
+                break
+            msg_response.close()
+            self.erep_csrf_token = None
+            self.session_checked = None
+            SS.clear()
         cache_file = path.join(UT.get_home(), TX.dbs.cache_path,
                                "friends_response")
-        with open(cache_file, "w") as f:
-            f.write(msg_response.text)
-        self.logout_erep()
-        return msg_response.text
+        decoder = codecs.getincrementaldecoder(
+            msg_response.encoding or "utf-8")(errors="replace")
+        try:
+            with open(cache_file, "w") as f:
+                for raw in msg_response.iter_content(65536):
+                    text = decoder.decode(raw)
+                    f.write(text)
+                    yield text
+                text = decoder.decode(b"", final=True)
+                f.write(text)
+                yield text
+        finally:
+            msg_response.close()
+
+    def get_citizen_friend_ids(self, profile_data: dict) -> list:
+        """Extract the friends listed on a citizen profile response.
+
+        eRep lists only the first 20 or so friends of a profile.
+
+        Args:
+            profile_data (dict): returned from eRep
+
+        Returns:
+            list: of str profile IDs
+        """
+        friends = profile_data.get("friends") or dict()
+        return [str(friend["id"]) for friend in friends.get("list") or []
+                if "id" in friend]
+
+    def get_cached_friend_ids(self, p_profile_id: str) -> list:
+        """Get the friends listed on a cached profile response.
+
+        Args:
+            p_profile_id (str): citizen ID
+
+        Returns:
+            list: of str profile IDs, or None if no profile is cached
+        """
+        cache_file = path.join(UT.get_home(), TX.dbs.cache_path,
+                               "profile_response_{}".format(p_profile_id))
+        if not Path(cache_file).exists():
+            return None
+        with open(cache_file) as pf, MT.timer("parse"):
+            try:
+                profile_data = json.loads(pf.read())
+            except ValueError:
+                return None
+        return self.get_citizen_friend_ids(profile_data)
+
+    def iter_friends(self, p_chunks: object) -> object:
+        """Extract friends from a messages-compose page as it streams.
+
+        Args:
+            p_chunks (iterable): page text, in chunks
+
+        Returns:
+            generator: (profile_id, name) tuples
+        """
+        for friend in UT.iter_json_array(p_chunks,
+                                         '$j("#citizen_name").tokenInput('):
+            yield (str(friend["id"]), friend["name"])
 
     def get_erep_citizen_by_id(self,
                                p_profile_id: str,
                                p_use_file: bool = False,
-                               p_is_friend: bool = False) -> bool:
+                               p_is_friend: bool = None) -> bool:
         """Get citizen data from eRepublik and store in database.
 
         Args:
@@ -670,8 +1089,9 @@ class Controls(object):
             p_use_file (bool, optional): Defaults to False. If True
                 and a cached file exists, use that instead of
                 calling eRepublik API.
-            p_is_friend (bool, optional): Defaults to False. If True
-                then set "is_user_friend" value to "True" on DB
+            p_is_friend (bool, optional): Value for the "is_user_friend"
+                flag on DB. Defaults to None: keep the stored flag,
+                or False for a new citizen.
 
         Returns:
             bool: True if citizen data retrieved and stored, else False
@@ -679,14 +1099,15 @@ class Controls(object):
         ctzn_rec = self.get_ctzn_profile_from_erep(p_profile_id,
                                                    p_use_file=False)
         if ctzn_rec:
-            ctzn_rec["is_user_friend"] = "True" if p_is_friend else "False"
+            ctzn_rec["is_user_friend"] = bool(p_is_friend)
             ctzd, ctza = self.get_ctzn_db_rec_by_id(ctzn_rec["profile_id"])
             if ctza in (None, "None", ""):
                 DB.write_db("add", "citizen", ctzn_rec, None)
             else:
-                ctzn_rec["is_user_friend"] = ctzd.is_user_friend
+                if p_is_friend is None:
+                    ctzn_rec["is_user_friend"] = ctzd.is_user_friend
                 DB.write_db("upd", "citizen", ctzn_rec, p_oid=ctza.oid)
-            time.sleep(.300)
+            time.sleep(self.request_delay)
             return True
         else:
             return False
@@ -695,7 +1116,7 @@ class Controls(object):
                                p_api_key: str,
                                p_citizen_nm: str,
                                p_use_file: bool = False,
-                               p_is_friend: bool = False) -> bool:
+                               p_is_friend: bool = None) -> bool:
         """Get citizen ID by looking up name in erepublik.tools API.
 
         Then get citizen data from eRepublik and store in database.
@@ -706,45 +1127,231 @@ class Controls(object):
             p_use_file (bool, optional): Defaults to False. If True
                 and a cached file exists, use that instead of
                 calling eRepublik API.
-            p_is_friend (bool, optional): Defaults to False. If True
-                then set "is_user_friend" value to "True" on DB
+            p_is_friend (bool, optional): Value for the "is_user_friend"
+                flag on DB. Defaults to None: keep the stored flag.
 
         Returns:
             bool: True if citizen data retrieved and stored, else False
         """
+        citizen_nm = (p_citizen_nm or "").strip()
+        profile_id = self.resolve_citizen_names(
+            [citizen_nm], p_api_key).get(citizen_nm)
+        if profile_id is None:
+            return False
+        return self.get_erep_citizen_by_id(profile_id, False, p_is_friend)
+
+    def lookup_citizen_id_by_nm(self,
+                                p_api_key: str,
+                                p_citizen_nm: str) -> tuple:
+        """Look up one citizen name in the erepublik.tools API.
+
+        Args:
+            p_api_key (string): user's erepublik.tools API key
+            p_citizen_nm (string): eRepublik citizen name
+
+        Returns:
+            tuple: (str: profile ID or None,
+                    bool: True if the answer may be cached)
+        """
         etools_url = self.etools_ctzn_bynm_url.replace("~NAME~", p_citizen_nm)
         etools_url = etools_url.replace("~KEY~", p_api_key)
-        response = self.etools_rqst.get(etools_url)
-        response_json = json.loads(response.text)
-        profile_id = str(response_json["citizen"][0]["id"]).strip()
-        return self.get_erep_citizen_by_id(profile_id, False, p_is_friend)
+        response = self.request_erep(self.etools_rqst, "get", etools_url)
+        if response.status_code == 404:
+            return (None, True)
+        if response.status_code != 200:
+            return (None, False)
+        try:
+            citizens = json.loads(response.text).get("citizen") or list()
+        except ValueError:
+            return (None, False)
+        if not citizens:
+            return (None, True)
+        return (str(citizens[0]["id"]).strip(), True)
+
+    def resolve_citizen_names(self,
+                              p_names: list,
+                              p_api_key: str = None) -> dict:
+        """Map citizen names to profile IDs, remote lookups last.
+
+        Each name is looked for, in order:
+        - on the DB, among current and then past citizen names
+        - in the name cache, if found within self.name_found_ttl_days
+          or not found within self.name_missing_ttl_days
+        - in the erepublik.tools API, if p_api_key is set
+
+        Remote answers, found or not found, go to the name cache in
+        one transaction.
+
+        Args:
+            p_names (list): eRepublik citizen names
+            p_api_key (str, optional): user's erepublik.tools API key.
+                If None, names are resolved locally only.
+
+        Returns:
+            dict: {str: name, str: profile ID, or None if unresolved}
+        """
+        names = list(dict.fromkeys(nm.strip() for nm in p_names
+                                   if nm and nm.strip()))
+        resolved = DB.query_profile_ids_by_name(names)
+        rest = [nm for nm in names if nm not in resolved]
+        now_ts = UT.get_epoch(UT.get_utc_ts())
+        resolved.update(DB.query_name_cache(
+            rest, now_ts - int(self.name_found_ttl_days * 86400),
+            now_ts - int(self.name_missing_ttl_days * 86400)))
+        rest = [nm for nm in rest if nm not in resolved]
+        MT.incr("name_cache_hits", len(names) - len(rest))
+        looked_up = dict()
+        if p_api_key not in (None, "None", ""):
+            for citizen_nm in rest:
+                MT.incr("name_cache_misses")
+                profile_id, cacheable =\
+                    self.lookup_citizen_id_by_nm(p_api_key, citizen_nm)
+                if cacheable:
+                    looked_up[citizen_nm] = profile_id
+                resolved[citizen_nm] = profile_id
+                time.sleep(self.request_delay)
+            DB.write_name_cache(looked_up)
+        return dict((nm, resolved.get(nm)) for nm in names)
+
+    def refresh_citizens_by_names(self,
+                                  p_names: object,
+                                  p_api_key: str = None,
+                                  p_stale_days: float = 1.0,
+                                  p_batch_size: int = 500) -> tuple:
+        """Pull citizen data from eRep for a list of names.
+
+        Names are resolved in batches by resolve_citizen_names(), and
+        the IDs queued on the name_list refresh job as for an ID file.
+
+        Args:
+            p_names (iterable): eRepublik citizen names
+            p_api_key (str, optional): user's erepublik.tools API key
+            p_stale_days (float): skip citizens pulled more recently.
+                0 pulls every citizen named.
+            p_batch_size (int): names resolved and queued at a time
+
+        Returns:
+            tuple: (bool: True if all names resolved and processed OK,
+                    else False, str: detail-level message)
+        """
+        since_ts = UT.get_epoch(UT.get_utc_ts()) - int(p_stale_days * 86400)
+        counts = {"resolved": 0, "unresolved": 0, "fresh": 0}
+        batch = list()
+
+        def queue_batch():
+            resolved = self.resolve_citizen_names(batch, p_api_key)
+            id_list = list(dict.fromkeys(
+                pid for pid in resolved.values() if pid is not None))
+            counts["resolved"] += len(id_list)
+            counts["unresolved"] += sum(1 for pid in resolved.values()
+                                        if pid is None)
+            counts["fresh"] += self.queue_id_batch(
+                id_list, since_ts, p_stale_days > 0, "name_list")
+
+        for citizen_nm in p_names:
+            batch.append(citizen_nm)
+            if len(batch) >= p_batch_size:
+                queue_batch()
+                batch = list()
+        queue_batch()
+        msg = TX.msg.n_names_resolved + str(counts["resolved"])
+        if counts["unresolved"]:
+            msg += "\n{}{}".format(TX.msg.n_names_unresolved,
+                                   counts["unresolved"])
+        if counts["fresh"]:
+            msg += "\n{}{}".format(TX.msg.n_ids_fresh, counts["fresh"])
+        status, msg_2 = self.get_erep_ctzn_by_id_list(list(), "name_list")
+        msg += "\n{}".format(msg_2)
+        return (status and not counts["unresolved"], msg)
 
     def get_erep_ctzn_by_id_list(self,
-                                 p_id_list: list) -> bool:
+                                 p_id_list: list,
+                                 p_job_kind: str = "id_list",
+                                 p_limit: int = None) -> bool:
         """Pull citizen data from eRep based on list of IDs.
 
+        The IDs are queued on a refresh job in the DB, and each ID's
+        outcome is checkpointed as it is done. If a run is cut short,
+        the next run of the same kind resumes the job, skipping IDs
+        already done.
+
+        A failing ID does not stop the run. An invalid (404) ID goes
+        straight to the dead-letter list; any other failure is retried
+        on later runs, up to self.job_max_attempts tries in all.
+
         Args:
             p_id_list (list): list of valid citizen profile IDs
+            p_job_kind (str): kind of refresh job to queue them on
+            p_limit (int, optional): most IDs to process in this run,
+                resumed ones included. The rest stay queued. Defaults
+                to no limit.
 
         Returns:
             tuple: (bool: True if file processed OK, else False,
                     str: detail-level message)
         """
-        count_hits = 0
+        job_id = DB.enqueue_refresh_job(p_job_kind, p_id_list)
+        checked = list()
+        done_cnt = 0
         err = None
-        for profile_id in p_id_list:
-            print(TX.msg.n_lookup_id + profile_id)
-            ok = self.get_erep_citizen_by_id(profile_id)
-            if ok:
-                count_hits += 1
-            else:
-                err = TX.shit.f_profile_id_failed + profile_id
-        msg = TX.msg.n_profiles_done + str(count_hits)
-        if err is not None:
-            msg += "\n{}".format(err)
-            return (False, msg)
-        else:
-            return (True, msg)
+        MT.reset()
+        with DB.use_db_profile(ST.DbProfile.BULK):
+            for profile_id, attempts in DB.iter_job_queue(
+                    job_id, p_limit=p_limit):
+                print(TX.msg.n_lookup_id + profile_id)
+                attempts += 1
+                status = ST.JobStatus.DONE
+                try:
+                    if not self.get_erep_citizen_by_id(profile_id):
+                        raise Exception(ConnectionError,
+                                        TX.shit.f_profile_rqst_failed +
+                                        profile_id)
+                    checked.append(profile_id)
+                    err = None
+                except Exception as exc:
+                    err = str(exc.args[-1]) if exc.args else repr(exc)
+                    status = ST.JobStatus.QUEUED
+                    if attempts >= self.job_max_attempts or\
+                            (exc.args and exc.args[0] is ValueError):
+                        status = ST.JobStatus.DEAD
+                    MT.incr("job_failures")
+                DB.set_job_item_status(job_id, profile_id, status,
+                                       attempts, err)
+                if len(checked) >= 500:
+                    DB.set_citizens_checked(checked)
+                    done_cnt += len(checked)
+                    checked = list()
+            DB.set_citizens_checked(checked)
+        counts = DB.finish_refresh_job(job_id)
+        self.write_run_summary(p_job_kind)
+        msg = TX.msg.n_profiles_done + str(done_cnt + len(checked))
+        left = counts.get(ST.JobStatus.QUEUED, 0)
+        dead = counts.get(ST.JobStatus.DEAD, 0)
+        if left:
+            msg += "\n{}{}".format(TX.msg.n_job_queued, left)
+        if dead:
+            msg += "\n{}{}".format(TX.msg.n_job_dead, dead)
+            msg += "\n{}".format(self.write_dead_letters(job_id))
+        return (not left and not dead, msg)
+
+    def write_dead_letters(self, p_job_id: str) -> str:
+        """Save a job's dead-letter IDs to a file in the cache directory.
+
+        The file can be fed back to refresh_citizen_data_from_file().
+        Reasons for each failure are kept in DB.query_dead_letters().
+
+        Args:
+            p_job_id (str): refresh job ID
+
+        Returns:
+            str: full path to the file
+        """
+        dead_file = path.join(UT.get_home(), TX.dbs.cache_path,
+                              "dead_letter_ids")
+        with open(dead_file, "w") as df:
+            for _, profile_id, _, _, _ in DB.query_dead_letters(p_job_id):
+                df.write(profile_id + "\n")
+        return dead_file
 
     def refresh_ctzn_data_from_db(self) -> tuple:
         """Query data base for list of all active profile IDs.
@@ -759,12 +1366,149 @@ class Controls(object):
         msg += "\n{}".format(msg_2)
         return(status, msg)
 
+    def crawl_friend_graph(self,
+                           p_seed_ids: list = None,
+                           p_max_depth: int = None,
+                           p_budget: int = None,
+                           p_stale_days: float = 7.0,
+                           p_restart: bool = False) -> tuple:
+        """Crawl friends of friends breadth-first, storing the edges.
+
+        Citizens on the crawl frontier are expanded shallowest first.
+        Each is pulled the usual way, by get_erep_citizen_by_id(), and
+        the friends on its profile are stored as edges and queued one
+        hop deeper. Friends already on the frontier are skipped in
+        bulk by the DB. A citizen pulled within p_stale_days is
+        expanded from its cached profile, without a request.
+
+        Every expanded citizen is checkpointed, so a crawl cut short,
+        or stopped by its budget, resumes where it left off. Failures
+        are retried as in get_erep_ctzn_by_id_list().
+
+        Args:
+            p_seed_ids (list, optional): IDs to start from, at depth 0.
+                Defaults to the user's friends on the DB.
+            p_max_depth (int, optional): deepest hop to expand.
+                Defaults to self.crawl_depth.
+            p_budget (int, optional): most profile requests to make.
+                Defaults to no limit.
+            p_stale_days (float): reuse profiles pulled more recently
+            p_restart (bool): If True, forget the frontier of any
+                earlier crawl. Known edges are kept.
+
+        Returns:
+            tuple: (bool: True if no IDs were given up on, else False,
+                    str: detail-level message)
+        """
+        max_depth = self.crawl_depth if p_max_depth is None else p_max_depth
+        if p_restart:
+            DB.reset_crawl()
+        seed_ids = p_seed_ids
+        if seed_ids is None:
+            seed_ids = list(DB.query_friend_sync_state().keys())
+        DB.add_crawl_nodes(seed_ids, 0)
+        since_ts = UT.get_epoch(UT.get_utc_ts()) - int(p_stale_days * 86400)
+        checked = list()
+        tried = set()
+        spent = 0
+        MT.reset()
+        with DB.use_db_profile(ST.DbProfile.BULK):
+            while p_budget is None or spent < p_budget:
+                batch = [node for node in DB.query_crawl_frontier(
+                    max_depth, len(tried) + 100) if node[0] not in tried]
+                if not batch:
+                    break
+                fresh = DB.query_pulled_since([node[0] for node in batch],
+                                              since_ts)
+                for profile_id, depth, attempts in batch:
+                    friend_ids = self.get_cached_friend_ids(profile_id)\
+                        if profile_id in fresh else None
+                    status = ST.JobStatus.DONE
+                    err = None
+                    if friend_ids is None:
+                        if p_budget is not None and spent >= p_budget:
+                            break
+                        print(TX.msg.n_lookup_id + profile_id)
+                        attempts += 1
+                        spent += 1
+                        try:
+                            if not self.get_erep_citizen_by_id(profile_id):
+                                raise Exception(
+                                    ConnectionError,
+                                    TX.shit.f_profile_rqst_failed +
+                                    profile_id)
+                            checked.append(profile_id)
+                            friend_ids =\
+                                self.get_cached_friend_ids(profile_id)
+                        except Exception as exc:
+                            err = str(exc.args[-1]) if exc.args\
+                                else repr(exc)
+                            status = ST.JobStatus.QUEUED
+                            if attempts >= self.job_max_attempts or\
+                                    (exc.args and exc.args[0] is ValueError):
+                                status = ST.JobStatus.DEAD
+                            MT.incr("job_failures")
+                    tried.add(profile_id)
+                    DB.set_crawl_node_status(
+                        profile_id, status, attempts, err, friend_ids,
+                        depth + 1 if depth < max_depth else None)
+            DB.set_citizens_checked(checked)
+        self.write_run_summary("crawl")
+        counts = DB.query_crawl_counts()
+        left = len(DB.query_crawl_frontier(max_depth, 1))
+        dead = counts.get(ST.JobStatus.DEAD, 0)
+        msg = TX.msg.n_crawl_done + str(counts.get(ST.JobStatus.DONE, 0))
+        msg += "\n{}{}".format(TX.msg.n_crawl_edges, counts["edges"])
+        if left:
+            msg += "\n{}{}".format(TX.msg.n_crawl_queued,
+                                   counts.get(ST.JobStatus.QUEUED, 0))
+        if dead:
+            msg += "\n{}{}".format(TX.msg.n_job_dead, dead)
+        return (not dead, msg)
+
+    def refresh_due_citizens(self, p_budget: int = None) -> tuple:
+        """Refresh the citizens most likely to have changed.
+
+        IDs left queued by a cut-short run are resumed first, and
+        count against the budget. The rest of the budget goes to the
+        top due citizens from the Scheduler. No more than the budget
+        is fetched; anything beyond it stays queued for the next run.
+
+        Args:
+            p_budget (int, optional): most profile requests to make.
+                Defaults to self.refresh_budget.
+
+        Returns:
+            tuple: (bool: True if all picked IDs processed OK, else False,
+                    str: detail-level message)
+        """
+        budget = self.refresh_budget if p_budget is None else p_budget
+        job_id = DB.query_open_job("scheduled")
+        left = len(DB.query_job_queue(job_id)) if job_id else 0
+        id_list = SC.pick_due(max(0, budget - left))
+        msg = TX.msg.n_profiles_due + str(len(id_list))
+        status, msg_2 = self.get_erep_ctzn_by_id_list(id_list, "scheduled",
+                                                      max(0, budget))
+        msg += "\n{}".format(msg_2)
+        return (status, msg)
+
     def refresh_citizen_data_from_file(self,
-                                       p_id_list_path: str) -> tuple:
+                                       p_id_list_path: str,
+                                       p_stale_days: float = 1.0,
+                                       p_batch_size: int = 500) -> tuple:
         """Read list of IDs from file and pull citizen data from eRep.
 
+        The file is read in chunks and split on whitespace, commas,
+        semicolons, colons, tildes and quotes in one pass. Tokens that
+        are not numeric are dropped, and so are repeats. The rest are
+        queued on the id_list refresh job in batches, less any citizen
+        pulled within p_stale_days, so the file is never held in memory.
+
         Args:
             p_id_list_path (str): full path to file of profile IDs
+            p_stale_days (float): skip citizens pulled more recently.
+                0 pulls every ID in the file.
+            p_batch_size (int): IDs checked and queued at a time
 
         Returns:
             tuple: (bool: True if file processed OK, else False,
@@ -772,20 +1516,77 @@ class Controls(object):
         """
         if not Path(p_id_list_path).exists():
             return (False, "File could not be found")
-        with open(p_id_list_path) as idf:
-            id_list = idf.read()
-            idf.close()
-        id_list = id_list.replace('"', "")
-        id_list = id_list.replace("'", "")
-        id_list = id_list.replace(",", "\n")
-        id_list = id_list.replace(";", "\n")
-        id_list = id_list.replace(":", "\n")
-        id_list = id_list.replace("\t", "\n")
-        id_list = id_list.replace("~", "\n")
-        id_list = id_list.strip()
-        id_list = id_list.split("\n")
-        id_list = [i for i in id_list if i not in (" ", "")]
-        return self.get_erep_ctzn_by_id_list(id_list)
+        counts = dict()
+        id_iter = UT.iter_unique_ids(
+            UT.iter_tokens(UT.iter_file_chunks(p_id_list_path)), counts)
+        since_ts = UT.get_epoch(UT.get_utc_ts()) - int(p_stale_days * 86400)
+        fresh_cnt = 0
+        batch = list()
+        for profile_id in id_iter:
+            batch.append(profile_id)
+            if len(batch) >= p_batch_size:
+                fresh_cnt += self.queue_id_batch(batch, since_ts,
+                                                 p_stale_days > 0)
+                batch = list()
+        fresh_cnt += self.queue_id_batch(batch, since_ts, p_stale_days > 0)
+        msg = TX.msg.n_ids_read + str(counts["read"])
+        if counts["invalid"]:
+            msg += "\n{}{}".format(TX.msg.n_ids_invalid, counts["invalid"])
+        if counts["duplicate"]:
+            msg += "\n{}{}".format(TX.msg.n_ids_duplicate,
+                                   counts["duplicate"])
+        if fresh_cnt:
+            msg += "\n{}{}".format(TX.msg.n_ids_fresh, fresh_cnt)
+        status, msg_2 = self.get_erep_ctzn_by_id_list(list())
+        msg += "\n{}".format(msg_2)
+        return (status, msg)
+
+    def queue_id_batch(self,
+                       p_id_list: list,
+                       p_since_ts: int,
+                       p_skip_fresh: bool = True,
+                       p_job_kind: str = "id_list") -> int:
+        """Queue a batch of IDs on a refresh job.
+
+        Args:
+            p_id_list (list): citizen profile IDs
+            p_since_ts (int): epoch seconds. Citizens pulled since then
+                are not queued.
+            p_skip_fresh (bool): If False, queue all of p_id_list
+            p_job_kind (str): kind of refresh job to queue them on
+
+        Returns:
+            int: count of IDs not queued because they are fresh
+        """
+        if not p_id_list:
+            return 0
+        fresh = DB.query_pulled_since(p_id_list, p_since_ts)\
+            if p_skip_fresh else set()
+        if len(fresh) < len(p_id_list):
+            DB.enqueue_refresh_job(p_job_kind, [pid for pid in p_id_list
+                                                if pid not in fresh])
+        return len(fresh)
+
+    def get_friends_chunks(self,
+                           p_profile_id: str,
+                           p_use_file: bool = False) -> object:
+        """Get the user's friends page, as a stream of text chunks.
+
+        Args:
+            p_profile_id (str): citizen ID of user
+            p_use_file (bool): If True use cached Friends List if it exists,
+                            else Post to eRep to refresh user's friends list
+        Returns:
+            generator: page text chunks
+        """
+        cache_file = path.join(UT.get_home(), TX.dbs.cache_path,
+                               "friends_response")
+        if p_use_file and Path(cache_file).exists():
+            if self.logme:
+                msg = TX.logm.ll_cached_friends
+                self.LOG.write_log(ST.LogLevel.INFO, msg)
+            return UT.iter_file_chunks(cache_file)
+        return self.request_friends_list(p_profile_id)
 
     def get_erep_friends_data(self,
                               p_profile_id: str,
@@ -796,9 +1597,12 @@ class Controls(object):
         This could be replaced with a call to the erepublik.tools API, but
         then data might be slightly less fresh than calling eRep directly.
 
-        Wait 300 milliseconds between calls. Avoid looking like DDOS attack.
-        This is about 3 citizens per second. Pulling data takes about one
-        minute for every 180 citizens.
+        Wait self.request_delay (300 milliseconds) between calls. Avoid
+        looking like DDOS attack. This is about 3 citizens per second.
+        Pulling data takes about one minute for every 180 citizens.
+
+        The friends list is read as a stream. Profile pulls start with
+        the first friend, not after the whole list has been parsed.
 
         Args:
             p_profile_id (str): citizen ID of user
@@ -807,29 +1611,72 @@ class Controls(object):
         Returns:
             str: detail-level message about successful calls
         """
-        cache_file = path.join(UT.get_home(), TX.dbs.cache_path,
-                               "friends_response")
-        if p_use_file and Path(cache_file).exists():
-            with open(cache_file) as ff:
-                friends_data = ff.read()
-                ff.close()
-            if self.logme:
-                msg = TX.logm.ll_cached_friends
-                self.LOG.write_log(ST.LogLevel.INFO, msg)
-        else:
-            friends_data = self.request_friends_list(p_profile_id)
-        friends_data = friends_data.replace("\t", "").replace("\n", "")
-        friends_data = friends_data.split('$j("#citizen_name").tokenInput(')
-        friends_data = friends_data[1].split(', {prePopulate:')
-        friends_data = json.loads(friends_data[0])
-        count_hits = 0
+        friends_data = self.get_friends_chunks(p_profile_id, p_use_file)
+        checked = list()
         msg = None
-        for friend in friends_data:
-            print(TX.msg.n_lookup_nm + friend["name"])
-            self.get_erep_citizen_by_id(friend["id"],
-                                        p_use_file=False,
-                                        p_is_friend=True)
-            count_hits += 1
+        MT.reset()
+        with DB.use_db_profile(ST.DbProfile.BULK):
+            for friend_id, friend_nm in self.iter_friends(friends_data):
+                print(TX.msg.n_lookup_nm + friend_nm)
+                if self.get_erep_citizen_by_id(friend_id,
+                                               p_use_file=False,
+                                               p_is_friend=True):
+                    checked.append(friend_id)
+            DB.set_citizens_checked(checked)
+        count_hits = len(checked)
+        self.write_run_summary("friends")
         print(TX.msg.n_finito)
         msg = TX.msg.n_friends_pulled + str(count_hits)
         return msg
+
+    def sync_erep_friends(self,
+                          p_profile_id: str,
+                          p_use_file: bool = False,
+                          p_stale_days: float = 7.0) -> str:
+        """Bring friends on the DB in line with the user's friends list.
+
+        The friends list is diffed against the DB's friends as sets.
+        Only new friends, and friends not pulled in p_stale_days, are
+        pulled from eRep. Citizens who are no longer friends get
+        their "is_user_friend" flag cleared in one transaction.
+
+        Args:
+            p_profile_id (str): citizen ID of user
+            p_use_file (bool): If True use cached Friends List if it exists,
+                            else Post to eRep to refresh user's friends list
+            p_stale_days (float): re-pull friends last pulled longer ago
+
+        Returns:
+            str: detail-level message about the sync
+        """
+        friends = dict(self.iter_friends(
+            self.get_friends_chunks(p_profile_id, p_use_file)))
+        db_friends = DB.query_friend_sync_state()
+        stale_before = UT.get_epoch(UT.get_utc_ts()) - p_stale_days * 86400
+        added = friends.keys() - db_friends.keys()
+        removed = db_friends.keys() - friends.keys()
+        stale = set(pid for pid in friends.keys() & db_friends.keys()
+                    if db_friends[pid] < stale_before)
+        checked = list()
+        MT.reset()
+        with DB.use_db_profile(ST.DbProfile.BULK):
+            for friend_id in sorted(added | stale, key=int):
+                print(TX.msg.n_lookup_nm + friends[friend_id])
+                if self.get_erep_citizen_by_id(friend_id,
+                                               p_use_file=False,
+                                               p_is_friend=True):
+                    checked.append(friend_id)
+            DB.set_citizens_checked(checked)
+            DB.set_citizens_unfriended(removed)
+        MT.incr("friends_added", len(added))
+        MT.incr("friends_removed", len(removed))
+        MT.incr("friends_skipped", len(friends) - len(added) - len(stale))
+        self.write_run_summary("friends_sync")
+        print(TX.msg.n_finito)
+        msg = TX.msg.n_friends_pulled + str(len(checked))
+        msg += "\n{}{}".format(TX.msg.n_friends_added, len(added))
+        msg += "\n{}{}".format(TX.msg.n_friends_stale, len(stale))
+        msg += "\n{}{}".format(TX.msg.n_friends_removed, len(removed))
+        msg += "\n{}{}".format(TX.msg.n_friends_skipped,
+                               len(friends) - len(added) - len(stale))
+        return msg
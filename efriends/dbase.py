@@ -14,7 +14,49 @@ profile_id = eRepublik-provided citizen (player) ID.
 create_ts = when the original oid was added to db.
 update_ts = when a physical row (uid) was created ("upserted").
 delete_ts = when a physical row (uid) was logically deleted.
-hash_id = hash of all non-audit values in a row.
+hash_id = fingerprint of all non-audit values in a row. An update
+whose fingerprint matches the current version is not written.
+
+Citizen data is split into two physical tables:
+citizen_history_fact = append-only, every version of every citizen.
+citizen_current_fact = one row per profile_id, its latest active version.
+Both are written in the same transaction.
+
+Strings shared by many citizens (party, military unit, newspaper,
+residence and citizenship) are stored once, in the party,
+military_unit, newspaper and location lookup tables. Fact rows hold
+their INTEGER keys instead, see Structs.CitizenDims. Lookup rows are
+added as needed on every write.
+
+The citizen_history and citizen_current views join the lookups back
+in and show the full Structs.CitizenFields layout. The "citizen" view
+reads citizen_current, so saved SQL keeps reporting on current state.
+Use citizen_history to look back in time.
+For big group-bys, group on the lookup key of a *_fact table and
+join the lookup afterwards; that scans far less than the views do.
+citizen_metrics = typed numeric snapshot (level, xp, counts), keyed
+on (profile_id, ts) for charting. ts is in seconds, so it holds one
+row per citizen per second: the last version stored in that second.
+citizen_edge = friendships found by a crawl, stored both ways round.
+crawl_node = the crawl's BFS frontier, so a crawl can be resumed.
+name_cache = names looked up on erepublik.tools, found or not.
+
+Citizen flags are stored as INTEGER 0/1 and counts as INTEGER, per
+the annotations on Structs.CitizenFields. Reports compare with
+"is_alive = 1", not "is_alive = 'True'". Saved SQL in the db
+directory is rewritten that way when the flags are first typed.
+
+Each main db connection is tuned with pragmas from a named
+profile (see Structs.DbProfile). Bulk refreshes switch to the
+"bulk" profile for their duration.
+
+Every operation opens its own connection. Writers hold a normal
+connection; readers hold a read-only one. The DB runs in WAL mode,
+so reports and ad-hoc queries read the last committed state while
+a long refresh keeps writing, instead of waiting on its locks.
+
+PRAGMA user_version records how many schema migrations have been
+applied. Migrations run, in order, whenever the app starts.
 
 Non-audit values on the user table are encrypted
 at the column level. If file-level encryption is
@@ -25,15 +67,20 @@ Module:    dbase
 Class:     Dbase
 Author:    PQ <pq_rfw @ pm.me>
 """
+import re
 import sqlite3 as sq3
-# from collections import namedtuple
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
 from copy import copy
 from os import path, remove
 from pathlib import Path
 from pprint import pprint as pp  # noqa: F401
 from typing import Literal
+from urllib.request import pathname2url
 
 from cipher import Cipher
+from metrics import Metrics
 from structs import Structs
 from texts import Texts
 from utils import Utils
@@ -41,6 +88,7 @@ from utils import Utils
 UT = Utils()
 TX = Texts()
 CI = Cipher()
+MT = Metrics()
 ST = Structs()
 
 
@@ -58,72 +106,181 @@ class Dbase(object):
 
         dbaction = Literal['add', 'upd', 'del']
         tblnames = Literal['user', 'citizen']
+        vacuum = Literal['none', 'full', 'incremental']
+        bucket = Literal['daily', 'weekly']
+
+    def __init__(self, p_main_db: str = None):
+        """Initialize Dbase object.
+
+        Args:
+            p_main_db (str, optional): full path to main db file. Defaults
+                to efriends.db in the app's db directory.
+        """
+        self.main_db = p_main_db
+        self.busy_timeout = 30.0
+        self.thread_data = threading.local()
+        self.fingerprint_algos = {"user": ST.FingerprintAlgo.SHA256,
+                                  "citizen": ST.FingerprintAlgo.BLAKE2B_128}
+        self.migrations = [self.migrate_citizen_history,
+                           self.migrate_citizen_metrics,
+                           self.migrate_citizen_types,
+                           self.migrate_citizen_dims,
+                           self.migrate_citizen_checked,
+                           self.migrate_refresh_jobs,
+                           self.migrate_citizen_graph,
+                           self.migrate_name_cache]
+        self.db_profiles = {
+            "safe": ST.DbPragmas(synchronous='FULL', cache_size=-8000,
+                                 mmap_size=0, temp_store='DEFAULT'),
+            "normal": ST.DbPragmas(),
+            "bulk": ST.DbPragmas(synchronous='OFF', cache_size=-131072,
+                                 mmap_size=268435456)}
+        self.set_db_profile(ST.DbProfile.NORMAL)
+
+    def set_db_profile(self,
+                       p_profile: str,
+                       p_overrides: dict = None):
+        """Choose pragmas applied to main db connections from now on.
+
+        Args:
+            p_profile (str): key to ST.DbProfile: safe, normal, bulk
+            p_overrides (dict, optional): pragma values that replace
+                the preset's values, keyed like ST.DbPragmas
+        """
+        if p_profile not in self.db_profiles.keys():
+            msg = TX.shit.f_db_profile_req +\
+                str(list(self.db_profiles.keys()))
+            raise Exception(ValueError, msg)
+        self.db_profile = p_profile
+        self.db_pragmas = copy(self.db_profiles[p_profile])
+        for pragma, val in (p_overrides or dict()).items():
+            setattr(self.db_pragmas, pragma, val)
+
+    @contextmanager
+    def use_db_profile(self, p_profile: str):
+        """Switch to a pragma profile, restoring the prior one afterward.
+
+        Only affects connections opened by the calling thread, so a
+        bulk refresh does not change how a report thread connects.
+
+        Args:
+            p_profile (str): key to ST.DbProfile: safe, normal, bulk
+        """
+        if p_profile not in self.db_profiles.keys():
+            msg = TX.shit.f_db_profile_req +\
+                str(list(self.db_profiles.keys()))
+            raise Exception(ValueError, msg)
+        prev_pragmas = getattr(self.thread_data, "db_pragmas", None)
+        self.thread_data.db_pragmas = copy(self.db_profiles[p_profile])
+        try:
+            yield self
+        finally:
+            self.thread_data.db_pragmas = prev_pragmas
+
+    def set_pragmas(self,
+                    p_conn: object,
+                    p_read_only: bool = False):
+        """Apply current pragma profile to a main db connection.
+
+        A read-only connection cannot change journal_mode and never
+        commits, so only the caching pragmas apply to it.
+
+        Args:
+            p_conn (object): newly-opened connection to the main database
+            p_read_only (bool): If True, connection is read-only
+        """
+        db_pragmas = getattr(self.thread_data, "db_pragmas", None)\
+            or self.db_pragmas
+        for pragma in ST.DbPragmas.keys():
+            if p_read_only and pragma in ("journal_mode", "synchronous"):
+                continue
+            p_conn.execute("PRAGMA {} = {};".format(
+                pragma, getattr(db_pragmas, pragma)))
+
+    def get_main_db(self) -> str:
+        """Get full path to the main database file.
+
+        Resolved once. Looking up $HOME runs a shell command.
+
+        Returns:
+            str: full path to main db file
+        """
+        if self.main_db is None:
+            self.main_db = path.join(UT.get_home(), TX.dbs.db_path,
+                                     TX.dbs.db_name)
+        return self.main_db
 
     def create_main_db(self):
-        """Create main database."""
-        db_path = path.join(UT.get_home(), TX.dbs.db_path)
+        """Create main database. Bring its schema up to date."""
+        db_full_path = self.get_main_db()
+        db_path = path.dirname(db_full_path)
         if not Path(db_path).exists():
             msg = TX.shit.f_bad_path + db_path
             raise Exception(OSError, msg)
-        db_full_path = path.join(db_path, TX.dbs.db_name)
         if not Path(db_full_path).exists():
             self.create_tables(db_full_path)
+        self.migrate_db(db_full_path)
 
-    def disconnect_dmain(self):
-        """Drop connection to main database at specified path."""
-        if hasattr(self, "dmain_conn") and self.dmain_conn is not None:
-            try:
-                self.dmain_conn.close()
-            except RuntimeWarning:
-                pass
-        self.dmain_conn = None
-
-    def connect_dmain(self, p_main_db):
-        """Open connection to main database at specified path.
-
-        Create a db file if one does not already exist.
+    def disconnect_db(self, p_conn: object):
+        """Close a database connection.
 
         Args:
-            p_main_db (str): full path to main db file
+            p_conn (object): connection to close. Ignored if None.
         """
-        self.disconnect_dmain()
-        self.dmain_conn = sq3.connect(p_main_db)
-
-    def disconnect_dbkup(self):
-        """Drop connection to backup database at specified path."""
-        if hasattr(self, "dbkup_conn") and self.dbkup_conn is not None:
+        if p_conn is not None:
             try:
-                self.dbkup_conn.close()
+                p_conn.close()
             except RuntimeWarning:
                 pass
-        self.dbkup_conn = None
 
-    def connect_dbkup(self, p_bkup_db):
-        """Open connection to backup database at specified path.
+    def connect_dmain(self,
+                      p_main_db: str = None,
+                      p_read_only: bool = False) -> object:
+        """Open a new connection to main database.
+
+        Create a db file if one does not already exist, unless the
+        connection is read-only. Callers own the connection and must
+        close it. Prefer the dmain_reader/dmain_writer wrappers.
 
         Args:
-            p_bkup_db (str): full path to backup DB file
-        """
-        self.disconnect_dbkup()
-        self.dbkup_conn = sq3.connect(p_bkup_db)
+            p_main_db (str, optional): full path to main db file.
+                Defaults to get_main_db().
+            p_read_only (bool): If True, open in read-only mode
 
-    def disconnect_darcv(self):
-        """Drop connection to archive database at specified path."""
-        if hasattr(self, "darcv_conn") and self.darcv_conn is not None:
-            try:
-                self.darcv_conn.close()
-            except RuntimeWarning:
-                pass
-        self.darcv_conn = None
+        Returns:
+            object: sqlite3 connection
+        """
+        main_db = p_main_db or self.get_main_db()
+        if p_read_only:
+            conn = sq3.connect("file:{}?mode=ro".format(
+                pathname2url(main_db)), uri=True, timeout=self.busy_timeout)
+            conn.execute("PRAGMA query_only = ON;")
+        else:
+            conn = sq3.connect(main_db, timeout=self.busy_timeout)
+        self.set_pragmas(conn, p_read_only)
+        return conn
+
+    @contextmanager
+    def dmain_reader(self):
+        """Provide a read-only main db connection for one operation."""
+        conn = self.connect_dmain(p_read_only=True)
+        try:
+            yield conn
+        finally:
+            self.disconnect_db(conn)
 
-    def connect_darcv(self, p_arcv_db):
-        """Open connection to archive database at specified path.
+    @contextmanager
+    def dmain_writer(self):
+        """Provide a main db connection for one write transaction.
 
-        Args:
-            p_arcv_db (str): full path to archive DB file
+        Commits when the block exits normally, else rolls back.
         """
-        self.disconnect_darcv()
-        self.darcv_conn = sq3.connect(p_arcv_db)
+        conn = self.connect_dmain()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self.disconnect_db(conn)
 
     def get_data_keys(self, p_tbl_nm: Types.tblnames) -> list:
         """Get 'data' class column names for selected DB table.
@@ -138,8 +295,104 @@ class Dbase(object):
             else ST.CitizenFields.keys()
         return data_keys
 
+    def get_dim_tables(self) -> dict:
+        """Get the columns of each citizen lookup table.
+
+        Returns:
+            dict: {lookup table name: [column names]}
+        """
+        dim_tbls = dict()
+        for dim_key in ST.CitizenDims.keys():
+            tbl_nm, col_pairs = getattr(ST.CitizenDims, dim_key)
+            dim_cols = dim_tbls.setdefault(tbl_nm, list())
+            for _, dim_col in col_pairs:
+                if dim_col not in dim_cols:
+                    dim_cols.append(dim_col)
+        return dim_tbls
+
+    def get_fact_keys(self) -> list:
+        """Get the non-audit column names of the citizen fact tables.
+
+        Returns:
+            list: CitizenFields not held in lookups, then lookup keys
+        """
+        dim_fields = list()
+        for dim_key in ST.CitizenDims.keys():
+            _, col_pairs = getattr(ST.CitizenDims, dim_key)
+            dim_fields += [fld for fld, _ in col_pairs]
+        return [fld for fld in ST.CitizenFields.keys()
+                if fld not in dim_fields] + ST.CitizenDims.keys()
+
+    def set_dim_match_sql(self,
+                          p_dim_key: str,
+                          p_alias: str = None) -> tuple:
+        """Format SQL matching a citizen row to its lookup row.
+
+        Uses IS rather than = so that NULL parts match NULL.
+
+        Args:
+            p_dim_key (str): key column name, from Structs.CitizenDims
+            p_alias (str): If set, match lookup columns to this
+                table's CitizenFields columns. Else match to ? params.
+
+        Returns:
+            tuple: (str: WHERE condition, list: CitizenFields column
+                    per ? param, or None where the lookup column must
+                    be NULL)
+        """
+        tbl_nm, col_pairs = getattr(ST.CitizenDims, p_dim_key)
+        fields = dict((dim_col, fld) for fld, dim_col in col_pairs)
+        conds = list()
+        param_cols = list()
+        for dim_col in self.get_dim_tables()[tbl_nm]:
+            fld = fields.get(dim_col)
+            if p_alias is None:
+                conds.append("{}.{} IS ?".format(tbl_nm, dim_col))
+                param_cols.append(fld)
+            else:
+                conds.append("{}.{} IS {}".format(
+                    tbl_nm, dim_col,
+                    "NULL" if fld is None else p_alias + "." + fld))
+        return (" AND ".join(conds), param_cols)
+
+    def set_create_table_sql(self,
+                             p_tbl_nm: str,
+                             p_data_keys: list,
+                             p_pk_col: str = "uid") -> str:
+        """Format SQL for a CREATE TABLE.
+
+        Args:
+            p_tbl_nm (str): name of the physical table
+            p_data_keys (list): "data" dataclass column names
+            p_pk_col (str): primary key column. Default is uid.
+
+        Returns:
+            str: formatted SQL to execute
+        """
+        col_types = ST.CitizenFields.types()
+        col_nms = p_data_keys + ST.AuditFields.keys()
+        for ix, col in enumerate(col_nms):
+            if col == "encrypt_key":
+                col_nms[ix] = col + " BLOB"
+            elif col_types.get(col) in (int, bool):
+                col_nms[ix] = col + " INTEGER"
+            elif col in ST.CitizenDims.keys():
+                dim_tbl = getattr(ST.CitizenDims, col)[0]
+                col_nms[ix] = col + " INTEGER REFERENCES {0} ({0}_id)".format(
+                    dim_tbl)
+            else:
+                col_nms[ix] = col + " TEXT"
+            if col in ("oid", "uid", "create_ts", "hash_id", p_pk_col):
+                col_nms[ix] += " NOT NULL"
+            if col == p_pk_col:
+                col_nms[ix] += " PRIMARY KEY"
+        return "CREATE TABLE {}({});".format(p_tbl_nm, ", ".join(col_nms))
+
     def create_tables(self, p_db_path: str):
-        """Create DB tables on main database.
+        """Create base DB tables on main database.
+
+        These are the tables as originally designed. migrate_db()
+        takes them the rest of the way to the current schema.
 
         Args:
             p_db_path (str): Ful path to main DB location.
@@ -147,8 +400,11 @@ class Dbase(object):
         Raises:
             Fail if cursor connection has not been established.
         """
-        self.connect_dmain(p_db_path)
-        cur = self.dmain_conn.cursor()
+        # Plain connect: auto_vacuum must be set before journal_mode
+        # = WAL or any table, else SQLite ignores it.
+        conn = sq3.connect(p_db_path, timeout=self.busy_timeout)
+        cur = conn.cursor()
+        cur.execute("PRAGMA auto_vacuum = INCREMENTAL;")
         for tbl_nm in ['user', 'citizen']:
             sql = "SELECT name FROM sqlite_master " +\
                 "WHERE type='table' AND name='{}';".format(tbl_nm)
@@ -156,22 +412,367 @@ class Dbase(object):
             result = cur.fetchall()
             # Table does not exist...
             if len(result) == 0:
-                data_keys = self.get_data_keys(tbl_nm)
-                col_nms = data_keys + ST.AuditFields.keys()
-                for ix, col in enumerate(col_nms):
-                    if col == "encrypt_key":
-                        col_nms[ix] = col + " BLOB"
-                    else:
-                        col_nms[ix] = col + " TEXT"
-                    if col in ("oid", "uid", "create_ts", "hash_id"):
-                        col_nms[ix] += " NOT NULL"
-                    if col == "uid":
-                        col_nms[ix] += " PRIMARY KEY"
-                sql = "CREATE TABLE {}({});".format(tbl_nm, ", ".join(col_nms))
+                sql = self.set_create_table_sql(tbl_nm,
+                                                self.get_data_keys(tbl_nm))
                 cur.execute(sql)
         cur.close()
-        self.dmain_conn.commit()
-        self.disconnect_dmain()
+        conn.commit()
+        self.disconnect_db(conn)
+
+    def migrate_db(self, p_db_path: str):
+        """Apply any schema migrations not yet run on main database.
+
+        Each migration runs in its own transaction, together with
+        the bump of PRAGMA user_version that records it.
+
+        Saved SQL next to the DB is brought in line with typed flags
+        once migrate_citizen_types has run.
+
+        Args:
+            p_db_path (str): Full path to main DB location.
+        """
+        conn = self.connect_dmain(p_db_path)
+        version = conn.execute("PRAGMA user_version;").fetchone()[0]
+        try:
+            for ix, migrate in enumerate(self.migrations):
+                if ix < version:
+                    continue
+                conn.execute("BEGIN;")
+                migrate(conn)
+                conn.execute("PRAGMA user_version = {};".format(ix + 1))
+                conn.commit()
+        except sq3.Error:
+            conn.rollback()
+            raise
+        finally:
+            self.disconnect_db(conn)
+        if version <= self.migrations.index(self.migrate_citizen_types):
+            self.migrate_saved_sql(path.dirname(p_db_path))
+
+    def migrate_saved_sql(self, p_sql_dir: str) -> list:
+        """Rewrite text flag tests in saved SQL files as 1/0 tests.
+
+        After migrate_citizen_types, "is_alive = 'True'" matches no
+        rows. Such tests on Structs.CitizenFields flags become
+        "is_alive = 1". The file's hash line is updated to match, so
+        Reports still accepts it. Files whose hash did not match
+        before are left alone.
+
+        Args:
+            p_sql_dir (str): directory holding the saved .sql files
+
+        Returns:
+            list: names of the files rewritten
+        """
+        flags = [col for col, col_type in ST.CitizenFields.types().items()
+                 if col_type is bool]
+        flag_rx = re.compile(
+            r"\b({})\s*(=|==|!=|<>)\s*(['\"])(true|false)\3".format(
+                "|".join(flags)), re.IGNORECASE)
+        rewritten = list()
+        for sql_file in sorted(Path(p_sql_dir).glob("*.sql")):
+            with open(sql_file) as sqf:
+                head = [sqf.readline() for _ in range(3)]
+                sql = sqf.read()
+            old_hash = UT.get_hash(sql.strip())
+            if old_hash not in head[0]:
+                continue
+            new_sql = flag_rx.sub(
+                lambda m: "{} {} {}".format(
+                    m.group(1), m.group(2),
+                    1 if m.group(4).lower() == "true" else 0), sql)
+            if new_sql == sql:
+                continue
+            head[0] = head[0].replace(old_hash,
+                                      UT.get_hash(new_sql.strip()))
+            with open(sql_file, "w") as sqf:
+                sqf.write("".join(head) + new_sql)
+            rewritten.append(sql_file.name)
+        return rewritten
+
+    def migrate_citizen_history(self, p_conn: object):
+        """Migration 1. Split citizen into current and history tables.
+
+        The old citizen table becomes citizen_history as-is. The latest
+        active version of each profile_id is copied to citizen_current.
+
+        Args:
+            p_conn (object): open connection to the main database
+        """
+        col_nms_txt = ", ".join(ST.CitizenFields.keys() +
+                                ST.AuditFields.keys())
+        p_conn.execute("DROP INDEX IF EXISTS citizen_oid_ix;")
+        p_conn.execute("ALTER TABLE citizen RENAME TO citizen_history;")
+        p_conn.execute(self.set_create_table_sql(
+            "citizen_current", ST.CitizenFields.keys(), "profile_id"))
+        sql = "INSERT OR REPLACE INTO citizen_current ({}) ".format(
+            col_nms_txt)
+        sql += "SELECT {} FROM citizen_history ".format(col_nms_txt)
+        sql += "WHERE delete_ts IS NULL AND profile_id IS NOT NULL "
+        sql += "ORDER BY update_ts;"
+        p_conn.execute(sql)
+        for sql in (
+                "CREATE INDEX IF NOT EXISTS user_oid_ix " +
+                "ON user (oid, update_ts);",
+                "CREATE INDEX citizen_history_oid_ix " +
+                "ON citizen_history (oid, update_ts);",
+                "CREATE INDEX citizen_history_pid_ix " +
+                "ON citizen_history (profile_id, update_ts);",
+                "CREATE INDEX citizen_current_oid_ix " +
+                "ON citizen_current (oid);",
+                "CREATE INDEX citizen_current_name_ix " +
+                "ON citizen_current (name);",
+                "CREATE VIEW citizen AS SELECT * FROM citizen_current;"):
+            p_conn.execute(sql)
+
+    def migrate_citizen_metrics(self, p_conn: object):
+        """Migration 2. Add typed citizen_metrics table.
+
+        Backfill it from every version already in citizen_history.
+        Of versions stored within the same second, the latest wins.
+
+        Args:
+            p_conn (object): open connection to the main database
+        """
+        sql = "CREATE TABLE citizen_metrics ("
+        sql += "profile_id INTEGER NOT NULL, ts INTEGER NOT NULL, "
+        for col in ST.CitizenMetrics.keys()[2:]:
+            sql += "{} INTEGER, ".format(col)
+        sql += "PRIMARY KEY (profile_id, ts)) WITHOUT ROWID;"
+        p_conn.execute(sql)
+        p_conn.execute("CREATE INDEX citizen_metrics_ts_ix " +
+                       "ON citizen_metrics (ts);")
+        sql = "INSERT OR REPLACE INTO citizen_metrics ({}) ".format(
+            ", ".join(ST.CitizenMetrics.keys()))
+        sql += "SELECT CAST(profile_id AS INTEGER), CAST(strftime('%s', "
+        sql += "substr(update_ts, 1, 19)) AS INTEGER)"
+        for col in ST.CitizenMetrics.keys()[2:]:
+            sql += ", CASE WHEN {0} GLOB '[0-9]*' ".format(col)
+            sql += "THEN CAST({0} AS INTEGER) END".format(col)
+        sql += " FROM citizen_history WHERE profile_id GLOB '[0-9]*'"
+        sql += " ORDER BY update_ts;"
+        p_conn.execute(sql)
+
+    def migrate_citizen_types(self, p_conn: object):
+        """Migration 3. Rebuild citizen tables with typed columns.
+
+        "True"/"False" become 1/0, numeric text becomes INTEGER and
+        the literal "None" becomes NULL.
+
+        Args:
+            p_conn (object): open connection to the main database
+        """
+        col_nms = ST.CitizenFields.keys() + ST.AuditFields.keys()
+        col_types = ST.CitizenFields.types()
+        sel_cols = list()
+        for col in col_nms:
+            if col_types.get(col) is bool:
+                sel_cols.append(
+                    "CASE WHEN {0} IN ('True', 'true', '1') THEN 1 "
+                    "WHEN {0} IN ('False', 'false', '0') THEN 0 END".format(
+                        col))
+            elif col_types.get(col) is int:
+                sel_cols.append("CASE WHEN {0} GLOB '[0-9]*' THEN "
+                                "CAST({0} AS INTEGER) END".format(col))
+            else:
+                sel_cols.append("NULLIF({}, 'None')".format(col))
+        p_conn.execute("DROP VIEW citizen;")
+        for tbl_nm, pk_col in (("citizen_history", "uid"),
+                               ("citizen_current", "profile_id")):
+            p_conn.execute(self.set_create_table_sql(
+                tbl_nm + "_typed", ST.CitizenFields.keys(), pk_col))
+            sql = "INSERT INTO {}_typed ({}) SELECT {} FROM {};".format(
+                tbl_nm, ", ".join(col_nms), ", ".join(sel_cols), tbl_nm)
+            p_conn.execute(sql)
+            p_conn.execute("DROP TABLE {};".format(tbl_nm))
+            p_conn.execute("ALTER TABLE {0}_typed RENAME TO {0};".format(
+                tbl_nm))
+        for sql in (
+                "CREATE INDEX citizen_history_oid_ix " +
+                "ON citizen_history (oid, update_ts);",
+                "CREATE INDEX citizen_history_pid_ix " +
+                "ON citizen_history (profile_id, update_ts);",
+                "CREATE INDEX citizen_current_oid_ix " +
+                "ON citizen_current (oid);",
+                "CREATE INDEX citizen_current_name_ix " +
+                "ON citizen_current (name);",
+                "CREATE VIEW citizen AS SELECT * FROM citizen_current;"):
+            p_conn.execute(sql)
+
+    def set_citizen_view_sql(self,
+                             p_view_nm: str,
+                             p_fact_nm: str) -> str:
+        """Format SQL for a view showing a fact table in CitizenFields form.
+
+        Args:
+            p_view_nm (str): name of the view to create
+            p_fact_nm (str): citizen fact table to read
+
+        Returns:
+            str: formatted SQL to execute
+        """
+        sel_cols = dict((fld, "f." + fld) for fld in ST.CitizenFields.keys())
+        joins = list()
+        for dim_key in ST.CitizenDims.keys():
+            tbl_nm, col_pairs = getattr(ST.CitizenDims, dim_key)
+            alias = dim_key.replace("_id", "")
+            for fld, dim_col in col_pairs:
+                sel_cols[fld] = "{}.{} AS {}".format(alias, dim_col, fld)
+            joins.append("LEFT JOIN {0} {1} ON {1}.{0}_id = f.{2}".format(
+                tbl_nm, alias, dim_key))
+        sql = "CREATE VIEW {} AS SELECT ".format(p_view_nm)
+        sql += ", ".join(list(sel_cols.values()) +
+                         ["f." + col for col in ST.AuditFields.keys()])
+        sql += " FROM {} f {};".format(p_fact_nm, " ".join(joins))
+        return sql
+
+    def migrate_citizen_dims(self, p_conn: object):
+        """Migration 4. Move repeated citizen strings to lookup tables.
+
+        Lookup rows are loaded from the distinct values in
+        citizen_history. Both citizen tables are then rebuilt as
+        *_fact tables holding lookup keys, and replaced by views of
+        the same name, so existing SQL keeps working.
+
+        Args:
+            p_conn (object): open connection to the main database
+        """
+        for tbl_nm, dim_cols in self.get_dim_tables().items():
+            p_conn.execute(
+                "CREATE TABLE {0} ({0}_id INTEGER PRIMARY KEY, {1}, "
+                "UNIQUE ({2}));".format(
+                    tbl_nm, ", ".join([col + " TEXT" for col in dim_cols]),
+                    ", ".join(dim_cols)))
+        for dim_key in ST.CitizenDims.keys():
+            tbl_nm, col_pairs = getattr(ST.CitizenDims, dim_key)
+            match_sql, _ = self.set_dim_match_sql(dim_key, "h")
+            flds = [fld for fld, _ in col_pairs]
+            sql = "INSERT INTO {} ({}) SELECT DISTINCT {}".format(
+                tbl_nm, ", ".join([dim_col for _, dim_col in col_pairs]),
+                ", ".join(["h." + fld for fld in flds]))
+            sql += " FROM citizen_history h WHERE ({})".format(
+                " OR ".join(["h." + fld + " IS NOT NULL" for fld in flds]))
+            sql += " AND NOT EXISTS (SELECT 1 FROM {} WHERE {});".format(
+                tbl_nm, match_sql)
+            p_conn.execute(sql)
+        fact_keys = self.get_fact_keys()
+        sel_cols = list()
+        for col in fact_keys:
+            if col in ST.CitizenDims.keys():
+                tbl_nm, _ = getattr(ST.CitizenDims, col)
+                match_sql, _ = self.set_dim_match_sql(col, "h")
+                sel_cols.append("(SELECT {0}_id FROM {0} WHERE {1})".format(
+                    tbl_nm, match_sql))
+            else:
+                sel_cols.append("h." + col)
+        sel_cols += ["h." + col for col in ST.AuditFields.keys()]
+        p_conn.execute("DROP VIEW citizen;")
+        for tbl_nm, pk_col in (("citizen_history", "uid"),
+                               ("citizen_current", "profile_id")):
+            p_conn.execute(self.set_create_table_sql(
+                tbl_nm + "_fact", fact_keys, pk_col))
+            sql = "INSERT INTO {}_fact ({}) SELECT {} FROM {} h;".format(
+                tbl_nm, ", ".join(fact_keys + ST.AuditFields.keys()),
+                ", ".join(sel_cols), tbl_nm)
+            p_conn.execute(sql)
+            p_conn.execute("DROP TABLE {};".format(tbl_nm))
+        for sql in (
+                "CREATE INDEX citizen_history_oid_ix " +
+                "ON citizen_history_fact (oid, update_ts);",
+                "CREATE INDEX citizen_history_pid_ix " +
+                "ON citizen_history_fact (profile_id, update_ts);",
+                "CREATE INDEX citizen_current_oid_ix " +
+                "ON citizen_current_fact (oid);",
+                "CREATE INDEX citizen_current_name_ix " +
+                "ON citizen_current_fact (name);",
+                self.set_citizen_view_sql("citizen_history",
+                                          "citizen_history_fact"),
+                self.set_citizen_view_sql("citizen_current",
+                                          "citizen_current_fact"),
+                "CREATE VIEW citizen AS SELECT * FROM citizen_current;"):
+            p_conn.execute(sql)
+
+    def migrate_citizen_checked(self, p_conn: object):
+        """Migration 5. Add citizen_checked table.
+
+        Records when each citizen was last pulled from eRep, whether
+        or not anything had changed. A new version only gets written
+        on change, so update_ts alone cannot tell.
+
+        Args:
+            p_conn (object): open connection to the main database
+        """
+        p_conn.execute("CREATE TABLE citizen_checked (" +
+                       "profile_id INTEGER PRIMARY KEY, " +
+                       "checked_ts INTEGER NOT NULL);")
+
+    def migrate_refresh_jobs(self, p_conn: object):
+        """Migration 6. Add job store for bulk refresh runs.
+
+        refresh_job has one row per run. refresh_job_item holds its
+        queue of profile IDs, each with status, attempts and last error.
+
+        Args:
+            p_conn (object): open connection to the main database
+        """
+        for sql in (
+                "CREATE TABLE refresh_job (job_id TEXT PRIMARY KEY, " +
+                "kind TEXT NOT NULL, create_ts TEXT NOT NULL, " +
+                "finish_ts TEXT);",
+                "CREATE TABLE refresh_job_item (" +
+                "job_id TEXT NOT NULL, seq INTEGER NOT NULL, " +
+                "profile_id TEXT NOT NULL, status TEXT NOT NULL, " +
+                "attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT, " +
+                "update_ts TEXT, PRIMARY KEY (job_id, profile_id)) " +
+                "WITHOUT ROWID;",
+                "CREATE INDEX refresh_job_item_status_ix " +
+                "ON refresh_job_item (job_id, status, seq);"):
+            p_conn.execute(sql)
+
+    def migrate_citizen_graph(self, p_conn: object):
+        """Migration 7. Add friendship edges and the crawl frontier.
+
+        citizen_edge holds each friendship both ways round, so either
+        end can be looked up on the primary key. crawl_node is the
+        frontier of a friend-of-friend crawl: each citizen reached,
+        its BFS depth, and whether its friends were expanded yet.
+
+        Args:
+            p_conn (object): open connection to the main database
+        """
+        for sql in (
+                "CREATE TABLE citizen_edge (" +
+                "profile_id INTEGER NOT NULL, friend_id INTEGER NOT NULL, " +
+                "seen_ts INTEGER NOT NULL, " +
+                "PRIMARY KEY (profile_id, friend_id)) WITHOUT ROWID;",
+                "CREATE INDEX citizen_edge_friend_ix " +
+                "ON citizen_edge (friend_id);",
+                "CREATE TABLE crawl_node (" +
+                "profile_id INTEGER PRIMARY KEY, depth INTEGER NOT NULL, " +
+                "status TEXT NOT NULL, " +
+                "attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT, " +
+                "update_ts TEXT);",
+                "CREATE INDEX crawl_node_status_ix " +
+                "ON crawl_node (status, depth);"):
+            p_conn.execute(sql)
+
+    def migrate_name_cache(self, p_conn: object):
+        """Migration 8. Add name_cache table and index past names.
+
+        name_cache keeps the outcome of each remote name lookup.
+        profile_id is NULL when no citizen has the name. resolved_ts
+        is epoch seconds.
+
+        Args:
+            p_conn (object): open connection to the main database
+        """
+        for sql in (
+                "CREATE TABLE name_cache (name TEXT PRIMARY KEY, " +
+                "profile_id INTEGER, resolved_ts INTEGER NOT NULL) " +
+                "WITHOUT ROWID;",
+                "CREATE INDEX citizen_history_name_ix " +
+                "ON citizen_history_fact (name, update_ts);"):
+            p_conn.execute(sql)
 
     def backup_db(self):
         """Make full backup of the main database to the backup db.
@@ -179,13 +780,13 @@ class Dbase(object):
         Create a backup database file if it does not exist, else
           overwrite existing backup DB file.
         """
-        main_db = path.join(UT.get_home(), TX.dbs.db_path, TX.dbs.db_name)
+        main_db = self.get_main_db()
         bkup_db = path.join(UT.get_home(), TX.dbs.bkup_path, TX.dbs.db_name)
-        self.connect_dmain(main_db)
-        self.connect_dbkup(bkup_db)
-        self.dmain_conn.backup(self.dbkup_conn, pages=0, progress=None)
-        self.disconnect_dmain()
-        self.disconnect_dbkup()
+        main_conn = self.connect_dmain(main_db, p_read_only=True)
+        bkup_conn = sq3.connect(bkup_db)
+        main_conn.backup(bkup_conn, pages=0, progress=None)
+        self.disconnect_db(main_conn)
+        self.disconnect_db(bkup_conn)
 
     def archive_db(self):
         """Make full backup of main database with a timestamp.
@@ -193,56 +794,137 @@ class Dbase(object):
         Distinct from regular backup file. A time-stamped, one-time copy.
         Make a point-in-time copy, e.g., prior to doing a purge.
         """
-        main_db = path.join(UT.get_home(), TX.dbs.db_path, TX.dbs.db_name)
-        dttm = UT.get_dttm('UTC')
-        arcv_db = path.join(UT.get_home(), TX.dbs.arcv_path,
-                            "{}.{}".format(TX.dbs.db_name, dttm.curr_ts))
-        self.connect_dmain(main_db)
-        self.connect_darcv(arcv_db)
-        self.dmain_conn.backup(self.darcv_conn, pages=0, progress=None)
-        self.disconnect_dmain()
-        self.disconnect_darcv()
+        main_db = self.get_main_db()
+        arcv_db = path.join(UT.get_home(), TX.dbs.arcv_path, "{}.{}".format(
+            TX.dbs.db_name, UT.get_utc_ts(p_compact=True)))
+        main_conn = self.connect_dmain(main_db, p_read_only=True)
+        arcv_conn = sq3.connect(arcv_db)
+        main_conn.backup(arcv_conn, pages=0, progress=None)
+        self.disconnect_db(main_conn)
+        self.disconnect_db(arcv_conn)
 
     def set_insert_sql(self,
-                       p_tbl_nm: Types.tblnames,
+                       p_tbl_nm: str,
                        p_data_rec: dict,
-                       p_audit_rec: dict) -> str:
-        """Format SQL for an INSERT.
+                       p_audit_rec: dict,
+                       p_replace: bool = False) -> tuple:
+        """Format parameterized SQL for an INSERT.
 
         Args:
-            p_tbl_nm (Types.tblnames -> str): user, citizen
+            p_tbl_nm (str): name of the physical table
             p_data_rec (dict): mirrors a "data" dataclass
             p_audit_rec (dict): mirrors the "audit" dataclass
+            p_replace (bool): If True, do INSERT OR REPLACE
 
         Returns:
-            str: formatted SQL to execute
+            tuple: (str: formatted SQL to execute, list: values to bind)
         """
         sql_cols = list(p_data_rec.keys()) + list(p_audit_rec.keys())
-        sql_cols_txt = ", ".join(sql_cols)
-        sql_vals = ""
-        for cnm, val in p_data_rec.items():
-            if cnm == "encrypt_key":
-                sql_vals += "?, "
-            elif val is None:
-                sql_vals += "NULL, "
-            else:
-                sql_vals += "'{}', ".format(val)
-        for cnm, val in p_audit_rec.items():
-            if val is None:
-                sql_vals += "NULL, "
+        sql_vals = list(p_data_rec.values()) + list(p_audit_rec.values())
+        sql = "INSERT OR REPLACE" if p_replace else "INSERT"
+        sql += " INTO {} ({}) VALUES ({});".format(
+            p_tbl_nm, ", ".join(sql_cols), ", ".join(["?"] * len(sql_cols)))
+        return (sql, sql_vals)
+
+    def set_dim_sql(self,
+                    p_data_rec: dict) -> list:
+        """Format SQL adding any new lookup rows a citizen points to.
+
+        Args:
+            p_data_rec (dict): mirrors ST.CitizenFields
+
+        Returns:
+            list: of (str: SQL, list: values to bind) tuples
+        """
+        stmts = list()
+        for dim_key in ST.CitizenDims.keys():
+            tbl_nm, col_pairs = getattr(ST.CitizenDims, dim_key)
+            if all(p_data_rec[fld] is None for fld, _ in col_pairs):
+                continue
+            match_sql, param_cols = self.set_dim_match_sql(dim_key)
+            dim_vals = [None if fld is None else p_data_rec[fld]
+                        for fld in param_cols]
+            sql = "INSERT INTO {} ({}) SELECT {}".format(
+                tbl_nm, ", ".join(self.get_dim_tables()[tbl_nm]),
+                ", ".join(["?"] * len(dim_vals)))
+            sql += " WHERE NOT EXISTS (SELECT 1 FROM {} WHERE {});".format(
+                tbl_nm, match_sql)
+            stmts.append((sql, dim_vals + dim_vals))
+        return stmts
+
+    def set_fact_insert_sql(self,
+                            p_tbl_nm: str,
+                            p_data_rec: dict,
+                            p_audit_rec: dict,
+                            p_replace: bool = False) -> tuple:
+        """Format parameterized SQL for an INSERT to a citizen fact table.
+
+        Lookup keys are resolved by sub-select, so set_dim_sql()
+        must run first in the same transaction.
+
+        Args:
+            p_tbl_nm (str): citizen_history_fact, citizen_current_fact
+            p_data_rec (dict): mirrors ST.CitizenFields
+            p_audit_rec (dict): mirrors the "audit" dataclass
+            p_replace (bool): If True, do INSERT OR REPLACE
+
+        Returns:
+            tuple: (str: formatted SQL to execute, list: values to bind)
+        """
+        sql_cols = self.get_fact_keys()
+        sql_exprs = list()
+        sql_vals = list()
+        for col in sql_cols:
+            if col in ST.CitizenDims.keys():
+                tbl_nm, _ = getattr(ST.CitizenDims, col)
+                match_sql, param_cols = self.set_dim_match_sql(col)
+                sql_exprs.append("(SELECT {0}_id FROM {0} WHERE {1})".format(
+                    tbl_nm, match_sql))
+                sql_vals += [None if fld is None else p_data_rec[fld]
+                             for fld in param_cols]
             else:
-                sql_vals += "'{}', ".format(val)
-        sql = "INSERT INTO {} ({}) VALUES ({});".format(p_tbl_nm,
-                                                        sql_cols_txt,
-                                                        sql_vals[:-2])
-        return(sql)
+                sql_exprs.append("?")
+                sql_vals.append(p_data_rec[col])
+        sql_cols += list(p_audit_rec.keys())
+        sql_exprs += ["?"] * len(p_audit_rec)
+        sql_vals += list(p_audit_rec.values())
+        sql = "INSERT OR REPLACE" if p_replace else "INSERT"
+        sql += " INTO {} ({}) VALUES ({});".format(
+            p_tbl_nm, ", ".join(sql_cols), ", ".join(sql_exprs))
+        return (sql, sql_vals)
+
+    def cast_data_values(self,
+                         p_tbl_nm: Types.tblnames,
+                         p_data: dict) -> dict:
+        """Convert citizen values to the types of their DB columns.
+
+        User values are left alone. They are encrypted as strings.
+
+        Args:
+            p_tbl_nm (Types.tblnames -> str): user, citizen
+            p_data (dict): mirrors a "data" dataclass
+
+        Returns:
+            dict: "data" row with typed values
+        """
+        if p_tbl_nm == "user":
+            return p_data
+        col_types = ST.CitizenFields.types()
+        data_rec = dict()
+        for cnm, val in p_data.items():
+            data_rec[cnm] = UT.cast_value(val, col_types[cnm])
+        return data_rec
 
     def hash_data_values(self,
+                         p_tbl_nm: Types.tblnames,
                          p_data_rec: dict,
                          p_audit_rec: dict) -> tuple:
-        """Hash a data row as needed.
+        """Set hash_id to the fingerprint of a data row.
+
+        The algorithm is picked per table from self.fingerprint_algos.
 
         Args:
+            p_tbl_nm (Types.tblnames -> str): user, citizen
             p_data_rec (dict): mirrors "data" dataclass
             p_audit_rec (dict): mirrors "audit" dataclass
 
@@ -251,12 +933,11 @@ class Dbase(object):
         """
         data_rec = p_data_rec
         audit_rec = p_audit_rec
-        hash_str = ""
-        for cnm, val in p_data_rec.items():
-            if (cnm != "encrypt_key"
-                    and val not in (None, "None", "")):
-                hash_str += str(val)
-        audit_rec["hash_id"] = UT.get_hash(hash_str)
+        with MT.timer("hash"):
+            audit_rec["hash_id"] = UT.get_fingerprint(
+                [val for cnm, val in p_data_rec.items()
+                 if cnm != "encrypt_key"],
+                self.fingerprint_algos[p_tbl_nm])
         return(data_rec, audit_rec)
 
     def encrypt_data_values(self,
@@ -269,12 +950,7 @@ class Dbase(object):
         Returns:
             dict: encrypted "data" row
         """
-        data_rec = p_data
-        for cnm, val in p_data.items():
-            if (cnm != "encrypt_key"
-                    and val not in (None, "None", "")):
-                data_rec[cnm] = CI.encrypt(str(val), p_data["encrypt_key"])
-        return data_rec
+        return CI.get_suite(p_data["encrypt_key"]).encrypt_row(p_data)
 
     def query_latest(self,
                      p_tbl_nm: Types.tblnames,
@@ -317,17 +993,12 @@ class Dbase(object):
             audit_rec[cnm] = copy(getattr(ST.AuditFields, cnm))
         audit_rec["uid"] = UT.get_uid()
         audit_rec["oid"] = UT.get_uid()
-        dttm = UT.get_dttm('UTC')
-        audit_rec["create_ts"] = dttm.curr_utc
-        audit_rec["update_ts"] = dttm.curr_utc
+        audit_rec["create_ts"] = UT.get_utc_ts()
+        audit_rec["update_ts"] = audit_rec["create_ts"]
         audit_rec["delete_ts"] = None
+        p_data = self.cast_data_values(p_tbl_nm, p_data)
         data_rec, audit_rec =\
-            self.hash_data_values(p_data, audit_rec)
-        recs = self.query_latest(p_tbl_nm, audit_rec["oid"])
-        if recs is not None:
-            aud = UT.make_namedtuple("aud", recs["audit"])
-            if aud.hash_id == audit_rec["hash_id"]:
-                return(None, None)
+            self.hash_data_values(p_tbl_nm, p_data, audit_rec)
         if p_tbl_nm == "user":
             p_data["encrypt_key"] = CI.set_key()
             data_rec = self.encrypt_data_values(p_data)
@@ -347,9 +1018,8 @@ class Dbase(object):
             p_oid (str): Object ID of record to be updated
 
         Returns:
-            tuple: (dict: "data":.., dict: "audit":..,
-                    hash_id of previous version) if prev row exits, else
-                    (None, None, None)
+            tuple: (dict: "data":.., dict: "audit":..) if values changed,
+                   else (None, None)
         """
         recs = self.query_latest(p_tbl_nm, p_oid)
         aud = UT.make_namedtuple("aud", recs["audit"])
@@ -361,102 +1031,228 @@ class Dbase(object):
         audit_rec["uid"] = UT.get_uid()
         audit_rec['oid'] = copy(aud.oid)
         audit_rec['create_ts'] = copy(aud.create_ts)
-        dttm = UT.get_dttm('UTC')
-        audit_rec['update_ts'] = dttm.curr_utc
+        audit_rec['update_ts'] = UT.get_utc_ts()
         if p_tbl_nm == "user" and p_data["encrypt_key"] in (None, "None", ""):
             p_data["encrypt_key"] = copy(dat.encrypt_key)
+        p_data = self.cast_data_values(p_tbl_nm, p_data)
         data_rec, audit_rec =\
-            self.hash_data_values(p_data, audit_rec)
+            self.hash_data_values(p_tbl_nm, p_data, audit_rec)
         if p_tbl_nm == "user":
             data_rec = self.encrypt_data_values(p_data)
         if aud.hash_id == audit_rec["hash_id"]:
-            return(None, None, None)
-        return(data_rec, audit_rec, aud.hash_id)
+            return(None, None)
+        return(data_rec, audit_rec)
 
     def set_logical_delete_sql(self,
                                p_tbl_nm: Types.tblnames,
-                               p_oid: str):
-        """Store non-NULL delete_ts on previously-active record.
+                               p_oid: str,
+                               p_delete_ts: str = None,
+                               p_current: bool = True) -> list:
+        """Store non-NULL delete_ts on previously-active record(s).
+
+        For citizen, also drop the object from citizen_current unless
+        p_current is False, i.e., a new version is about to replace it.
 
         Args:
             p_tbl_nm (Types.tblnames -> str): user, citizen
             p_oid (str): Object ID of record to be marked as deleted.
+            p_delete_ts (str): Optional. Defaults to current UTC time.
+            p_current (bool): If True, remove row from citizen_current
+
+        Returns:
+            list: of (str: SQL, list: values to bind) tuples
         """
-        recs = self.query_latest(p_tbl_nm, p_oid, False)
-        try:
-            aud = UT.make_namedtuple("aud", recs[0]["audit"])
-        except:     # noqa: E722
-            aud = UT.make_namedtuple("aud", recs["audit"])
-        dttm = UT.get_dttm('UTC')
-        sql = "UPDATE {}".format(p_tbl_nm)
-        sql += " SET delete_ts = '{}'".format(dttm.curr_utc)
-        sql += " WHERE uid = '{}';".format(aud.uid)
-        return sql
+        if p_delete_ts is None:
+            p_delete_ts = UT.get_utc_ts()
+        hist_tbl = "user" if p_tbl_nm == "user" else "citizen_history_fact"
+        sql = "UPDATE {} SET delete_ts = ?".format(hist_tbl)
+        sql += " WHERE oid = ? AND delete_ts IS NULL;"
+        stmts = [(sql, [p_delete_ts, p_oid])]
+        if p_tbl_nm == "citizen" and p_current:
+            stmts.append(("DELETE FROM citizen_current_fact WHERE oid = ?;",
+                          [p_oid]))
+        return stmts
+
+    def set_write_sql(self,
+                      p_tbl_nm: Types.tblnames,
+                      p_data_rec: dict,
+                      p_audit_rec: dict) -> list:
+        """Format SQL to store a new row version.
+
+        For citizen, the version is appended to citizen_history and
+        replaces whatever citizen_current held for its profile_id,
+        after adding any lookup rows it needs.
 
-    def execute_txn_sql(self,
-                        p_db_action: Types.dbaction,
-                        p_tbl_nm: Types.tblnames,
-                        p_sql: str,
-                        p_oid: str = None,
-                        p_encrypt_key: str = None):
+        Args:
+            p_tbl_nm (Types.tblnames -> str): user, citizen
+            p_data_rec (dict): mirrors a "data" dataclass
+            p_audit_rec (dict): mirrors the "audit" dataclass
+
+        Returns:
+            list: of (str: SQL, list: values to bind) tuples
+        """
+        if p_tbl_nm == "user":
+            return [self.set_insert_sql("user", p_data_rec, p_audit_rec)]
+        return self.set_dim_sql(p_data_rec) +\
+            [self.set_fact_insert_sql("citizen_history_fact",
+                                      p_data_rec, p_audit_rec),
+             self.set_fact_insert_sql("citizen_current_fact",
+                                      p_data_rec, p_audit_rec, True),
+             self.set_metrics_sql(p_data_rec, p_audit_rec)]
+
+    def set_metrics_sql(self,
+                        p_data_rec: dict,
+                        p_audit_rec: dict) -> tuple:
+        """Format SQL to store the metrics snapshot of a citizen version.
+
+        The series holds one sample per citizen per second, by design:
+        charts have no use for finer steps. A second version stored
+        within the same second replaces the first. Every version is
+        still kept on citizen_history.
+
+        Args:
+            p_data_rec (dict): mirrors ST.CitizenFields
+            p_audit_rec (dict): mirrors the "audit" dataclass
+
+        Returns:
+            tuple: (str: formatted SQL to execute, list: values to bind)
+        """
+        sql_vals = [UT.cast_value(p_data_rec["profile_id"], int),
+                    UT.get_epoch(p_audit_rec["update_ts"])]
+        for col in ST.CitizenMetrics.keys()[2:]:
+            sql_vals.append(p_data_rec[col])
+        sql = "INSERT OR REPLACE INTO citizen_metrics ({}) ".format(
+            ", ".join(ST.CitizenMetrics.keys()))
+        sql += "VALUES ({});".format(", ".join(["?"] * len(sql_vals)))
+        return (sql, sql_vals)
+
+    def execute_txn_sql(self, p_stmts: list):
         """Execute SQL to modify the database content.
 
+        All statements succeed or fail together in one transaction.
+
         Args:
-            p_db_action (Types.dbaction -> string): add, upd, del
-            p_tbl_nm (Types.tblnames -> str): user, citizen
-            p_sql (string): the SQL statement to execute
-            p_oid (string): if updating a record, used to delete previous
-            p_encrypt_key (string): if adding or updating a user record
-        """
-        main_db = path.join(UT.get_home(), TX.dbs.db_path, TX.dbs.db_name)
-        self.connect_dmain(main_db)
-        cur = self.dmain_conn.cursor()
-        if p_encrypt_key:
-            try:
-                cur.execute(p_sql, [p_encrypt_key])
-                self.dmain_conn.commit()
-            except IOError:
-                self.dmain_conn.close()
-        else:
-            try:
-                cur.execute(p_sql)
-                self.dmain_conn.commit()
-            except IOError:
-                self.dmain_conn.close()
-        self.dmain_conn.close()
-        if p_db_action == "upd":
-            self.write_db("del", p_tbl_nm, None, p_oid)
+            p_stmts (list): of (str: SQL, list: values to bind) tuples
+        """
+        with MT.timer("db_write"), self.dmain_writer() as conn:
+            for sql, sql_vals in p_stmts:
+                conn.execute(sql, sql_vals)
 
-    def write_db(self,
-                 p_db_action: Types.dbaction,
-                 p_tbl_nm: Types.tblnames,
-                 p_data: dict = None,
-                 p_oid: str = None):
-        """Write a record to the DB.
+    def set_db_stmts(self,
+                     p_db_action: Types.dbaction,
+                     p_tbl_nm: Types.tblnames,
+                     p_data: dict = None,
+                     p_oid: str = None) -> list:
+        """Format SQL to write a record to the DB.
 
         Args:
             p_db_action (Types.dbaction -> str): add, upd, del
             p_tbl_nm (Types.tblnames -> str): user, citizen
             p_data (dict): mirrors a "data" dataclass. None if "del".
             p_oid (string): Required for upd, del. Default is None.
+
+        Returns:
+            list: of (str: SQL, list: values to bind) tuples. Empty if
+                an update has no value-changes.
         """
+        stmts = list()
         if p_db_action == "add":
             data_rec, audit_rec = self.set_insert_data(p_tbl_nm, p_data)
         elif p_db_action == "upd":
-            data_rec, audit_rec, prev_hash_id =\
+            data_rec, audit_rec =\
                 self.set_upsert_data(p_tbl_nm, p_data, p_oid)
-        sql = ""
-        encrypt_key = ""
+            if audit_rec is not None:
+                stmts = self.set_logical_delete_sql(
+                    p_tbl_nm, p_oid, audit_rec["update_ts"], False)
         if p_db_action in ("add", "upd"):
             if data_rec is not None and audit_rec is not None:
-                sql = self.set_insert_sql(p_tbl_nm, data_rec, audit_rec)
-                encrypt_key = data_rec["encrypt_key"]\
-                    if "encrypt_key" in data_rec.keys() else False
+                stmts += self.set_write_sql(p_tbl_nm, data_rec, audit_rec)
         elif p_db_action == "del":
-            sql = self.set_logical_delete_sql(p_tbl_nm, p_oid)
-        if sql:
-            self.execute_txn_sql(p_db_action, p_tbl_nm, sql,
-                                 p_oid, encrypt_key)
+            stmts = self.set_logical_delete_sql(p_tbl_nm, p_oid)
+        MT.incr("rows_unchanged" if not stmts
+                else {"add": "rows_added", "upd": "rows_updated",
+                      "del": "rows_deleted"}[p_db_action])
+        return stmts
+
+    def write_db(self,
+                 p_db_action: Types.dbaction,
+                 p_tbl_nm: Types.tblnames,
+                 p_data: dict = None,
+                 p_oid: str = None):
+        """Write a record to the DB.
+
+        Args:
+            p_db_action (Types.dbaction -> str): add, upd, del
+            p_tbl_nm (Types.tblnames -> str): user, citizen
+            p_data (dict): mirrors a "data" dataclass. None if "del".
+            p_oid (string): Required for upd, del. Default is None.
+        """
+        with UT.pin_utc_ts():
+            stmts = self.set_db_stmts(p_db_action, p_tbl_nm, p_data, p_oid)
+        if stmts:
+            self.execute_txn_sql(stmts)
+
+    def write_db_batch(self,
+                       p_db_action: Types.dbaction,
+                       p_tbl_nm: Types.tblnames,
+                       p_rows: list):
+        """Write many records to the DB in one transaction.
+
+        Each row must be for a different OID. All rows get the same
+        timestamp.
+
+        Args:
+            p_db_action (Types.dbaction -> str): add, upd, del
+            p_tbl_nm (Types.tblnames -> str): user, citizen
+            p_rows (list): of (dict: "data" or None, str: OID or None)
+        """
+        stmts = list()
+        with UT.pin_utc_ts():
+            for data, oid in p_rows:
+                stmts += self.set_db_stmts(p_db_action, p_tbl_nm, data, oid)
+        if stmts:
+            self.execute_txn_sql(stmts)
+
+    def set_citizens_checked(self,
+                             p_profile_ids: list,
+                             p_checked_ts: int = None):
+        """Record that citizens were just pulled from eRep.
+
+        Args:
+            p_profile_ids (list): eRepublik citizen profile IDs
+            p_checked_ts (int, optional): epoch seconds. Default is now.
+        """
+        if not p_profile_ids:
+            return
+        checked_ts = p_checked_ts or UT.get_epoch(UT.get_utc_ts())
+        sql = "INSERT OR REPLACE INTO citizen_checked " +\
+            "(profile_id, checked_ts) VALUES (?, ?);"
+        self.execute_txn_sql([(sql, [int(pid), checked_ts])
+                              for pid in p_profile_ids])
+
+    def set_citizens_unfriended(self, p_profile_ids: list):
+        """Clear the is_user_friend flag of citizens, in place.
+
+        One UPDATE on the current and active history rows, in one
+        transaction. Losing a friend is not a change to the citizen's
+        profile, so no new version is written. hash_id is left as it
+        was, so the next pull of the citizen stores a new version.
+
+        Args:
+            p_profile_ids (list): eRepublik citizen profile IDs
+        """
+        if not p_profile_ids:
+            return
+        ids = [int(pid) for pid in p_profile_ids]
+        marks = ", ".join(["?"] * len(ids))
+        stmts = list()
+        for tbl_nm, cond in (("citizen_current_fact", ""),
+                             ("citizen_history_fact",
+                              " AND delete_ts IS NULL")):
+            sql = "UPDATE {} SET is_user_friend = 0".format(tbl_nm)
+            sql += " WHERE profile_id IN ({}){};".format(marks, cond)
+            stmts.append((sql, ids))
+        self.execute_txn_sql(stmts)
 
     def decrypt_user_data(self,
                           p_user_data: dict) -> dict:
@@ -468,14 +1264,8 @@ class Dbase(object):
         Returns:
             dict: decrypted "data" info
         """
-        user_data = copy(p_user_data)
-        encrypt_key = user_data["encrypt_key"]
-        data_keys = ST.UserFields.keys()
-        data_keys.remove("encrypt_key")
-        for cnm in data_keys:
-            if user_data[cnm] and user_data[cnm] not in (None, "None", ""):
-                user_data[cnm] = CI.decrypt(user_data[cnm], encrypt_key)
-        return(user_data)
+        return CI.get_suite(p_user_data["encrypt_key"]).decrypt_row(
+            p_user_data)
 
     def format_query_result(self,
                             p_tbl_nm: Types.tblnames,
@@ -571,24 +1361,23 @@ class Dbase(object):
     def execute_query_sql(self,
                           p_tbl_nm: Types.tblnames,
                           p_sql: str,
-                          p_single: bool = True):
+                          p_single: bool = True,
+                          p_sql_vals: list = None):
         """Execute a SELECT query, with option to return only latest row.
 
         Args:
             p_sql (str) DB SELECT to execute
             p_tbl_nm (Types.tblnames -> str)
             p_single (bool): If True, return only the latest row
+            p_sql_vals (list): Optional. Values to bind to the SQL.
 
         Returns:
             dict: of (dicts keyed by "data", "audit")  or
             list of dicts like that ^  or
             None if no rows found
         """
-        main_db = path.join(UT.get_home(), TX.dbs.db_path, TX.dbs.db_name)
-        self.connect_dmain(main_db)
-        cur = self.dmain_conn.cursor()
-        result = cur.execute(p_sql).fetchall()
-        self.disconnect_dmain()
+        with self.dmain_reader() as conn:
+            result = conn.execute(p_sql, p_sql_vals or []).fetchall()
         data_recs = self.format_query_result(p_tbl_nm, result)
         if len(data_recs) < 1:
             data_recs = None
@@ -607,38 +1396,45 @@ class Dbase(object):
         """
         return self.format_query_sql("user", p_single)
 
+    def query_current_citizen(self,
+                              p_col_nm: str,
+                              p_col_val: str) -> dict:
+        """Run read-only query against the citizen_current table.
+
+        Args:
+            p_col_nm (str): column to match on
+            p_col_val (str): value to match
+
+        Returns:
+            dict: of (dicts keyed by "data", "audit")
+        """
+        col_nms_txt = ", ".join(ST.CitizenFields.keys() +
+                                ST.AuditFields.keys())
+        sql = "SELECT {} FROM citizen_current".format(col_nms_txt)
+        sql += " WHERE {} = ?;".format(p_col_nm)
+        return self.execute_query_sql("citizen", sql, True, [str(p_col_val)])
+
     def query_citizen_by_oid(self,
                              p_oid: str,
                              p_single: bool = True) -> dict:
         """Run read-only query against the citizen table.
 
-        Return latest non-deleted record that matches on PID.
+        Return current record that matches on OID.
 
         Args:
             p_oid (str): efriends DB unique object ID
-            p_single (bool): If True, return only latest row
+            p_single (bool): Ignored. citizen_current holds one row per OID.
 
         Returns:
             dict: of (dicts keyed by "data", "audit")
         """
-        col_nms = list(ST.CitizenFields.keys()) +\
-            list(ST.AuditFields.keys())
-        col_nms_txt = ", ".join(col_nms)
-        sql = "SELECT {}, ".format(col_nms_txt)
-        if p_single:
-            sql += " MAX(update_ts)"
-        else:
-            sql = sql[:-2]
-        sql += " FROM citizen WHERE oid = '{}'".format(str(p_oid))
-        sql += " AND delete_ts is NULL;"
-        recs = self.execute_query_sql("citizen", sql, p_single=True)
-        return recs
+        return self.query_current_citizen("oid", p_oid)
 
     def query_citizen_by_profile_id(self,
                                     p_profile_id: str) -> dict:
         """Run read-only query against the citizen table.
 
-        Return latest non-deleted record that matches on profile ID.
+        Return current record that matches on profile ID.
 
         Args:
             p_profile_id (str): eRepublik Identifier for a citizen
@@ -646,21 +1442,13 @@ class Dbase(object):
         Returns:
             dict: of (dicts keyed by "data", "audit")
         """
-        col_nms = list(ST.CitizenFields.keys()) +\
-            list(ST.AuditFields.keys())
-        col_nms_txt = ", ".join(col_nms)
-        sql = "SELECT {}, ".format(col_nms_txt)
-        sql += " MAX(update_ts) FROM citizen"
-        sql += " WHERE profile_id = '{}'".format(str(p_profile_id))
-        sql += " AND delete_ts is NULL;"
-        recs = self.execute_query_sql("citizen", sql, p_single=True)
-        return recs
+        return self.query_current_citizen("profile_id", p_profile_id)
 
     def query_citizen_by_name(self,
                               p_citizen_nm: str) -> dict:
         """Run read-only query against the citizen table.
 
-        Return latest non-deleted record that matches on citizen name.
+        Return current record that matches on citizen name.
 
         Args:
             p_citizen_nm (str): eRepublik citizen name
@@ -668,15 +1456,7 @@ class Dbase(object):
         Returns:
             dict: of (dicts keyed by "data", "audit")
         """
-        col_nms = list(ST.CitizenFields.keys()) +\
-            list(ST.AuditFields.keys())
-        col_nms_txt = ", ".join(col_nms)
-        sql = "SELECT {}, ".format(col_nms_txt)
-        sql += " MAX(update_ts) FROM citizen"
-        sql += " WHERE name = '{}'".format(str(p_citizen_nm))
-        sql += " AND delete_ts is NULL;"
-        recs = self.execute_query_sql("citizen", sql, p_single=True)
-        return recs
+        return self.query_current_citizen("name", p_citizen_nm)
 
     def query_for_profile_id_list(self) -> list:
         """Return a list of all active citizen profile IDs.
@@ -684,13 +1464,596 @@ class Dbase(object):
         Returns:
             list: of eRepublik citizen profile IDs
         """
-        sql = "SELECT profile_id "
-        sql += "FROM citizen WHERE delete_ts IS NULL;"
-        recs = self.execute_query_sql("citizen", sql, p_single=False)
-        id_list = list()
-        for row in recs:
-            id_list.append(row['data']['profile_id'])
-        return id_list
+        with self.dmain_reader() as conn:
+            result = conn.execute(
+                "SELECT profile_id FROM citizen_current_fact;").fetchall()
+        return [row[0] for row in result]
+
+    def query_profile_ids_by_name(self, p_names: list) -> dict:
+        """Look up citizen names on the DB, current names first.
+
+        A name no current citizen has is looked for among past
+        names, and goes to whoever had it most recently.
+
+        Args:
+            p_names (list): eRepublik citizen names
+
+        Returns:
+            dict: {str: name, str: profile ID} for the names found
+        """
+        found = dict()
+        if not p_names:
+            return found
+        marks = ", ".join(["?"] * len(p_names))
+        with self.dmain_reader() as conn:
+            for name, pid in conn.execute(
+                    "SELECT name, profile_id FROM citizen_current_fact" +
+                    " WHERE name IN ({});".format(marks), p_names):
+                found[name] = str(pid)
+            rest = [name for name in p_names if name not in found]
+            if rest:
+                marks = ", ".join(["?"] * len(rest))
+                for name, pid, _ in conn.execute(
+                        "SELECT name, profile_id, MAX(update_ts)" +
+                        " FROM citizen_history_fact" +
+                        " WHERE name IN ({})".format(marks) +
+                        " GROUP BY name;", rest):
+                    found[name] = str(pid)
+        return found
+
+    def query_name_cache(self,
+                         p_names: list,
+                         p_found_since_ts: int,
+                         p_missing_since_ts: int) -> dict:
+        """Return remote name lookups that are still fresh.
+
+        Args:
+            p_names (list): eRepublik citizen names
+            p_found_since_ts (int): epoch seconds. Ignore names found
+                before this.
+            p_missing_since_ts (int): epoch seconds. Ignore names not
+                found before this.
+
+        Returns:
+            dict: {str: name, str: profile ID, or None if not found}
+        """
+        if not p_names:
+            return dict()
+        sql = "SELECT name, profile_id, resolved_ts FROM name_cache"
+        sql += " WHERE name IN ({});".format(", ".join(["?"] * len(p_names)))
+        with self.dmain_reader() as conn:
+            result = conn.execute(sql, p_names).fetchall()
+        return dict((name, str(pid) if pid is not None else None)
+                    for name, pid, resolved_ts in result
+                    if resolved_ts >= (p_found_since_ts if pid is not None
+                                       else p_missing_since_ts))
+
+    def write_name_cache(self, p_resolved: dict):
+        """Store the outcome of remote name lookups.
+
+        Args:
+            p_resolved (dict): {str: name, str: profile ID, or None if
+                no citizen has the name}
+        """
+        if not p_resolved:
+            return
+        resolved_ts = UT.get_epoch(UT.get_utc_ts())
+        sql = "INSERT OR REPLACE INTO name_cache (name, profile_id,"
+        sql += " resolved_ts) VALUES (?, ?, ?);"
+        self.execute_txn_sql([(sql, [name, int(pid) if pid else None,
+                                     resolved_ts])
+                              for name, pid in p_resolved.items()])
+
+    def query_citizen_hashes(self) -> dict:
+        """Return the fingerprint of every current citizen row.
+
+        Returns:
+            dict: {str: profile ID, (str: OID, str: hash_id,
+                int: is_user_friend)}
+        """
+        with self.dmain_reader() as conn:
+            result = conn.execute(
+                "SELECT profile_id, oid, hash_id, is_user_friend" +
+                " FROM citizen_current_fact;").fetchall()
+        return dict((str(pid), (oid, hash_id, is_friend))
+                    for pid, oid, hash_id, is_friend in result)
+
+    def get_citizen_hash(self, p_data: dict) -> str:
+        """Get the hash_id a citizen "data" row would be stored with.
+
+        Args:
+            p_data (dict): mirrors ST.CitizenFields
+
+        Returns:
+            str: fingerprint, as compared by set_upsert_data()
+        """
+        _, audit_rec = self.hash_data_values(
+            "citizen", self.cast_data_values("citizen", p_data), dict())
+        return audit_rec["hash_id"]
+
+    def enqueue_refresh_job(self,
+                            p_kind: str,
+                            p_profile_ids: list) -> str:
+        """Queue profile IDs on the open refresh job of a kind.
+
+        If no job of that kind is open, start one. IDs already on the
+        job keep their status, so re-running a run resumes it.
+
+        Args:
+            p_kind (str): kind of run, e.g. id_list
+            p_profile_ids (list): eRepublik citizen profile IDs
+
+        Returns:
+            str: job ID
+        """
+        job_id = self.query_open_job(p_kind)
+        now_ts = UT.get_utc_ts()
+        stmts = list()
+        if job_id is None:
+            job_id = UT.get_uid()
+            stmts.append(("INSERT INTO refresh_job (job_id, kind, " +
+                          "create_ts) VALUES (?, ?, ?);",
+                          [job_id, p_kind, now_ts]))
+        with self.dmain_reader() as conn:
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM " +
+                               "refresh_job_item WHERE job_id = ?;",
+                               [job_id]).fetchone()[0]
+        sql = "INSERT OR IGNORE INTO refresh_job_item (job_id, seq, " +\
+            "profile_id, status, update_ts) VALUES (?, ?, ?, ?, ?);"
+        for ix, pid in enumerate(p_profile_ids):
+            stmts.append((sql, [job_id, seq + ix + 1, str(pid),
+                                ST.JobStatus.QUEUED, now_ts]))
+        self.execute_txn_sql(stmts)
+        return job_id
+
+    def query_open_job(self, p_kind: str) -> str:
+        """Return the latest unfinished refresh job of a kind.
+
+        Args:
+            p_kind (str): kind of run, e.g. id_list
+
+        Returns:
+            str: job ID, or None
+        """
+        sql = "SELECT job_id FROM refresh_job WHERE kind = ?"
+        sql += " AND finish_ts IS NULL ORDER BY create_ts DESC LIMIT 1;"
+        with self.dmain_reader() as conn:
+            row = conn.execute(sql, [p_kind]).fetchone()
+        return row[0] if row else None
+
+    def query_job_queue(self,
+                        p_job_id: str,
+                        p_after_seq: int = 0,
+                        p_limit: int = -1) -> list:
+        """Return the IDs still queued on a refresh job, in order.
+
+        Args:
+            p_job_id (str): job ID
+            p_after_seq (int): only IDs queued after this position
+            p_limit (int): most IDs to return. -1 means all.
+
+        Returns:
+            list: of (str: profile ID, int: attempts so far,
+                int: queue position) tuples
+        """
+        sql = "SELECT profile_id, attempts, seq FROM refresh_job_item"
+        sql += " WHERE job_id = ? AND status = ? AND seq > ?"
+        sql += " ORDER BY seq LIMIT ?;"
+        with self.dmain_reader() as conn:
+            return conn.execute(
+                sql, [p_job_id, ST.JobStatus.QUEUED, p_after_seq,
+                      p_limit]).fetchall()
+
+    def iter_job_queue(self,
+                       p_job_id: str,
+                       p_page_size: int = 500,
+                       p_limit: int = None) -> object:
+        """Walk the IDs queued on a refresh job, a page at a time.
+
+        Only one page is held in memory. IDs queued again while the
+        walk is under way are left for the next run.
+
+        Args:
+            p_job_id (str): job ID
+            p_page_size (int): IDs read per query
+            p_limit (int, optional): stop after this many IDs
+
+        Returns:
+            generator: (str: profile ID, int: attempts so far) tuples
+        """
+        after_seq = 0
+        left = p_limit
+        while left is None or left > 0:
+            page_size = p_page_size if left is None\
+                else min(p_page_size, left)
+            page = self.query_job_queue(p_job_id, after_seq, page_size)
+            for profile_id, attempts, after_seq in page:
+                yield (profile_id, attempts)
+            if left is not None:
+                left -= len(page)
+            if len(page) < page_size:
+                return
+
+    def set_job_item_status(self,
+                            p_job_id: str,
+                            p_profile_id: str,
+                            p_status: str,
+                            p_attempts: int,
+                            p_error: str = None):
+        """Checkpoint the outcome of one ID on a refresh job.
+
+        Args:
+            p_job_id (str): job ID
+            p_profile_id (str): eRepublik citizen profile ID
+            p_status (str): key to ST.JobStatus
+            p_attempts (int): attempts made so far
+            p_error (str, optional): reason for the last failure
+        """
+        sql = "UPDATE refresh_job_item SET status = ?, attempts = ?,"
+        sql += " last_error = ?, update_ts = ?"
+        sql += " WHERE job_id = ? AND profile_id = ?;"
+        self.execute_txn_sql([(sql, [p_status, p_attempts, p_error,
+                                     UT.get_utc_ts(), p_job_id,
+                                     str(p_profile_id)])])
+
+    def finish_refresh_job(self, p_job_id: str) -> dict:
+        """Close a refresh job if nothing is left queued on it.
+
+        Args:
+            p_job_id (str): job ID
+
+        Returns:
+            dict: {status: count of IDs}, as of now
+        """
+        sql = "SELECT status, COUNT(*) FROM refresh_job_item"
+        sql += " WHERE job_id = ? GROUP BY status;"
+        with self.dmain_reader() as conn:
+            counts = dict(conn.execute(sql, [p_job_id]).fetchall())
+        if not counts.get(ST.JobStatus.QUEUED):
+            self.execute_txn_sql([(
+                "UPDATE refresh_job SET finish_ts = ? WHERE job_id = ?;",
+                [UT.get_utc_ts(), p_job_id])])
+        return counts
+
+    def query_dead_letters(self, p_job_id: str = None) -> list:
+        """Return IDs that were given up on, with the reason why.
+
+        Args:
+            p_job_id (str, optional): limit to one job. Default is all.
+
+        Returns:
+            list: of (str: job ID, str: profile ID, int: attempts,
+                str: last error, str: update_ts) tuples
+        """
+        sql = "SELECT job_id, profile_id, attempts, last_error, update_ts"
+        sql += " FROM refresh_job_item WHERE status = ?"
+        sql_vals = [ST.JobStatus.DEAD]
+        if p_job_id is not None:
+            sql += " AND job_id = ?"
+            sql_vals.append(p_job_id)
+        sql += " ORDER BY update_ts;"
+        with self.dmain_reader() as conn:
+            return conn.execute(sql, sql_vals).fetchall()
+
+    def add_crawl_nodes(self,
+                        p_profile_ids: list,
+                        p_depth: int) -> int:
+        """Put citizens on the crawl frontier, if not there already.
+
+        Args:
+            p_profile_ids (list): eRepublik citizen profile IDs
+            p_depth (int): hops from the crawl's seeds
+
+        Returns:
+            int: count of citizens newly queued
+        """
+        sql = "INSERT OR IGNORE INTO crawl_node (profile_id, depth,"
+        sql += " status, update_ts) VALUES (?, ?, ?, ?);"
+        now_ts = UT.get_utc_ts()
+        with MT.timer("db_write"), self.dmain_writer() as conn:
+            before = conn.total_changes
+            conn.executemany(sql, [(int(pid), p_depth, ST.JobStatus.QUEUED,
+                                    now_ts) for pid in p_profile_ids])
+            return conn.total_changes - before
+
+    def query_crawl_frontier(self,
+                             p_max_depth: int,
+                             p_limit: int = 100) -> list:
+        """Return the next citizens to expand, shallowest first.
+
+        Args:
+            p_max_depth (int): ignore citizens deeper than this
+            p_limit (int): most citizens to return
+
+        Returns:
+            list: of (str: profile ID, int: depth, int: attempts) tuples
+        """
+        sql = "SELECT profile_id, depth, attempts FROM crawl_node"
+        sql += " WHERE status = ? AND depth <= ?"
+        sql += " ORDER BY depth, profile_id LIMIT ?;"
+        with self.dmain_reader() as conn:
+            result = conn.execute(sql, [ST.JobStatus.QUEUED, p_max_depth,
+                                        p_limit]).fetchall()
+        return [(str(pid), depth, attempts)
+                for pid, depth, attempts in result]
+
+    def set_crawl_node_status(self,
+                              p_profile_id: str,
+                              p_status: str,
+                              p_attempts: int,
+                              p_error: str = None,
+                              p_friend_ids: list = None,
+                              p_next_depth: int = None):
+        """Checkpoint one expanded citizen of a crawl.
+
+        Its edges, the friends it adds to the frontier and its own
+        status are written in one transaction, so a crawl cut short
+        resumes cleanly.
+
+        Args:
+            p_profile_id (str): eRepublik citizen profile ID
+            p_status (str): key to ST.JobStatus
+            p_attempts (int): attempts made so far
+            p_error (str, optional): reason for the last failure
+            p_friend_ids (list, optional): friends found on the profile
+            p_next_depth (int, optional): If set, queue the friends at
+                this depth. If None, only record their edges.
+        """
+        pid = int(p_profile_id)
+        seen_ts = UT.get_epoch(UT.get_utc_ts())
+        now_ts = UT.get_utc_ts()
+        edge_sql = "INSERT OR REPLACE INTO citizen_edge (profile_id,"
+        edge_sql += " friend_id, seen_ts) VALUES (?, ?, ?);"
+        node_sql = "INSERT OR IGNORE INTO crawl_node (profile_id, depth,"
+        node_sql += " status, update_ts) VALUES (?, ?, ?, ?);"
+        friend_ids = [int(fid) for fid in p_friend_ids or []
+                      if int(fid) != pid]
+        with MT.timer("db_write"), self.dmain_writer() as conn:
+            conn.executemany(edge_sql, [edge for fid in friend_ids
+                                        for edge in ((pid, fid, seen_ts),
+                                                     (fid, pid, seen_ts))])
+            if p_next_depth is not None:
+                conn.executemany(node_sql, [
+                    (fid, p_next_depth, ST.JobStatus.QUEUED, now_ts)
+                    for fid in friend_ids])
+            conn.execute("UPDATE crawl_node SET status = ?, attempts = ?," +
+                         " last_error = ?, update_ts = ?" +
+                         " WHERE profile_id = ?;",
+                         [p_status, p_attempts, p_error, now_ts, pid])
+
+    def query_crawl_counts(self) -> dict:
+        """Return how far the crawl has got.
+
+        Returns:
+            dict: {status: count of citizens}, plus "edges": count of
+                friendships stored
+        """
+        with self.dmain_reader() as conn:
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM crawl_node" +
+                " GROUP BY status;").fetchall())
+            counts["edges"] = conn.execute(
+                "SELECT COUNT(*) FROM citizen_edge" +
+                " WHERE profile_id < friend_id;").fetchone()[0]
+        return counts
+
+    def reset_crawl(self):
+        """Empty the crawl frontier so the next crawl starts over.
+
+        Edges already found are kept.
+        """
+        self.execute_txn_sql([("DELETE FROM crawl_node;", [])])
+
+    def query_pulled_since(self,
+                           p_profile_ids: list,
+                           p_since_ts: int) -> set:
+        """Return which citizens were pulled from eRep since a time.
+
+        Args:
+            p_profile_ids (list): eRepublik citizen profile IDs
+            p_since_ts (int): epoch seconds
+
+        Returns:
+            set: of str profile IDs pulled at or after p_since_ts
+        """
+        if not p_profile_ids:
+            return set()
+        marks = ", ".join(["?"] * len(p_profile_ids))
+        sql = "SELECT f.profile_id, f.update_ts, c.checked_ts"
+        sql += " FROM citizen_current_fact f LEFT JOIN citizen_checked c"
+        sql += " ON c.profile_id = f.profile_id"
+        sql += " WHERE f.profile_id IN ({});".format(marks)
+        with self.dmain_reader() as conn:
+            result = conn.execute(
+                sql, [int(pid) for pid in p_profile_ids]).fetchall()
+        return set(str(pid) for pid, upd_ts, checked_ts in result
+                   if max(UT.get_epoch(upd_ts), checked_ts or 0)
+                   >= p_since_ts)
+
+    def query_friend_degree(self, p_profile_id: str = None) -> object:
+        """Count known friends, for one citizen or for all.
+
+        Args:
+            p_profile_id (str, optional): eRepublik citizen profile ID
+
+        Returns:
+            object: int degree of p_profile_id, or if it is None a list
+                of (str: profile ID, int: degree) tuples, highest first
+        """
+        with self.dmain_reader() as conn:
+            if p_profile_id is not None:
+                return conn.execute(
+                    "SELECT COUNT(*) FROM citizen_edge WHERE profile_id = ?;",
+                    [int(p_profile_id)]).fetchone()[0]
+            result = conn.execute(
+                "SELECT profile_id, COUNT(*) AS degree FROM citizen_edge" +
+                " GROUP BY profile_id ORDER BY degree DESC, profile_id;"
+            ).fetchall()
+        return [(str(pid), degree) for pid, degree in result]
+
+    def query_common_friends(self,
+                             p_profile_id: str,
+                             p_other_id: str) -> list:
+        """Return the friends two citizens have in common.
+
+        Args:
+            p_profile_id (str): eRepublik citizen profile ID
+            p_other_id (str): eRepublik citizen profile ID
+
+        Returns:
+            list: of str profile IDs
+        """
+        sql = "SELECT a.friend_id FROM citizen_edge a"
+        sql += " JOIN citizen_edge b ON b.profile_id = ?"
+        sql += " AND b.friend_id = a.friend_id"
+        sql += " WHERE a.profile_id = ? ORDER BY a.friend_id;"
+        with self.dmain_reader() as conn:
+            result = conn.execute(sql, [int(p_other_id),
+                                        int(p_profile_id)]).fetchall()
+        return [str(row[0]) for row in result]
+
+    def query_graph_components(self) -> list:
+        """Split the known friendship graph into connected groups.
+
+        The edges are read once into an in-memory union-find.
+
+        Returns:
+            list: of lists of str profile IDs, largest group first
+        """
+        parent = dict()
+
+        def find(p_node):
+            root = p_node
+            while parent[root] != root:
+                root = parent[root]
+            while parent[p_node] != root:
+                parent[p_node], p_node = root, parent[p_node]
+            return root
+
+        with self.dmain_reader() as conn:
+            for pid, fid in conn.execute(
+                    "SELECT profile_id, friend_id FROM citizen_edge" +
+                    " WHERE profile_id < friend_id;"):
+                parent.setdefault(pid, pid)
+                parent.setdefault(fid, fid)
+                root_p, root_f = find(pid), find(fid)
+                if root_p != root_f:
+                    parent[max(root_p, root_f)] = min(root_p, root_f)
+        groups = dict()
+        for node in parent:
+            groups.setdefault(find(node), list()).append(str(node))
+        return sorted(groups.values(), key=lambda grp: (-len(grp), grp[0]))
+
+    def query_refresh_stats(self) -> list:
+        """Return what the refresh scheduler needs to know per citizen.
+
+        Versions are counted from citizen_metrics, which gets a row
+        for every stored change and is not purged.
+
+        Returns:
+            list: of (str: profile ID, int: is_user_friend,
+                int: is_alive, int: level, int: first seen epoch,
+                int: last pulled epoch, int: versions) tuples
+        """
+        sql = "SELECT f.profile_id, f.is_user_friend, f.is_alive, f.level,"
+        sql += " m.first_ts, f.update_ts, c.checked_ts, m.versions"
+        sql += " FROM citizen_current_fact f"
+        sql += " LEFT JOIN citizen_checked c ON c.profile_id = f.profile_id"
+        sql += " LEFT JOIN (SELECT profile_id, COUNT(*) AS versions,"
+        sql += " MIN(ts) AS first_ts FROM citizen_metrics"
+        sql += " GROUP BY profile_id) m ON m.profile_id = f.profile_id;"
+        with self.dmain_reader() as conn:
+            result = conn.execute(sql).fetchall()
+        stats = list()
+        for row in result:
+            (pid, friend, alive, level, first_ts, upd_ts, checked_ts,
+             versions) = row
+            last_ts = max(UT.get_epoch(upd_ts), checked_ts or 0)
+            stats.append((str(pid), friend, alive, level,
+                          first_ts or last_ts, last_ts, versions or 1))
+        return stats
+
+    def query_friend_sync_state(self) -> dict:
+        """Return active friends and when each was last pulled.
+
+        Last pulled is the later of the last recorded check and the
+        last stored change.
+
+        Returns:
+            dict: {str: profile ID, int: epoch seconds}
+        """
+        sql = "SELECT f.profile_id, f.update_ts, c.checked_ts"
+        sql += " FROM citizen_current_fact f LEFT JOIN citizen_checked c"
+        sql += " ON c.profile_id = f.profile_id WHERE f.is_user_friend = 1;"
+        with self.dmain_reader() as conn:
+            result = conn.execute(sql).fetchall()
+        return dict((str(pid), max(UT.get_epoch(upd_ts), checked_ts or 0))
+                    for pid, upd_ts, checked_ts in result)
+
+    def query_metric_series(self,
+                            p_profile_id: str,
+                            p_metric: str) -> list:
+        """Return one citizen's values for a metric, oldest first.
+
+        Args:
+            p_profile_id (str): eRepublik Identifier for a citizen
+            p_metric (str): key to ST.CitizenMetrics, like "xp"
+
+        Returns:
+            list: of (int: epoch seconds, int: value) tuples
+        """
+        if p_metric not in ST.CitizenMetrics.keys()[2:]:
+            raise Exception(ValueError, TX.shit.f_metric_req + p_metric)
+        sql = "SELECT ts, {} FROM citizen_metrics".format(p_metric)
+        sql += " WHERE profile_id = ? ORDER BY ts;"
+        with self.dmain_reader() as conn:
+            return conn.execute(sql, [int(p_profile_id)]).fetchall()
+
+    def query_metric_rollup(self,
+                            p_metric: str,
+                            p_bucket: Types.bucket = "daily",
+                            p_since_ts: int = 0,
+                            p_profile_ids: list = None) -> list:
+        """Aggregate a metric into daily or weekly time buckets.
+
+        Each citizen counts once per bucket, with the last value it had
+        in that bucket. Weekly buckets start on Mondays.
+
+        Args:
+            p_metric (str): key to ST.CitizenMetrics, like "level"
+            p_bucket (Types.bucket -> str): daily, weekly
+            p_since_ts (int): only use snapshots at or after this
+                epoch second. Default is all.
+            p_profile_ids (list, optional): limit to these citizens
+
+        Returns:
+            list of tuples. First tuple contains headers, the rest values:
+                (bucket start date, citizens, min, avg, max)
+        """
+        if p_metric not in ST.CitizenMetrics.keys()[2:]:
+            raise Exception(ValueError, TX.shit.f_metric_req + p_metric)
+        # Day 0 of the epoch was a Thursday. Shift 3 days to get Mondays.
+        bucket_sql = "(ts / 86400)" if p_bucket == "daily"\
+            else "((ts / 86400 + 3) / 7 * 7 - 3)"
+        sql_vals = [p_since_ts]
+        sql = "SELECT date(bucket * 86400, 'unixepoch') AS bucket_start,"
+        sql += " COUNT(*) AS citizens, MIN(val) AS min_val,"
+        sql += " ROUND(AVG(val), 2) AS avg_val, MAX(val) AS max_val"
+        sql += " FROM (SELECT profile_id, {} AS bucket,".format(bucket_sql)
+        sql += " {} AS val, MAX(ts) FROM citizen_metrics".format(p_metric)
+        sql += " WHERE ts >= ? AND {} IS NOT NULL".format(p_metric)
+        if p_profile_ids:
+            sql += " AND profile_id IN ({})".format(
+                ", ".join(["?"] * len(p_profile_ids)))
+            sql_vals += [int(pid) for pid in p_profile_ids]
+        sql += " GROUP BY profile_id, bucket)"
+        sql += " GROUP BY bucket ORDER BY bucket;"
+        with self.dmain_reader() as conn:
+            cur = conn.execute(sql, sql_vals)
+            result = cur.fetchall()
+            headers = [meta_h[0] for meta_h in cur.description]
+        result.insert(0, tuple(headers))
+        return result
 
     def query_citizen_sql(self, sql_file_name: str) -> list:
         """Run SQL read in from a file.
@@ -702,16 +2065,181 @@ class Dbase(object):
         with open(sql_file) as sqf:
             sql = sqf.read()
         sqf.close()
-        main_db = path.join(UT.get_home(), TX.dbs.db_path, TX.dbs.db_name)
-        self.connect_dmain(main_db)
-        cur = self.dmain_conn.cursor()
-        result = cur.execute(sql).fetchall()
-        # Much nicer than the formatting I was doing earlier!
-        headers = [meta_h[0] for meta_h in cur.description]
-        self.disconnect_dmain()
+        with self.dmain_reader() as conn:
+            cur = conn.cursor()
+            result = cur.execute(sql).fetchall()
+            # Much nicer than the formatting I was doing earlier!
+            headers = [meta_h[0] for meta_h in cur.description]
         result.insert(0, tuple(headers))
         return(result)
 
+    def get_db_size(self, p_conn: object) -> tuple:
+        """Measure space used by a database.
+
+        Args:
+            p_conn (object): open connection to the database
+
+        Returns:
+            tuple: (int: bytes allocated to the file,
+                    int: bytes sitting on the free-page list)
+        """
+        page_size = p_conn.execute("PRAGMA page_size;").fetchone()[0]
+        page_cnt = p_conn.execute("PRAGMA page_count;").fetchone()[0]
+        free_cnt = p_conn.execute("PRAGMA freelist_count;").fetchone()[0]
+        return (page_size * page_cnt, page_size * free_cnt)
+
+    def vacuum_db(self,
+                  p_conn: object,
+                  p_vacuum: Types.vacuum):
+        """Return free pages to the file system.
+
+        "full" rebuilds the whole file. "incremental" only releases pages
+        already on the free list, which is much faster, but requires
+        auto_vacuum=INCREMENTAL. New DBs are created with it. An older
+        DB, or one whose auto_vacuum was lost, gets converted, which
+        costs one full VACUUM the first time.
+
+        Args:
+            p_conn (object): open connection to the database
+            p_vacuum (Types.vacuum -> str): none, full, incremental
+        """
+        if p_vacuum == "full":
+            p_conn.execute("VACUUM;")
+        elif p_vacuum == "incremental":
+            auto_vacuum = p_conn.execute("PRAGMA auto_vacuum;").fetchone()[0]
+            if auto_vacuum != 2:
+                p_conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+                p_conn.execute("VACUUM;")
+            else:
+                # execute() steps only once, freeing a single page.
+                p_conn.executescript("PRAGMA incremental_vacuum;")
+
+    def purge_rows(self,
+                   p_conn: object,
+                   p_tbl_nm: str,
+                   p_threshold_ts: str,
+                   p_chunk_size: int) -> int:
+        """Physically delete superseded row versions.
+
+        A version is superseded when it was logically deleted and a newer
+        version of the same oid exists. A logically deleted row with no
+        successor is kept, so no object ever vanishes entirely.
+
+        Rows are removed in set-based chunks, each chunk committed in its
+        own transaction, so that a big purge does not hold one huge lock.
+
+        Args:
+            p_conn (object): open connection to the main database
+            p_tbl_nm (str): user, citizen_history_fact
+            p_threshold_ts (str): purge versions deleted before this time
+            p_chunk_size (int): max rows to delete per transaction
+
+        Returns:
+            int: count of rows deleted
+        """
+        sql = "DELETE FROM {} WHERE uid IN (".format(p_tbl_nm)
+        sql += "SELECT h.uid FROM {} h".format(p_tbl_nm)
+        sql += " WHERE h.delete_ts IS NOT NULL AND h.delete_ts < ?"
+        sql += " AND EXISTS (SELECT 1 FROM {} n".format(p_tbl_nm)
+        sql += " WHERE n.oid = h.oid AND n.update_ts > h.update_ts)"
+        sql += " LIMIT ?);"
+        purge_cnt = 0
+        while True:
+            with p_conn:
+                cur = p_conn.execute(sql, (p_threshold_ts, p_chunk_size))
+                chunk_cnt = cur.rowcount
+            purge_cnt += chunk_cnt
+            if chunk_cnt < p_chunk_size:
+                break
+        return purge_cnt
+
+    def purge_dims(self, p_conn: object):
+        """Remove lookup rows no longer used by any citizen version.
+
+        Args:
+            p_conn (object): open connection to the main database
+        """
+        dim_keys = dict()
+        for dim_key in ST.CitizenDims.keys():
+            tbl_nm, _ = getattr(ST.CitizenDims, dim_key)
+            dim_keys.setdefault(tbl_nm, list()).append(dim_key)
+        with p_conn:
+            for tbl_nm, keys in dim_keys.items():
+                sql = "DELETE FROM {0} WHERE {0}_id NOT IN (".format(tbl_nm)
+                sql += " UNION ".join([
+                    "SELECT {0} FROM citizen_history_fact ".format(key) +
+                    "WHERE {0} IS NOT NULL".format(key) for key in keys])
+                sql += ");"
+                p_conn.execute(sql)
+
+    def purge_jobs(self,
+                   p_conn: object,
+                   p_threshold_ts: str) -> int:
+        """Remove refresh jobs that finished before a time.
+
+        Dead letters go with their job.
+
+        Args:
+            p_conn (object): open connection to the main database
+            p_threshold_ts (str): purge jobs finished before this time
+
+        Returns:
+            int: count of job and job item rows deleted
+        """
+        old_jobs = "SELECT job_id FROM refresh_job" +\
+            " WHERE finish_ts IS NOT NULL AND finish_ts < ?"
+        with p_conn:
+            purge_cnt = p_conn.execute(
+                "DELETE FROM refresh_job_item WHERE job_id IN " +
+                "({});".format(old_jobs), [p_threshold_ts]).rowcount
+            purge_cnt += p_conn.execute(
+                "DELETE FROM refresh_job WHERE job_id IN " +
+                "({});".format(old_jobs), [p_threshold_ts]).rowcount
+        return purge_cnt
+
+    def purge_db(self,
+                 p_keep_days: int = 30,
+                 p_vacuum: Types.vacuum = "incremental",
+                 p_chunk_size: int = 5000,
+                 p_archive: bool = True) -> namedtuple:
+        """Remove superseded row versions from the main db.
+
+        Args:
+            p_keep_days (int): keep versions deleted within this many days
+            p_vacuum (Types.vacuum -> str): none, full, incremental.
+                Default is incremental.
+            p_chunk_size (int): max rows to delete per transaction
+            p_archive (bool): If True, archive the DB before purging.
+
+        Returns:
+            namedtuple: (rows_purged: int, bytes_before: int,
+                         bytes_after: int, bytes_reclaimed: int,
+                         bytes_free: int). bytes_reclaimed is never
+                below 0, though the file can grow, e.g. when it is
+                converted to auto_vacuum=INCREMENTAL.
+        """
+        if p_archive:
+            self.archive_db()
+        threshold_ts = UT.get_past_utc(p_keep_days)
+        conn = self.connect_dmain()
+        try:
+            bytes_before, _ = self.get_db_size(conn)
+            rows_purged = 0
+            for tbl_nm in ("user", "citizen_history_fact"):
+                rows_purged += self.purge_rows(conn, tbl_nm,
+                                               threshold_ts, p_chunk_size)
+            self.purge_dims(conn)
+            rows_purged += self.purge_jobs(conn, threshold_ts)
+            self.vacuum_db(conn, p_vacuum)
+            bytes_after, bytes_free = self.get_db_size(conn)
+        finally:
+            self.disconnect_db(conn)
+        return UT.make_namedtuple("purge", {
+            "rows_purged": rows_purged,
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "bytes_reclaimed": max(0, bytes_before - bytes_after),
+            "bytes_free": bytes_free})
 
     # ================  untested code =========================
     def destroy_all_dbs(self, db_path: str):
@@ -730,37 +2258,3 @@ class Dbase(object):
                        path.join(UT.get_home(), TX.dbs.bkup_path),
                        path.join(UT.get_home(), TX.dbs.arcv_path)]:
             remove(d_path)
-
-    def purge_rows(self, p_oids: list, p_cursor: object):
-        """Physically delete a row from citizen table on main db.
-
-        Args:
-            p_oids (list): (oids, delete_ts) tuples associated
-                with rows to physically delete
-            cur (object): a cursor on the main database
-        """
-        for row in p_oids:
-            d_oid = row[0]
-            d_delete_ts = row[1]
-            sql = "DELETE citizen WHERE uid = '{}' ".format(d_oid)
-            sql += "AND delete_ts = '{}';".format(d_delete_ts)
-            p_cursor.execute(sql)
-
-    def purge_db(self):
-        """Remove rows from main db citizen table."""
-        self.archive_db()
-
-        # Modify to use an appropriate purge threshold, not just
-        # "deleted before today"
-        dttm = UT.get_dttm()
-        sql = "SELECT oid, delete_ts FROM citizen "
-        sql += "WHERE delete_ts < '{}' ".format(dttm.curr_utc)
-        sql += "AND delete_ts IS NOT NULL;"
-
-        main_db = path.join(UT.get_home(), TX.dbs.db_path, TX.dbs.db_name)
-        self.connect_dmain(main_db)
-        cur = self.dmain_conn.cursor()
-        oid_list = [row for row in cur.execute(sql)]
-        self.purge_rows(cur, oid_list)
-        self.dmain_conn.commit()
-        self.disconnect_dmain()
@@ -4,10 +4,23 @@
 """
 Launch efriends application.
 
+`python3 efriends.py --profile` profiles GUI actions and report
+runs into the log directory. See profiler.py.
+
+`python3 efriends.py --erep-url http://127.0.0.1:8088/en` talks to a
+local stand-in instead of eRepublik. See erepstub.py.
+
+`python3 efriends.py --reextract` rebuilds citizen rows from the
+cached profile responses, without the GUI or eRepublik.
+
 Module:    efriends.py
 Author:    PQ <pq_rfw @ pm.me>
 """
+import argparse
+import os
 
+from controls import Controls
+from profiler import Profiler
 from views import Views
 
 
@@ -16,5 +29,31 @@ from views import Views
 # ======================
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="efriends")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile GUI actions into the log directory")
+    parser.add_argument("--profile-top", type=int, default=None,
+                        help="functions to list per profile summary")
+    parser.add_argument("--erep-url", default=None,
+                        help="base URL to use in place of eRepublik")
+    parser.add_argument("--etools-url", default=None,
+                        help="base URL to use in place of erepublik.tools")
+    parser.add_argument("--reextract", action="store_true",
+                        help="rebuild citizen rows from cached profiles")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes for --reextract")
+    args = parser.parse_args()
+    if args.erep_url:
+        os.environ["EFRIENDS_EREP_URL"] = args.erep_url
+    if args.etools_url:
+        os.environ["EFRIENDS_ETOOLS_URL"] = args.etools_url
+    if args.profile:
+        Profiler.configure(p_enabled=True, p_top_n=args.profile_top)
+    if args.reextract:
+        CN = Controls()
+        CN.configure_database()
+        _, msg = CN.reextract_profile_cache(args.workers)
+        print(msg)
+        raise SystemExit(0)
     EF = Views()
     EF.win_root.mainloop()
@@ -0,0 +1,433 @@
+# coding: utf-8     # noqa: E902
+#!/usr/bin/python3  # noqa: E265
+
+"""
+Local stand-in for erepublik.com and api.erepublik.tools.
+
+Serves just the endpoints efriends calls, so collection runs can be
+timed without the network:
+- GET  /en                                 login landing page
+- POST /en/login, /en/logout               302 back to /en
+- GET  /en/main/citizen-profile-json/<id>  citizen profile JSON
+- POST /en/main/messages-compose/<id>      page holding friends list
+- GET  /v0/citizen?name=<name>&key=<key>   etools lookup by name,
+                                           none for unknown_<anything>
+- GET  /v0/citizen/<id>?key=<key>          etools lookup by ID
+
+Responses are replayed from a directory of recorded files named as
+in the efriends cache (login_response, friends_response,
+profile_response_<id>), so ~/.efriends/cache works as-is. Anything
+not recorded is synthesized. Synthesized profiles list up to 20
+friends each, from a fixed friendship graph over the citizens
+1001 to 1000 + 10 * friends, so a crawl finds the same edges from
+both ends.
+
+Login sets an erpk session cookie, and logout ends it. The landing
+page shows the user only to a live session, and the friends page
+redirects to /en without one, as eRepublik does.
+
+Latency, error rate and a requests-per-second limit (429 with
+Retry-After when exceeded) are configurable.
+
+Point efriends at it with Controls.set_base_urls(), or with the
+EFRIENDS_EREP_URL and EFRIENDS_ETOOLS_URL environment variables.
+Run stand-alone from the efriends directory, like:
+`python3 erepstub.py --port 8088 --latency-ms 150 --replay-dir DIR`
+
+Module:    erepstub.py
+Class:     ErepStub/0  inherits object
+Author:    PQ <pq_rfw @ pm.me>
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import path
+from pathlib import Path
+from pprint import pprint as pp  # noqa: F401
+from urllib.parse import parse_qs, urlparse
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Route one request to the ErepStub that owns the server."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        """Keep the console quiet."""
+        pass
+
+    def send_stub(self,
+                  p_status: int,
+                  p_body: str = "",
+                  p_headers: dict = None):
+        """Send a complete response.
+
+        Args:
+            p_status (int): HTTP status code
+            p_body (str): response text
+            p_headers (dict, optional): extra headers
+        """
+        body = p_body.encode("utf-8")
+        self.send_response(p_status)
+        for hnm, hval in (p_headers or {}).items():
+            self.send_header(hnm, hval)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_stub(self, p_method: str):
+        """Apply limits and faults, then route the request.
+
+        Args:
+            p_method (str): GET, POST
+        """
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self.send_stub(*self.server.stub.route(
+            p_method, self.path, self.headers.get("Cookie")))
+
+    def do_GET(self):
+        """Handle GET."""
+        self.handle_stub("GET")
+
+    def do_POST(self):
+        """Handle POST."""
+        self.handle_stub("POST")
+
+
+class ErepStub(object):
+    """Replay or synthesize eRepublik responses on a local port."""
+
+    def __init__(self,
+                 p_replay_dir: str = None,
+                 p_friends: int = 50,
+                 p_latency_ms: float = 0.0,
+                 p_jitter_ms: float = 0.0,
+                 p_error_rate: float = 0.0,
+                 p_rate_limit: float = 0.0,
+                 p_seed: int = 42):
+        """Initialize ErepStub object.
+
+        Args:
+            p_replay_dir (str, optional): directory of recorded responses
+            p_friends (int): size of the synthesized friends list
+            p_latency_ms (float): added to every response
+            p_jitter_ms (float): random extra latency, up to this much
+            p_error_rate (float): share of requests answered with 503
+            p_rate_limit (float): requests per second before 429s.
+                0 means no limit.
+            p_seed (int): seed for latency jitter and error injection
+        """
+        self.replay_dir = p_replay_dir
+        self.friends = p_friends
+        self.latency_ms = p_latency_ms
+        self.jitter_ms = p_jitter_ms
+        self.error_rate = p_error_rate
+        self.rate_limit = p_rate_limit
+        self.rnd = random.Random(p_seed)
+        self.lock = threading.Lock()
+        self.tokens = p_rate_limit
+        self.token_ts = time.monotonic()
+        self.stats = {"requests": 0, "errors_injected": 0,
+                      "rate_limited": 0, "replayed": 0, "synthesized": 0,
+                      "logins": 0}
+        self.sessions = set()
+        self.server = None
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        """Get http://host:port of the running server."""
+        host, port = self.server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    @property
+    def erep_url(self) -> str:
+        """Get stand-in for TX.urls.u_erep."""
+        return self.base_url + "/en"
+
+    @property
+    def etools_url(self) -> str:
+        """Get stand-in for TX.urls.u_etools."""
+        return self.base_url + "/v0"
+
+    def start(self,
+              p_host: str = "127.0.0.1",
+              p_port: int = 0) -> str:
+        """Start serving on a daemon thread.
+
+        Args:
+            p_host (str): interface to bind
+            p_port (int): port to bind. 0 picks a free one.
+
+        Returns:
+            str: base URL of the server
+        """
+        self.server = ThreadingHTTPServer((p_host, p_port), StubHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        """Stop serving and release the port."""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def take_token(self) -> bool:
+        """Spend one request from the rate-limit bucket.
+
+        Returns:
+            bool: True if the request is within the limit
+        """
+        if self.rate_limit <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.rate_limit, self.tokens +
+                          (now - self.token_ts) * self.rate_limit)
+        self.token_ts = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def route(self,
+              p_method: str,
+              p_path: str,
+              p_cookie: str = None) -> tuple:
+        """Answer one request.
+
+        Args:
+            p_method (str): GET, POST
+            p_path (str): path plus query string
+            p_cookie (str, optional): Cookie request header
+
+        Returns:
+            tuple: (status, body, headers)
+        """
+        with self.lock:
+            self.stats["requests"] += 1
+            delay_ms = self.latency_ms + self.rnd.uniform(0, self.jitter_ms)
+            in_limit = self.take_token()
+            is_error = self.rnd.random() < self.error_rate
+            if not in_limit:
+                self.stats["rate_limited"] += 1
+            elif is_error:
+                self.stats["errors_injected"] += 1
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+        if not in_limit:
+            return (429, "Too Many Requests", {"Retry-After": "1"})
+        if is_error:
+            return (503, "Service Unavailable", None)
+        url = urlparse(p_path)
+        parts = [p for p in url.path.split("/") if p]
+        query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        cookie = SimpleCookie(p_cookie or "").get("erpk")
+        session = cookie.value if cookie is not None else None
+        with self.lock:
+            is_live = session in self.sessions
+        if parts[:1] == ["en"]:
+            if p_method == "GET" and len(parts) == 1:
+                return (200, self.get_login_page(is_live), None)
+            if p_method == "POST" and parts[1:] == ["login"]:
+                session = uuid.uuid4().hex
+                with self.lock:
+                    self.sessions.add(session)
+                    self.stats["logins"] += 1
+                return (302, "", {"Location": "/en",
+                                  "Set-Cookie": "erpk={}; Path=/".format(
+                                      session)})
+            if p_method == "POST" and parts[1:] == ["logout"]:
+                with self.lock:
+                    self.sessions.discard(session)
+                return (302, "", {"Location": "/en"})
+            action = "/".join(parts[1:3])
+            if p_method == "GET" and action == "main/citizen-profile-json":
+                return (200, self.get_profile(parts[3]), None)
+            if p_method == "POST" and action == "main/messages-compose":
+                if not is_live:
+                    return (302, "", {"Location": "/en"})
+                return (200, self.get_friends_page(), None)
+        elif parts[:2] == ["v0", "citizen"] and p_method == "GET":
+            if len(parts) == 3:
+                return (200, json.dumps(
+                    {"citizen": {"id": int(parts[2])}}), None)
+            name = query.get("name", "")
+            if name.startswith("unknown_"):
+                return (200, json.dumps({"citizen": []}), None)
+            return (200, json.dumps({"citizen": [
+                {"id": self.get_id_for_name(name), "name": name}]}), None)
+        return (404, "Not Found", None)
+
+    def get_recorded(self, p_file_nm: str) -> str:
+        """Get a recorded response, if there is one.
+
+        Args:
+            p_file_nm (str): file name in the replay directory
+
+        Returns:
+            str: recorded text, or None
+        """
+        if self.replay_dir is not None:
+            rec_file = path.join(self.replay_dir, p_file_nm)
+            if Path(rec_file).exists():
+                with open(rec_file) as rf:
+                    with self.lock:
+                        self.stats["replayed"] += 1
+                    return rf.read()
+        with self.lock:
+            self.stats["synthesized"] += 1
+        return None
+
+    def get_id_for_name(self, p_name: str) -> int:
+        """Map a name to a stable synthetic profile ID.
+
+        Args:
+            p_name (str): citizen name
+
+        Returns:
+            int: profile ID
+        """
+        if p_name.startswith("citizen_") and p_name[8:].isdigit():
+            return int(p_name[8:])
+        return 1000000 + sum(ord(c) * (ix + 1)
+                             for ix, c in enumerate(p_name)) % 1000000
+
+    def get_friend_ids(self) -> list:
+        """Get profile IDs of the synthesized friends list."""
+        return [str(1001 + ix) for ix in range(self.friends)]
+
+    def get_friends_of(self, p_profile_id: int) -> list:
+        """Get profile IDs of a citizen's friends in the synthetic graph.
+
+        Args:
+            p_profile_id (int): eRepublik profile ID
+
+        Returns:
+            list: of int profile IDs
+        """
+        last_id = 1000 + 10 * max(1, self.friends)
+        if not 1001 <= p_profile_id <= last_id:
+            return list()
+        return [p_profile_id + hop for hop in (-15, -7, -3, -1, 1, 3, 7, 15)
+                if 1001 <= p_profile_id + hop <= last_id]
+
+    def get_login_page(self, p_logged_in: bool = True) -> str:
+        """Get the landing page, with CSRF token and user info.
+
+        Args:
+            p_logged_in (bool): If False, get the page as seen by a
+                visitor, with no user info.
+        """
+        if not p_logged_in:
+            return ("<html><head><script>var csrfToken = 'stub0token';"
+                    "</script></head><body><form id=\"login\"></form>"
+                    "</body></html>")
+        recorded = self.get_recorded("login_response")
+        if recorded is not None:
+            return recorded
+        return ("<html><head><script>var csrfToken = 'stub0token';</script>"
+                "<script>var erepublik = {\"citizen\":{\"citizenId\":1000,"
+                "\"name\":\"citizen_1000\",\"level\":50}};</script>"
+                "</head><body></body></html>")
+
+    def get_friends_page(self) -> str:
+        """Get the messages-compose page that lists all friends."""
+        recorded = self.get_recorded("friends_response")
+        if recorded is not None:
+            return recorded
+        friends = [{"id": pid, "name": "citizen_" + pid}
+                   for pid in self.get_friend_ids()]
+        return ("<html><script>\n$j(\"#citizen_name\").tokenInput(" +
+                json.dumps(friends) +
+                ", {prePopulate: [], theme: \"facebook\"});\n"
+                "</script></html>")
+
+    def get_profile(self, p_profile_id: str) -> str:
+        """Get citizen-profile-json for one citizen.
+
+        Args:
+            p_profile_id (str): eRepublik profile ID
+
+        Returns:
+            str: JSON text
+        """
+        recorded = self.get_recorded("profile_response_" + p_profile_id)
+        if recorded is not None:
+            return recorded
+        pid = int(p_profile_id) if p_profile_id.isdigit() else 0
+        rnd = random.Random(pid)
+        level = rnd.randint(1, 100)
+        return json.dumps({
+            "citizen": {"name": "citizen_{}".format(pid),
+                        "is_alive": True,
+                        "avatar": "https://cdn.example/{}.jpg".format(pid),
+                        "level": level},
+            "isAdult": True,
+            "citizenAttributes": {"experience_points": level * 1000},
+            "friends": {"number": rnd.randint(20, 500),
+                        "list": [{"id": fid,
+                                  "name": "citizen_{}".format(fid)}
+                                 for fid in self.get_friends_of(pid)]},
+            "achievements": [{"id": ix} for ix in range(rnd.randint(0, 20))],
+            "isCongressman": False, "isAmbassador": False,
+            "isDictator": False, "isPresident": False,
+            "isTopPlayer": False, "isPartyMember": True,
+            "isPartyPresident": False,
+            "location": {"citizenshipCountry": {
+                "name": "Country {}".format(pid % 40)}},
+            "city": {"residenceCity": {
+                "name": "City {}".format(pid % 200),
+                "region_name": "Region {}".format(pid % 100),
+                "country_name": "Country {}".format(pid % 40)}},
+            "partyData": {"name": "Party {}".format(pid % 60),
+                          "avatar": "//cdn.example/p{}.jpg".format(pid % 60),
+                          "economical_orientation": "Center",
+                          "stripped_title": "party-{}".format(pid % 60),
+                          "id": pid % 60},
+            "military": {
+                "militaryData": {"aircraft": {"name": "Airman"},
+                                 "ground": {"name": "Sergeant"}},
+                "militaryUnit": {"name": "Unit {}".format(pid % 80),
+                                 "militaryRank": "Recruit",
+                                 "id": pid % 80,
+                                 "member_count": rnd.randint(1, 500),
+                                 "avatar": "//cdn.example/m.jpg"}},
+            "newspaper": False})
+
+
+# ======================
+# Main
+# ======================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="efriends eRep stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--replay-dir", default=None)
+    parser.add_argument("--friends", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    args = parser.parse_args()
+    STUB = ErepStub(args.replay_dir, args.friends, args.latency_ms,
+                    args.jitter_ms, args.error_rate, args.rate_limit)
+    STUB.start(args.host, args.port)
+    print("EFRIENDS_EREP_URL={}".format(STUB.erep_url))
+    print("EFRIENDS_ETOOLS_URL={}".format(STUB.etools_url))
+    try:
+        STUB.thread.join()
+    except KeyboardInterrupt:
+        STUB.stop()
@@ -0,0 +1,345 @@
+# coding: utf-8     # noqa: E902
+#!/usr/bin/python3  # noqa: E265
+
+"""
+Local cache of avatar images.
+
+Avatars (citizen, party, militia, newspaper) are fetched on worker
+threads and stored in ~/.efriends/cache/img, keyed by a hash of the
+URL:
+- <key>.png, the image scaled down to MASTER_SIZE, the master copy
+- <key>_<size>.png, thumbnails made from the master as needed
+- <key>.json, URL, ETag, Last-Modified and when it was last checked
+
+A master older than ttl_s is still served right away. It is then
+revalidated in the background with a conditional GET, and replaced
+only if the server sends a new image.
+
+PhotoImage objects for the GUI come from an in-memory LRU.
+ImageTk is imported only when a PhotoImage is asked for, so reports
+can use the cache without Tk.
+
+Module:    imagecache.py
+Class:     ImageCache/0  inherits object
+Author:    PQ <pq_rfw @ pm.me>
+"""
+import base64
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from os import path
+from pathlib import Path
+from pprint import pprint as pp  # noqa: F401
+
+import requests
+from PIL import Image
+
+from metrics import Metrics
+from structs import Structs
+from texts import Texts
+from utils import Utils
+
+MT = Metrics()
+ST = Structs()
+TX = Texts()
+UT = Utils()
+
+
+class ImageCache(object):
+    """Fetch, scale and serve avatar images from a local cache."""
+
+    MASTER_SIZE = 150
+
+    def __init__(self,
+                 p_cache_dir: str = None,
+                 p_max_photos: int = 256,
+                 p_ttl_s: float = 7 * 86400,
+                 p_workers: int = 4):
+        """Initialize ImageCache object.
+
+        Args:
+            p_cache_dir (str, optional): where to keep images. Defaults
+                to the app's image cache directory.
+            p_max_photos (int): PhotoImage objects to keep in memory
+            p_ttl_s (float): seconds before a cached image is rechecked
+            p_workers (int): concurrent downloads
+        """
+        self.cache_dir = p_cache_dir or path.join(UT.get_home(),
+                                                  TX.dbs.img_path)
+        self.max_photos = p_max_photos
+        self.ttl_s = p_ttl_s
+        self.timeout = 10
+        self.photos = OrderedDict()
+        self.lock = threading.Lock()
+        self.in_flight = dict()
+        self.pool = ThreadPoolExecutor(max_workers=p_workers,
+                                       thread_name_prefix="imagecache")
+
+    def get_key(self, p_url: str) -> str:
+        """Get the cache key for an image URL.
+
+        Args:
+            p_url (str): image URL
+
+        Returns:
+            str: hex digest of the URL
+        """
+        return UT.get_fingerprint([p_url], ST.FingerprintAlgo.BLAKE2B_128)
+
+    def get_file(self,
+                 p_url: str,
+                 p_size: int = None,
+                 p_ext: str = "png") -> str:
+        """Get path to a cache file for an image URL.
+
+        Args:
+            p_url (str): image URL
+            p_size (int, optional): thumbnail size. None = the master.
+            p_ext (str): png, json
+
+        Returns:
+            str: full path. The file may not exist yet.
+        """
+        file_nm = self.get_key(p_url)
+        if p_size is not None:
+            file_nm += "_{}".format(p_size)
+        return path.join(self.cache_dir, file_nm + "." + p_ext)
+
+    def read_meta(self, p_url: str) -> dict:
+        """Read the sidecar record of a cached image.
+
+        Args:
+            p_url (str): image URL
+
+        Returns:
+            dict: url, etag, last_modified, checked. Empty if none.
+        """
+        meta_file = self.get_file(p_url, p_ext="json")
+        if not Path(meta_file).exists():
+            return dict()
+        with open(meta_file) as mf:
+            return json.loads(mf.read())
+
+    def write_file(self, p_file: str, p_data: bytes):
+        """Write a cache file so readers never see it half-written.
+
+        Args:
+            p_file (str): full path
+            p_data (bytes): file content
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_file = "{}.{}.tmp".format(p_file, threading.get_ident())
+        with open(tmp_file, "wb") as tf:
+            tf.write(p_data)
+        os.replace(tmp_file, p_file)
+
+    def scale_image(self,
+                    p_image: Image.Image,
+                    p_size: int) -> bytes:
+        """Scale an image to fit a square, keeping its aspect ratio.
+
+        Args:
+            p_image (PIL.Image): source image
+            p_size (int): max width and height, in pixels
+
+        Returns:
+            bytes: PNG data
+        """
+        img = p_image.convert("RGBA")
+        img.thumbnail((p_size, p_size), Image.LANCZOS)
+        png = BytesIO()
+        img.save(png, format="PNG", optimize=True)
+        return png.getvalue()
+
+    def fetch(self, p_url: str) -> bool:
+        """Download an image and store its master copy.
+
+        If the image is already cached, ask the server only for a
+        changed version. Thumbnails of a replaced image are removed.
+
+        Args:
+            p_url (str): image URL
+
+        Returns:
+            bool: True if the cache now holds the image, else False
+        """
+        meta = self.read_meta(p_url)
+        master_file = self.get_file(p_url)
+        headers = dict()
+        if Path(master_file).exists():
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            response = requests.get(p_url, headers=headers,
+                                    timeout=self.timeout)
+        except requests.RequestException:
+            return Path(master_file).exists()
+        if response.status_code == 200:
+            try:
+                image = Image.open(BytesIO(response.content))
+                self.write_file(master_file,
+                                self.scale_image(image, self.MASTER_SIZE))
+            except (OSError, ValueError):
+                return Path(master_file).exists()
+            for thumb in Path(self.cache_dir).glob(
+                    self.get_key(p_url) + "_*.png"):
+                try:
+                    thumb.unlink()
+                except FileNotFoundError:
+                    pass
+            meta = {"url": p_url,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified")}
+        elif response.status_code != 304 or not meta:
+            return Path(master_file).exists()
+        meta["checked"] = time.time()
+        self.write_file(self.get_file(p_url, p_ext="json"),
+                        json.dumps(meta).encode("utf-8"))
+        return True
+
+    def fetch_async(self, p_url: str) -> Future:
+        """Fetch an image on a worker thread.
+
+        Asking again for a URL that is still downloading gets the
+        same Future.
+
+        Args:
+            p_url (str): image URL
+
+        Returns:
+            Future: resolves to the result of fetch()
+        """
+        with self.lock:
+            future = self.in_flight.get(p_url)
+            if future is None:
+                future = self.pool.submit(self.fetch, p_url)
+                self.in_flight[p_url] = future
+                future.add_done_callback(
+                    lambda _: self.in_flight.pop(p_url, None))
+        return future
+
+    def prefetch(self, p_urls: list) -> dict:
+        """Start fetches for all URLs not yet cached or gone stale.
+
+        Args:
+            p_urls (list): image URLs. Empty values are skipped.
+
+        Returns:
+            dict: {str: URL, Future: its fetch} for the fetches started
+        """
+        futures = dict()
+        for url in set(p_urls):
+            if url and not self.is_fresh(url):
+                futures[url] = self.fetch_async(url)
+        return futures
+
+    def is_fresh(self, p_url: str) -> bool:
+        """Check if an image is cached and was checked within ttl_s.
+
+        Args:
+            p_url (str): image URL
+
+        Returns:
+            bool: True if no fetch is needed
+        """
+        if not Path(self.get_file(p_url)).exists():
+            return False
+        checked = self.read_meta(p_url).get("checked", 0)
+        return time.time() - checked < self.ttl_s
+
+    def get_thumbnail(self,
+                      p_url: str,
+                      p_size: int = 64,
+                      p_wait: bool = False) -> str:
+        """Get a cached thumbnail file for an image URL.
+
+        A stale image is returned as-is and revalidated in the
+        background.
+
+        Args:
+            p_url (str): image URL
+            p_size (int): max width and height, in pixels
+            p_wait (bool): If True and the image is not cached, wait
+                for it to download. Else start the download and return.
+
+        Returns:
+            str: full path to the thumbnail, or None if not available
+        """
+        if not p_url:
+            return None
+        master_file = self.get_file(p_url)
+        if Path(master_file).exists():
+            MT.incr("image_cache_hits")
+            if not self.is_fresh(p_url):
+                self.fetch_async(p_url)
+        else:
+            MT.incr("image_cache_misses")
+            future = self.fetch_async(p_url)
+            if not p_wait or not future.result():
+                return None
+        if p_size >= self.MASTER_SIZE:
+            return master_file
+        thumb_file = self.get_file(p_url, p_size)
+        if not Path(thumb_file).exists():
+            with Image.open(master_file) as image:
+                self.write_file(thumb_file, self.scale_image(image, p_size))
+        return thumb_file
+
+    def get_photo(self,
+                  p_url: str,
+                  p_size: int = 64) -> object:
+        """Get a Tk PhotoImage of a cached thumbnail.
+
+        Call from the GUI thread only. If the image is not cached yet,
+        its download is started and None returned; poll the Future
+        from fetch_async() and ask again.
+
+        Args:
+            p_url (str): image URL
+            p_size (int): max width and height, in pixels
+
+        Returns:
+            object: ImageTk.PhotoImage, or None
+        """
+        from PIL import ImageTk
+        thumb_file = self.get_thumbnail(p_url, p_size)
+        if thumb_file is None:
+            return None
+        mtime = os.stat(thumb_file).st_mtime
+        cached = self.photos.get((p_url, p_size))
+        if cached is not None and cached[0] == mtime:
+            self.photos.move_to_end((p_url, p_size))
+            return cached[1]
+        with Image.open(thumb_file) as image:
+            photo = ImageTk.PhotoImage(image)
+        self.photos[(p_url, p_size)] = (mtime, photo)
+        if len(self.photos) > self.max_photos:
+            self.photos.popitem(last=False)
+        return photo
+
+    def get_data_uri(self,
+                     p_url: str,
+                     p_size: int = 32) -> str:
+        """Get a thumbnail as a data: URI, for self-contained HTML.
+
+        Waits for the download if the image is not cached yet.
+
+        Args:
+            p_url (str): image URL
+            p_size (int): max width and height, in pixels
+
+        Returns:
+            str: data URI, or None if the image is not available
+        """
+        thumb_file = self.get_thumbnail(p_url, p_size, p_wait=True)
+        if thumb_file is None:
+            return None
+        with open(thumb_file, "rb") as tf:
+            return "data:image/png;base64," +\
+                base64.b64encode(tf.read()).decode("ascii")
@@ -4,12 +4,26 @@
 """
 Generic logging class.
 
+Records are written as JSON lines, one object per line, like:
+{"ts": "...", "level": "INFO", "component": "dbase", "msg": "..."}
+
+Callers never touch the file. write_log() puts the record on an
+in-memory queue; a QueueListener thread formats it and writes it to
+a size-rotated file. There is one listener and one file handler per
+log file, no matter how many times logging is enabled.
+
+Each component (controls, dbase, views...) logs to its own child
+of the "efriends" logger, so its level can be set on its own.
+
 Module:  logger
-Class:   Logger
+Class:   Logger, JsonLineFormatter
 Author:    PQ <pq_rfw @ pm.me>
 """
+import atexit
+import json
 import logging
-from copy import copy
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pprint import pprint as pp  # noqa: F401
 
 from tzlocal import get_localzone
@@ -23,79 +37,132 @@ TX = Texts()
 ST = Structs()
 
 
+class JsonLineFormatter(logging.Formatter):
+    """Format a log record as one line of JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format the record.
+
+        Args:
+            record (logging.LogRecord): as passed by the handler
+
+        Returns:
+            string: JSON object, no line breaks
+        """
+        line = {"ts": UT.get_utc_ts(p_epoch_ns=int(record.created * 1e9)),
+                "level": record.levelname,
+                "component": record.name.replace(Logger.ROOT + ".", ""),
+                "msg": record.getMessage()}
+        line.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            line["exc"] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str)
+
+
 class Logger(object):
     """Generic logging functions for use with logging module."""
 
+    ROOT = "efriends"
+    MAX_BYTES = 5 * 1024 * 1024
+    BACKUP_COUNT = 5
+    # One (QueueHandler, QueueListener) per log file path.
+    listeners = dict()
+
     def __init__(self,
                  p_log_file: str,
-                 p_log_level: ST.LogLevel = ST.LogLevel.NOTSET):
+                 p_log_level: ST.LogLevel = ST.LogLevel.NOTSET,
+                 p_component_levels: dict = None):
         """Initialize the Logger class.
 
-        Create a new log file if one does not already exist.
-
         Args:
             p_log_file (path): full path to log file location
             p_log_level (ST.LogLevel -> int, optional):
                 A valid log level value. Defaults to NOTSET (= 0).
+            p_component_levels (dict, optional): {component name:
+                ST.LogLevel key}, e.g. {"dbase": "DEBUG"}
         """
         self.LOGLEVEL = p_log_level
         self.LOGFILE = p_log_file
-        erep_dttm = copy(UT.get_dttm(ST.TimeZone.EREP))
-        localhost_tz = get_localzone()
-        localhost_dttm = copy(UT.get_dttm(localhost_tz.zone))
-        f = open(self.LOGFILE, 'a+')
-        f.write(TX.logm.ll_start_sess)
-        local_tm = "{}{} ({})".format(TX.logm.ll_local_tm,
-                                      localhost_dttm.curr_lcl,
-                                      localhost_tz)
-        f.write(local_tm)
-        erep_tm = "{}{} ({})".format(TX.logm.ll_erep_tm,
-                                     erep_dttm.curr_lcl,
-                                     ST.TimeZone.EREP)
-        f.write(erep_tm)
-        univ_tm = "{}{} ({})".format(TX.logm.ll_univ_tm,
-                                     erep_dttm.curr_utc,
-                                     ST.TimeZone.UTC)
-        f.write(univ_tm)
-        f.close()
+        self.component_levels = p_component_levels or dict()
+        self.log = logging.getLogger(self.ROOT)
 
     def set_log(self):
         """Set log level, log formatter and log outputs. Initiates log handling.
 
         Assumes that LOGLEVEL and LOGFILE have been set correctly.
+        Safe to call again: the file keeps its single handler.
         """
-        self.log = logging.getLogger()
         self.log.setLevel(self.LOGLEVEL)
-        # "asctime" will pull the actual localhost timezone time.
-        msg_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        formatter = logging.Formatter(msg_format)
-        logF = logging.FileHandler(self.LOGFILE)
-        logF.setLevel(self.LOGLEVEL)
-        logF.setFormatter(formatter)
-        self.log.addHandler(logF)
+        self.log.propagate = False
+        if self.LOGFILE not in self.listeners:
+            log_queue = queue.SimpleQueue()
+            logF = RotatingFileHandler(self.LOGFILE,
+                                       maxBytes=self.MAX_BYTES,
+                                       backupCount=self.BACKUP_COUNT)
+            logF.setFormatter(JsonLineFormatter())
+            listener = QueueListener(log_queue, logF)
+            listener.start()
+            self.listeners[self.LOGFILE] = (QueueHandler(log_queue), listener)
+            self.log.addHandler(self.listeners[self.LOGFILE][0])
+            atexit.register(self.close_log)
+        for component, level_nm in self.component_levels.items():
+            self.set_component_level(component, level_nm)
+        self.write_session_start()
+
+    def set_component_level(self,
+                            p_component: str,
+                            p_level_nm: str):
+        """Set the log level of one component.
+
+        Args:
+            p_component (str): e.g. controls, dbase, views
+            p_level_nm (str): valid key to ST.LogLevel
+        """
+        if p_level_nm not in ST.LogLevel.keys():
+            msg = TX.shit.f_log_lvl_req + str(ST.LogLevel.keys())
+            raise Exception(ValueError, msg)
+        self.log.getChild(p_component).setLevel(
+            getattr(ST.LogLevel, p_level_nm))
+
+    def write_session_start(self):
+        """Log localhost, eRepublik and UTC times as a session header."""
+        localhost_tz = str(get_localzone())
+        erep_dttm = UT.get_dttm(ST.TimeZone.EREP)
+        localhost_dttm = UT.get_dttm(localhost_tz)
+        self.log.getChild("logger").info(
+            TX.logm.ll_start_sess.strip("\n= "),
+            extra={"fields": {"local_tm": localhost_dttm.curr_lcl,
+                              "local_tz": localhost_tz,
+                              "erep_tm": erep_dttm.curr_lcl,
+                              "erep_tz": ST.TimeZone.EREP,
+                              "utc_tm": erep_dttm.curr_utc}})
 
     def write_log(self,
                   p_msg_level: ST.LogLevel,
-                  p_msg_text: str):
+                  p_msg_text: str,
+                  p_component: str = "controls",
+                  p_fields: dict = None):
         """Write message at designated level.
 
+        Only queues the record. Formatting and file I/O happen on
+        the listener thread.
+
         Args:
             p_msg_level (ST.LogLevel -> int): Valid log level value
             p_msg_text (string): Content of the message to log
+            p_component (string): name of the logging component
+            p_fields (dict, optional): extra keys for the JSON line
         """
-        if p_msg_level in (ST.LogLevel.CRITICAL, ST.LogLevel.FATAL):
-            logging.fatal(p_msg_text)
-        elif p_msg_level == ST.LogLevel.ERROR:
-            logging.error(p_msg_text)
-        elif p_msg_level == ST.LogLevel.WARNING:
-            logging.warning(p_msg_text)
-        elif p_msg_level in (ST.LogLevel.NOTICE, ST.LogLevel.INFO):
-            logging.info(p_msg_text)
-        elif p_msg_level == ST.LogLevel.DEBUG:
-            logging.debug(p_msg_text)
+        if p_msg_level == ST.LogLevel.FATAL:
+            p_msg_level = ST.LogLevel.CRITICAL
+        self.log.getChild(p_component).log(
+            p_msg_level, p_msg_text, extra={"fields": p_fields or {}})
 
     def close_log(self):
-        """Close log handlers. Terminate log handling."""
-        for handler in self.log.handlers:
-            handler.close()
-            self.log.removeFilter(handler)
+        """Flush queued records, close handlers. Terminate log handling."""
+        handler, listener = self.listeners.pop(self.LOGFILE, (None, None))
+        if listener is not None:
+            listener.stop()
+            for file_handler in listener.handlers:
+                file_handler.close()
+            self.log.removeHandler(handler)
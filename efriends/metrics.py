@@ -0,0 +1,175 @@
+# coding: utf-8     # noqa: E902
+#!/usr/bin/python3  # noqa: E265
+
+"""
+In-process timers, counters and histograms for collection runs.
+
+State is held on the class, so every Metrics() instance, in any
+module or thread, records into the same run. Controls resets it at
+the start of a refresh and emits a summary at the end.
+
+Module:    metrics
+Class:     Metrics
+Author:    PQ <pq_rfw @ pm.me>
+"""
+import json
+import threading
+from contextlib import contextmanager
+from pprint import pprint as pp  # noqa: F401
+
+from structs import Structs
+from utils import Utils
+
+ST = Structs()
+UT = Utils()
+
+
+class Metrics(object):
+    """Record stage timings, counts and latency histograms."""
+
+    # Upper bounds of histogram buckets, in milliseconds.
+    BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+    # Counters that always show in a snapshot, even if zero.
+    COUNTERS = ("http_requests", "http_errors", "retries",
+                "profile_cache_hits", "profile_cache_misses",
+                "user_cache_hits", "user_cache_misses",
+                "image_cache_hits", "image_cache_misses",
+                "session_reuses", "session_logins",
+                "name_cache_hits", "name_cache_misses",
+                "rows_added", "rows_updated", "rows_unchanged",
+                "rows_deleted")
+    lock = threading.Lock()
+    counters = dict()
+    timers = dict()
+    histograms = dict()
+    started = None
+
+    @classmethod
+    def reset(cls):
+        """Clear all metrics and start a new run."""
+        with cls.lock:
+            cls.counters = dict((cnm, 0) for cnm in cls.COUNTERS)
+            cls.timers = dict()
+            cls.histograms = dict()
+            cls.started = UT.get_monotonic()
+
+    @classmethod
+    def incr(cls, p_counter: str, p_count: int = 1):
+        """Add to a counter.
+
+        Args:
+            p_counter (str): counter name
+            p_count (int): amount to add. Default is 1.
+        """
+        with cls.lock:
+            cls.counters[p_counter] = cls.counters.get(p_counter, 0) + p_count
+
+    @classmethod
+    def observe(cls,
+                p_stage: str,
+                p_elapsed_ms: float,
+                p_histogram: bool = False):
+        """Record one timing for a stage.
+
+        Args:
+            p_stage (str): stage name, e.g. http, parse, hash, db_write
+            p_elapsed_ms (float): duration in milliseconds
+            p_histogram (bool): If True, also bucket it in a histogram
+        """
+        with cls.lock:
+            tmr = cls.timers.setdefault(p_stage, {
+                "count": 0, "total_ms": 0.0,
+                "min_ms": p_elapsed_ms, "max_ms": p_elapsed_ms})
+            tmr["count"] += 1
+            tmr["total_ms"] += p_elapsed_ms
+            tmr["min_ms"] = min(tmr["min_ms"], p_elapsed_ms)
+            tmr["max_ms"] = max(tmr["max_ms"], p_elapsed_ms)
+            if p_histogram:
+                hist = cls.histograms.setdefault(
+                    p_stage, [0] * (len(cls.BUCKETS_MS) + 1))
+                bx = len(cls.BUCKETS_MS)
+                for ix, upper in enumerate(cls.BUCKETS_MS):
+                    if p_elapsed_ms <= upper:
+                        bx = ix
+                        break
+                hist[bx] += 1
+
+    @classmethod
+    @contextmanager
+    def timer(cls, p_stage: str, p_histogram: bool = False):
+        """Time the enclosed block as one observation of a stage.
+
+        Args:
+            p_stage (str): stage name
+            p_histogram (bool): If True, also bucket it in a histogram
+        """
+        start = UT.get_monotonic()
+        try:
+            yield
+        finally:
+            cls.observe(p_stage, (UT.get_monotonic() - start) * 1000,
+                        p_histogram)
+
+    @classmethod
+    def get_snapshot(cls) -> dict:
+        """Get a copy of all metrics for the current run.
+
+        Returns:
+            dict: elapsed_s, counters, rates, timers, histograms
+        """
+        with cls.lock:
+            counters = dict(cls.counters)
+            timers = dict()
+            for stage, tmr in cls.timers.items():
+                timers[stage] = dict(
+                    (key, round(val, 3)) for key, val in tmr.items())
+                timers[stage]["avg_ms"] =\
+                    round(tmr["total_ms"] / tmr["count"], 3)
+            histograms = dict()
+            labels = ["le_{}ms".format(upper) for upper in cls.BUCKETS_MS]
+            for stage, hist in cls.histograms.items():
+                histograms[stage] = dict(zip(labels + ["gt_{}ms".format(
+                    cls.BUCKETS_MS[-1])], hist))
+            started = cls.started
+        rates = dict()
+        for cache in ("profile_cache", "user_cache", "image_cache",
+                      "name_cache"):
+            hits = counters.get(cache + "_hits", 0)
+            lookups = hits + counters.get(cache + "_misses", 0)
+            rates[cache + "_hit_rate"] =\
+                round(hits / lookups, 3) if lookups else None
+        return {"elapsed_s": round(UT.get_monotonic() - started, 3)
+                if started is not None else None,
+                "counters": counters,
+                "rates": rates,
+                "timers": timers,
+                "histograms": histograms}
+
+    @classmethod
+    def write_summary(cls,
+                      p_run_nm: str,
+                      p_log: object = None,
+                      p_metrics_file: str = None) -> dict:
+        """Emit the run summary to the log and/or a metrics file.
+
+        Args:
+            p_run_nm (str): name of the run, e.g. friends, id_list
+            p_log (Logger, optional): If set, log the summary
+            p_metrics_file (str, optional): If set, append the summary
+                to this file as one JSON line
+
+        Returns:
+            dict: the summary, as from get_snapshot() plus run name/ts
+        """
+        summary = {"run": p_run_nm, "ts": UT.get_utc_ts()}
+        summary.update(cls.get_snapshot())
+        if p_log is not None:
+            p_log.write_log(ST.LogLevel.INFO, "run summary: " + p_run_nm,
+                            "metrics", summary)
+        if p_metrics_file is not None:
+            with open(p_metrics_file, "a") as mf:
+                mf.write(json.dumps(summary) + "\n")
+        return summary
+
+
+Metrics.reset()
@@ -0,0 +1,149 @@
+# coding: utf-8     # noqa: E902
+#!/usr/bin/python3  # noqa: E265
+
+"""
+Opt-in cProfile hooks for GUI actions and report runs.
+
+Off by default. Turn on with the environment variable
+EFRIENDS_PROFILE=1, or with `python3 efriends.py --profile`.
+
+When on, each wrapped action writes to the log directory:
+- profile_<action>_<ts>.prof, a pstats dump for snakeviz, pstats etc.
+- profile_<action>_<ts>.txt, the top-N functions by cumulative time
+and logs the top-N as a structured record.
+
+cProfile watches only the thread that enabled it, so actions that
+run on a worker thread must be wrapped inside that thread. Only one
+action is profiled at a time; an action that starts while another
+is being profiled simply runs unprofiled.
+
+Module:    profiler
+Class:     Profiler
+Author:    PQ <pq_rfw @ pm.me>
+"""
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+from contextlib import contextmanager
+from os import path
+from pprint import pprint as pp  # noqa: F401
+
+from structs import Structs
+from utils import Utils
+
+ST = Structs()
+UT = Utils()
+
+
+class Profiler(object):
+    """Profile named actions and dump results to the log directory."""
+
+    enabled = os.environ.get("EFRIENDS_PROFILE", "") not in ("", "0")
+    out_dir = None
+    top_n = 25
+    log = None
+    lock = threading.Lock()
+
+    @classmethod
+    def configure(cls,
+                  p_enabled: bool = None,
+                  p_out_dir: str = None,
+                  p_top_n: int = None,
+                  p_log: object = None):
+        """Set profiling options. None leaves an option as it is.
+
+        Args:
+            p_enabled (bool): turn profiling on or off
+            p_out_dir (str): where to write dumps, e.g. the log dir
+            p_top_n (int): how many functions to list in the summary
+            p_log (Logger): If set, log each summary
+        """
+        if p_enabled is not None:
+            cls.enabled = p_enabled
+        if p_out_dir is not None:
+            cls.out_dir = p_out_dir
+        if p_top_n is not None:
+            cls.top_n = p_top_n
+        if p_log is not None:
+            cls.log = p_log
+
+    @classmethod
+    @contextmanager
+    def profile(cls, p_action: str):
+        """Profile the enclosed block, if profiling is on.
+
+        Args:
+            p_action (str): action name, used in file names
+        """
+        if not cls.enabled or cls.out_dir is None\
+                or not cls.lock.acquire(blocking=False):
+            yield
+            return
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+            try:
+                yield
+            finally:
+                prof.disable()
+                cls.write_profile(p_action, prof)
+        finally:
+            cls.lock.release()
+
+    @classmethod
+    def wrap(cls, p_action: str) -> object:
+        """Make a decorator that profiles a function as an action.
+
+        Args:
+            p_action (str): action name, used in file names
+
+        Returns:
+            object: decorator
+        """
+        def decorator(p_func):
+            @functools.wraps(p_func)
+            def wrapper(*args, **kwargs):
+                with cls.profile(p_action):
+                    return p_func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @classmethod
+    def write_profile(cls,
+                      p_action: str,
+                      p_prof: cProfile.Profile) -> str:
+        """Dump stats and a top-N summary for one profiled action.
+
+        Args:
+            p_action (str): action name
+            p_prof (cProfile.Profile): disabled profiler holding stats
+
+        Returns:
+            str: full path to the .prof dump
+        """
+        base_nm = path.join(cls.out_dir, "profile_{}_{}".format(
+            p_action, UT.get_utc_ts(p_compact=True)))
+        p_prof.dump_stats(base_nm + ".prof")
+        summary = io.StringIO()
+        stats = pstats.Stats(p_prof, stream=summary)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(cls.top_n)
+        with open(base_nm + ".txt", "w") as sf:
+            sf.write(summary.getvalue())
+        if cls.log is not None:
+            top = list()
+            for func, (_, ncalls, tottime, cumtime, _) in sorted(
+                    stats.stats.items(), key=lambda item: item[1][3],
+                    reverse=True)[:cls.top_n]:
+                top.append({"func": "{}:{}({})".format(*func),
+                            "ncalls": ncalls,
+                            "tottime_s": round(tottime, 4),
+                            "cumtime_s": round(cumtime, 4)})
+            cls.log.write_log(ST.LogLevel.INFO, "profile: " + p_action,
+                              "profiler", {"dump": base_nm + ".prof",
+                                           "total_s": round(
+                                               stats.total_tt, 4),
+                                           "top": top})
+        return base_nm + ".prof"
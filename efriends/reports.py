@@ -45,12 +45,12 @@ at command line (in ../efriends), do like...:
 ... SELECT COUNT(name) AS Citizens,
 ...        citizenship_country AS Country
 ...   FROM citizen
-...  WHERE delete_ts IS NULL and is_alive = "True"
+...  WHERE delete_ts IS NULL and is_alive = 1
 ...  GROUP BY country
 ...  ORDER BY citizens DESC, country ASC;
 ... \"\"\"
 >>> print(UT.get_hash(sql.strip()))
-36985b5737273dbd58386436bcfc8eb4c58b2b77682456f4935dc512925c3f3a`
+dc60b30579c505d3a40a84665b87a064367189ff042580a7b58e002464b722de`
 
 and then paste in the hash after two dashes and space on line 1 of SQL.
 
@@ -60,6 +60,7 @@ ends with ."sql".
 If done properly, then query should show up on "viz" frame.
 """
 import csv
+import html
 import json
 from os import listdir, path
 from pathlib import Path
@@ -70,10 +71,12 @@ import pandas as pd
 import pdfkit
 
 from dbase import Dbase
+from imagecache import ImageCache
 from texts import Texts
 from utils import Utils
 
 DB = Dbase()
+IC = ImageCache()
 TX = Texts()
 UT = Utils()
 
@@ -230,6 +233,11 @@ class Reports(object):
                     p_dataframe: object) -> str:
         """Put query results into HTML format.
 
+        Columns named like *avatar_link are shown as thumbnails,
+        embedded from the local image cache. Avatars not cached yet
+        are downloaded first. Stale ones are used as they are and
+        refreshed in the background.
+
         Args:
             p_result (dict): as created by get_query_result()
             p_dataframe (object): Pandas df based on CSV data
@@ -238,11 +246,56 @@ class Reports(object):
             str: full path to the HTML temp file
         """
         file_path = path.join(self.temp_path, p_result["export"] + ".html")
+        avatar_cols = [col for col in p_dataframe.columns
+                       if str(col).endswith("avatar_link")]
+        if avatar_cols:
+            futures = IC.prefetch([url for col in avatar_cols
+                                   for url in p_dataframe[col]
+                                   if isinstance(url, str)])
+            for url, future in futures.items():
+                if not Path(IC.get_file(url)).exists():
+                    future.result()
+            formatters = dict()
+            for col in p_dataframe.columns:
+                formatters[col] = self.format_html_avatar\
+                    if col in avatar_cols else self.format_html_text
+            html_text = p_dataframe.to_html(formatters=formatters,
+                                            escape=False)
+        else:
+            html_text = p_dataframe.to_html()
         with open(file_path, 'w') as hf:
-            hf.write(p_dataframe.to_html())
+            hf.write(html_text)
         hf.close()
         return file_path
 
+    def format_html_avatar(self, p_url: object) -> str:
+        """Format an avatar link as an embedded thumbnail.
+
+        Args:
+            p_url (object): image URL, or NaN
+
+        Returns:
+            str: <img> tag, or the escaped link if not cached
+        """
+        if not isinstance(p_url, str):
+            return ""
+        data_uri = IC.get_data_uri(p_url)
+        if data_uri is None:
+            return html.escape(p_url)
+        return '<img src="{}" alt="{}">'.format(data_uri,
+                                                html.escape(p_url))
+
+    def format_html_text(self, p_val: object) -> str:
+        """Format any other value as escaped text.
+
+        Args:
+            p_val (object): cell value
+
+        Returns:
+            str: HTML-safe text
+        """
+        return html.escape(str(p_val))
+
     def create_df_pickle(self, p_result: dict,
                          p_dataframe: object) -> str:
         """Put query results to pickled (binary) dataframe object.
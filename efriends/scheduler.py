@@ -0,0 +1,104 @@
+# coding: utf-8     # noqa: E902
+#!/usr/bin/python3  # noqa: E265
+
+"""
+Rank citizens for refresh by how likely their data has changed.
+
+Each citizen gets a change rate, from how often a pull has found
+new data before. The rate is weighted up for friends and higher
+levels, and down for dead citizens. The weighted rate gives:
+- priority, the weighted changes expected since the last pull
+- due_ts, when expected changes reach RefreshPolicy.change_threshold,
+  kept within the policy's min and max intervals
+
+A scheduled run spends its request budget, one profile request
+per citizen, on the due citizens with the highest priority.
+
+Module:    scheduler
+Class:     Scheduler
+Author:    PQ <pq_rfw @ pm.me>
+"""
+from pprint import pprint as pp  # noqa: F401
+
+from dbase import Dbase
+from structs import Structs
+from utils import Utils
+
+DB = Dbase()
+ST = Structs()
+UT = Utils()
+
+
+class Scheduler(object):
+    """Prioritize citizens for refresh within a request budget."""
+
+    def __init__(self, p_policy: ST.RefreshPolicy = None):
+        """Initialize Scheduler object.
+
+        Args:
+            p_policy (ST.RefreshPolicy, optional): ranking weights.
+                Defaults to ST.RefreshPolicy().
+        """
+        self.policy = p_policy or ST.RefreshPolicy()
+
+    def rate_citizen(self,
+                     p_stats: tuple,
+                     p_now: int) -> dict:
+        """Work out priority and next-due time for one citizen.
+
+        Args:
+            p_stats (tuple): one row from DB.query_refresh_stats()
+            p_now (int): epoch seconds
+
+        Returns:
+            dict: profile_id, priority, due_ts, rate_per_day, last_ts
+        """
+        pol = self.policy
+        pid, friend, alive, level, first_ts, last_ts, versions = p_stats
+        observed_days = max(0.0, (last_ts - first_ts) / 86400)
+        rate = (versions - 1 + pol.prior_changes) /\
+            (observed_days + pol.prior_days)
+        weight = (pol.friend_weight if friend else 1.0) *\
+            (1.0 + pol.level_weight * (level or 0) / 100) *\
+            (1.0 if alive or alive is None else pol.dead_weight)
+        interval_days = min(pol.max_interval_days,
+                            max(pol.min_interval_days,
+                                pol.change_threshold / (rate * weight)))
+        return {"profile_id": pid,
+                "priority": round(rate * weight *
+                                  max(0, p_now - last_ts) / 86400, 4),
+                "due_ts": int(last_ts + interval_days * 86400),
+                "rate_per_day": round(rate, 4),
+                "last_ts": last_ts}
+
+    def get_schedule(self, p_now: int = None) -> list:
+        """Rate every current citizen.
+
+        Args:
+            p_now (int, optional): epoch seconds. Default is now.
+
+        Returns:
+            list: of dicts from rate_citizen(), highest priority first
+        """
+        now = p_now or UT.get_epoch(UT.get_utc_ts())
+        schedule = [self.rate_citizen(stats, now)
+                    for stats in DB.query_refresh_stats()]
+        schedule.sort(key=lambda rated: (-rated["priority"],
+                                         rated["last_ts"]))
+        return schedule
+
+    def pick_due(self,
+                 p_budget: int,
+                 p_now: int = None) -> list:
+        """Pick the citizens to refresh in a run.
+
+        Args:
+            p_budget (int): most profile requests to spend
+            p_now (int, optional): epoch seconds. Default is now.
+
+        Returns:
+            list: profile IDs of due citizens, highest priority first
+        """
+        now = p_now or UT.get_epoch(UT.get_utc_ts())
+        return [rated["profile_id"] for rated in self.get_schedule(now)
+                if rated["due_ts"] <= now][:max(0, p_budget)]
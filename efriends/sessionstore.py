@@ -0,0 +1,131 @@
+# coding: utf-8     # noqa: E902
+#!/usr/bin/python3  # noqa: E265
+
+"""
+Keep a logged-in eRepublik session between runs.
+
+The session's cookies and CSRF token are saved to
+~/.efriends/db/erep_session, encrypted with the user's Cipher key.
+A later run loads them back into its requests.Session and checks
+that they still work before logging in again.
+
+The file is tied to one eRep profile ID. It is removed when the
+session is found to be invalid or the user logs out.
+
+Module:    sessionstore.py
+Class:     SessionStore/0  inherits object
+Author:    PQ <pq_rfw @ pm.me>
+"""
+import json
+import os
+import time
+from os import path
+from pathlib import Path
+from pprint import pprint as pp  # noqa: F401
+
+from cipher import Cipher
+from texts import Texts
+from utils import Utils
+
+CI = Cipher()
+TX = Texts()
+UT = Utils()
+
+
+class SessionStore(object):
+    """Save and restore eRep session cookies and CSRF token."""
+
+    def __init__(self, p_file: str = None):
+        """Initialize SessionStore object.
+
+        Args:
+            p_file (str, optional): where to keep the session. Defaults
+                to erep_session in the app's db directory.
+        """
+        self.file = p_file
+
+    def get_file(self) -> str:
+        """Get full path to the session file.
+
+        Resolved on first use, not at import, so that it follows
+        the $HOME the app runs under.
+
+        Returns:
+            str: full path to session file
+        """
+        if self.file is None:
+            self.file = path.join(UT.get_home(), TX.dbs.db_path,
+                                  TX.dbs.session_name)
+        return self.file
+
+    def save(self,
+             p_session: object,
+             p_token: str,
+             p_profile_id: str,
+             p_key: str):
+        """Save a session's cookies and CSRF token, encrypted.
+
+        Args:
+            p_session (requests.Session): logged-in session
+            p_token (str): CSRF token of the session
+            p_profile_id (str): eRep profile ID logged in as
+            p_key (str): user's encryption key
+        """
+        cookies = [{"name": ck.name, "value": ck.value,
+                    "domain": ck.domain, "path": ck.path,
+                    "expires": ck.expires, "secure": ck.secure}
+                   for ck in p_session.cookies]
+        state = json.dumps({"token": p_token,
+                            "profile_id": str(p_profile_id),
+                            "cookies": cookies,
+                            "saved": time.time()})
+        sess_file = self.get_file()
+        os.makedirs(path.dirname(sess_file), exist_ok=True)
+        tmp_file = sess_file + ".tmp"
+        with os.fdopen(os.open(tmp_file,
+                               os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                               0o600), "w") as sf:
+            sf.write(CI.encrypt(state, p_key))
+        os.replace(tmp_file, sess_file)
+
+    def load(self,
+             p_session: object,
+             p_profile_id: str,
+             p_key: str) -> str:
+        """Restore saved cookies into a session.
+
+        Args:
+            p_session (requests.Session): session to restore into
+            p_profile_id (str): eRep profile ID of the user
+            p_key (str): user's encryption key
+
+        Returns:
+            str: saved CSRF token, or None if nothing usable is saved
+        """
+        sess_file = self.get_file()
+        if not Path(sess_file).exists():
+            return None
+        try:
+            with open(sess_file) as sf:
+                state = json.loads(CI.decrypt(sf.read(), p_key))
+        except Exception:
+            self.clear()
+            return None
+        if state.get("profile_id") != str(p_profile_id):
+            return None
+        now = time.time()
+        for ck in state["cookies"]:
+            if ck["expires"] is not None and ck["expires"] < now:
+                continue
+            p_session.cookies.set(ck["name"], ck["value"],
+                                  domain=ck["domain"], path=ck["path"],
+                                  expires=ck["expires"],
+                                  secure=ck["secure"])
+        return state["token"]
+
+    def clear(self):
+        """Forget the saved session."""
+        try:
+            os.remove(self.get_file())
+        except FileNotFoundError:
+            pass
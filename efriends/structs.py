@@ -65,6 +65,18 @@ class Structs(object):
             """Get column names."""
             return list(Structs.HashLevel.__dataclass_fields__.keys())
 
+    @dataclass
+    class FingerprintAlgo:
+        """Define supported row fingerprint (hash_id) algorithms."""
+
+        BLAKE2B_64: str = 'blake2b_64'
+        BLAKE2B_128: str = 'blake2b_128'
+        SHA256: str = 'sha256'
+
+        def keys():
+            """Get column names."""
+            return list(Structs.FingerprintAlgo.__dataclass_fields__.keys())
+
     @dataclass
     class MsgLevel:
         """Define supported tkinter messagebox types."""
@@ -77,6 +89,72 @@ class Structs(object):
             """Get column names."""
             return list(Structs.MsgLevel.__dataclass_fields__.keys())
 
+    @dataclass
+    class DbProfile:
+        """Define names of SQLite tuning presets, from safest to fastest."""
+
+        SAFE: str = 'safe'
+        NORMAL: str = 'normal'
+        BULK: str = 'bulk'
+
+        def keys():
+            """Get column names."""
+            return list(Structs.DbProfile.__dataclass_fields__.keys())
+
+    @dataclass
+    class JobStatus:
+        """Define states of one profile ID in a refresh job.
+
+        An ID that keeps failing is moved to the dead-letter list.
+        """
+
+        QUEUED: str = 'queued'
+        DONE: str = 'done'
+        DEAD: str = 'dead'
+
+        def keys():
+            """Get column names."""
+            return list(Structs.JobStatus.__dataclass_fields__.keys())
+
+    @dataclass
+    class DbPragmas:
+        """Define SQLite pragma values applied on connect.
+
+        Defaults are the "normal" preset. cache_size < 0 is in KiB.
+        """
+
+        journal_mode: str = 'WAL'
+        synchronous: str = 'NORMAL'
+        cache_size: int = -32000
+        mmap_size: int = 134217728
+        temp_store: str = 'MEMORY'
+
+        def keys():
+            """Get column names."""
+            return list(Structs.DbPragmas.__dataclass_fields__.keys())
+
+    @dataclass
+    class RefreshPolicy:
+        """Define weights used to rank citizens for scheduled refresh.
+
+        A citizen's change rate is its stored versions per day,
+        smoothed by prior_changes per prior_days, so new citizens
+        start out at about one change a fortnight.
+        """
+
+        friend_weight: float = 3.0
+        level_weight: float = 1.0
+        dead_weight: float = 0.1
+        prior_changes: float = 1.0
+        prior_days: float = 14.0
+        change_threshold: float = 1.0
+        min_interval_days: float = 0.5
+        max_interval_days: float = 30.0
+
+        def keys():
+            """Get column names."""
+            return list(Structs.RefreshPolicy.__dataclass_fields__.keys())
+
 # DATA STRUCTURES. Database Schema.
 
     @dataclass
@@ -110,36 +188,39 @@ class Structs(object):
 
     @dataclass
     class CitizenFields:
-        """Define non-audit columns on citizens table."""
+        """Define non-audit columns on citizens table.
+
+        int maps to INTEGER, bool to INTEGER 0/1, str to TEXT.
+        """
 
         profile_id: str = None
         name: str = None
-        is_user_friend: str = None
-        is_alive: str = None
-        is_adult: str = None
+        is_user_friend: bool = None
+        is_alive: bool = None
+        is_adult: bool = None
         avatar_link: str = None
-        level: str = None
-        xp: str = None
-        friends_count: str = None
-        achievements_count: str = None
+        level: int = None
+        xp: int = None
+        friends_count: int = None
+        achievements_count: int = None
         citizenship_country: str = None
         residence_city: str = None
         residence_region: str = None
         residence_country: str = None
-        is_in_congress: str = None
-        is_ambassador: str = None
-        is_dictator: str = None
-        is_country_president: str = None
-        is_top_player: str = None
-        is_party_member: str = None
-        is_party_president: str = None
+        is_in_congress: bool = None
+        is_ambassador: bool = None
+        is_dictator: bool = None
+        is_country_president: bool = None
+        is_top_player: bool = None
+        is_party_member: bool = None
+        is_party_president: bool = None
         party_name: str = None
         party_avatar_link: str = None
         party_orientation: str = None
         party_url: str = None
         militia_name: str = None
         militia_url: str = None
-        militia_size: str = None
+        militia_size: int = None
         militia_avatar_link: str = None
         military_rank: str = None
         aircraft_rank: str = None
@@ -151,3 +232,62 @@ class Structs(object):
         def keys():
             """Get column names."""
             return list(Structs.CitizenFields.__dataclass_fields__.keys())
+
+        def types():
+            """Get python type of each column, keyed by column name."""
+            return {cnm: fld.type for cnm, fld in
+                    Structs.CitizenFields.__dataclass_fields__.items()}
+
+    @dataclass
+    class CitizenDims:
+        """Define keys from citizen rows to shared lookup tables.
+
+        Each attribute is an INTEGER key column on the citizen fact
+        tables. Its value is (lookup table name, pairs of
+        (CitizenFields column, lookup table column)). The lookup
+        table primary key is named <lookup table>_id.
+        """
+
+        party_id: tuple = ("party", (("party_name", "name"),
+                                     ("party_url", "url"),
+                                     ("party_avatar_link", "avatar_link"),
+                                     ("party_orientation", "orientation")))
+        military_unit_id: tuple = ("military_unit",
+                                   (("militia_name", "name"),
+                                    ("militia_url", "url"),
+                                    ("militia_avatar_link", "avatar_link")))
+        newspaper_id: tuple = ("newspaper",
+                               (("newspaper_name", "name"),
+                                ("newspaper_url", "url"),
+                                ("newspaper_avatar_link", "avatar_link")))
+        residence_id: tuple = ("location",
+                               (("residence_city", "city"),
+                                ("residence_region", "region"),
+                                ("residence_country", "country")))
+        citizenship_id: tuple = ("location",
+                                 (("citizenship_country", "country"),))
+
+        def keys():
+            """Get column names."""
+            return list(Structs.CitizenDims.__dataclass_fields__.keys())
+
+    @dataclass
+    class CitizenMetrics:
+        """Define columns on citizen_metrics table.
+
+        Typed numeric snapshot of a citizen, one row per second in
+        which a version was stored; the last such version wins.
+        ts is seconds since the Unix epoch, UTC.
+        """
+
+        profile_id: int = None
+        ts: int = None
+        level: int = None
+        xp: int = None
+        friends_count: int = None
+        achievements_count: int = None
+        militia_size: int = None
+
+        def keys():
+            """Get column names."""
+            return list(Structs.CitizenMetrics.__dataclass_fields__.keys())
@@ -65,6 +65,8 @@ class Texts(object):
         l_getcit_bynm: str = 'Get citizen data by Name:'
         l_idf_loc: str = 'Get Profile IDs from file:'
         l_db_refresh: str = 'Refresh all on Database:'
+        l_due_refresh: str = 'Refresh most likely changed:'
+        l_crawl: str = 'Crawl friends of friends:'
 
     @dataclass
     class button:
@@ -113,16 +115,44 @@ class Texts(object):
         n_problem: str = "Problem loading data."
         n_id_file_on: str = "Profile ID file processed."
         n_id_data_on: str = "Data base profile IDs processed."
+        n_due_data_on: str = "Scheduled refresh done."
+        n_crawl_on: str = "Friend-of-friend crawl done."
         n_lookup_id: str = "Getting data for ID: "
         n_lookup_nm: str = "Getting data for name: "
         n_profiles_done: str =\
             "Number of profile IDs processed successfully: "
         n_profiles_pulled: str =\
             "Number of unique, active profile IDs from DB: "
+        n_profiles_due: str =\
+            "Number of profile IDs due for refresh picked: "
         n_friends_pulled: str =\
             "Number of friend profile IDs retrieved: "
+        n_job_queued: str = "IDs left queued for the next run: "
+        n_job_dead: str = "IDs given up on (dead letters): "
+        n_friends_added: str = "New friends: "
+        n_friends_stale: str = "Friends due for refresh: "
+        n_friends_removed: str = "No longer friends: "
+        n_friends_skipped: str = "Friends up to date, not pulled: "
+        n_ids_read: str = "Tokens read from the ID file: "
+        n_ids_invalid: str = "Not a profile ID, skipped: "
+        n_ids_duplicate: str = "Repeated IDs, skipped: "
+        n_ids_fresh: str = "IDs pulled recently, skipped: "
+        n_files_read: str = "Cached profile files read: "
+        n_files_per_s: str = "Files per second: "
+        n_files_bad: str = "Files that could not be read: "
+        n_rows_added: str = "Citizens added: "
+        n_rows_updated: str = "Citizens updated: "
+        n_rows_unchanged: str = "Citizens unchanged: "
+        n_names_resolved: str = "Names resolved to profile IDs: "
+        n_names_unresolved: str = "Names not found: "
+        n_crawl_done: str = "Citizens expanded by the crawl: "
+        n_crawl_edges: str = "Friendships known: "
+        n_crawl_queued: str = "Citizens left on the crawl frontier: "
         n_finito: str = "*** Done ***"
         n_files_exported: str = "Files exported to [cache]"
+        n_rows_purged: str = "Number of superseded rows purged: "
+        n_bytes_reclaimed: str = "Bytes returned to file system: "
+        n_bytes_free: str = "Bytes free for reuse inside DB: "
 
     @dataclass
     class dbs:
@@ -130,11 +160,14 @@ class Texts(object):
         lcl_path: str = '.efriends'
         db_path: str = '.efriends/db'
         cache_path: str = '.efriends/cache'
+        img_path: str = '.efriends/cache/img'
         log_path: str = '.efriends/log'
         bkup_path: str = '.efriends/bkup'
         arcv_path: str = '.efriends/arcv'
         db_name: str = 'efriends.db'
         log_name: str = 'efriends.log'
+        metrics_name: str = 'efriends_metrics.jsonl'
+        session_name: str = 'erep_session'
 
     @dataclass
     class query:
@@ -146,6 +179,7 @@ class Texts(object):
         """Static URLs."""
         # eRepublik and erepublik.tools
         u_erep: str = "https://www.erepublik.com/en"
+        u_etools: str = "https://api.erepublik.tools/v0"
         # Help pages / GitHub wiki
         h_user_guide: str =\
             "https://github.com/genuinemerit/erep-friends/wiki/User-Guide"
@@ -164,7 +198,9 @@ class Texts(object):
         ll_log_lvl: str = "Log level :"
         ll_logout_cd: str = "Logout status code: "
         ll_login_cd: str = "Login status code: "
+        ll_session_stale: str = "Saved eRep session no longer valid: "
         ll_friends_cd: str = "Friends request status code: "
+        ll_profile_rqst_cd: str = "Profile request failed, ID and code: "
         ll_save_logout_resp: str =\
             "Logout response/redirect text saved to log dir."
         ll_save_login_resp: str = "Login response text saved to log dir."
@@ -184,11 +220,16 @@ class Texts(object):
         f_user_ver: str = "Your version is v~VERSION~."
         f_bad_path: str = "Path could not be reached: "
         f_log_lvl_req: str = "Log level must be one of: "
+        f_db_profile_req: str = "DB tuning profile must be one of: "
+        f_metric_req: str = "Not a citizen metric: "
         f_login_failed: str =\
             "Login connection failed. See response text in log." +\
             "\n Probably a captcha. May want to wait a few hours."
         f_apikey_failed: str = "Verification of eRep Tools API key failed. "
         f_profile_id_failed: str = "Invalid eRepublik Profile ID: "
+        f_profile_rqst_failed: str = "Could not get profile from eRep: "
         f_upsert_failed: str = "Cannot upsert. Record not found or OID not matched."
         f_no_go: str = "Cannot complete request."
         f_no_format: str = "Choose at least one export format."
+        f_collect_busy: str = "A data collection run is still in progress."
+        f_json_array: str = "No readable JSON list found after: "
@@ -9,22 +9,36 @@ Class:     Utils
 Author:    PQ <pq_rfw @ pm.me>
 """
 import hashlib
+import json
+import re
 import secrets
 import subprocess as shl
+import threading
+import time
 from collections import namedtuple
+from contextlib import contextmanager
 from copy import copy
+from datetime import datetime, timezone
 from pprint import pprint as pp  # noqa: F401
 
 import arrow
 
 from structs import Structs
+from texts import Texts
 
 ST = Structs()
+TX = Texts()
+
+
+DTTM = namedtuple("dttm", ['tz', 'curr_lcl', 'curr_lcl_short', 'next_lcl',
+                           'curr_utc', 'next_utc', 'curr_ts'])
 
 
 class Utils(object):
     """Generic functions for common tasks."""
 
+    pinned = threading.local()
+
     @classmethod
     def get_dttm(cls, p_tzone: str) -> namedtuple:
         """Get date and time values.
@@ -46,21 +60,129 @@ class Utils(object):
         """
         long_format = 'YYYY-MM-DD HH:mm:ss.SSSSS ZZ'
         short_format = 'YYYY-MM-DD HH:mm:ss'
-        fields = ['tz', 'curr_lcl', 'curr_lcl_short', 'next_lcl',
-                  'curr_utc', 'next_utc', 'curr_ts']
-        dttm = namedtuple("dttm", " ".join(fields))
-        lcl_dttm = arrow.now(p_tzone)
-        dttm.curr_lcl = str(lcl_dttm.format(long_format))
-        dttm.curr_lcl_short = str(lcl_dttm.format(short_format))
-        dttm.next_lcl = str(lcl_dttm.shift(days=+1).format(long_format))
-        utc_dttm = arrow.utcnow()
-        dttm.curr_utc = str(utc_dttm.format(long_format))
-        dttm.next_utc = str(utc_dttm.shift(days=+1).format(long_format))
-        dttm.curr_ts = dttm.curr_utc.strip()
-        for rm in [' ', ':', '+', '.', '-']:
-            dttm.curr_ts = dttm.curr_ts.replace(rm, '')
-        dttm.curr_ts = dttm.curr_ts[0:-4]
-        return dttm
+        epoch_ns = time.time_ns()
+        utc_dttm = arrow.get(epoch_ns / 1e9)
+        lcl_dttm = utc_dttm.to(p_tzone)
+        return DTTM(
+            tz=p_tzone,
+            curr_lcl=lcl_dttm.format(long_format),
+            curr_lcl_short=lcl_dttm.format(short_format),
+            next_lcl=lcl_dttm.shift(days=+1).format(long_format),
+            curr_utc=cls.get_utc_ts(p_epoch_ns=epoch_ns),
+            next_utc=cls.get_utc_ts(p_epoch_ns=epoch_ns + 86400 * 10**9),
+            curr_ts=cls.get_utc_ts(p_compact=True, p_epoch_ns=epoch_ns))
+
+    @classmethod
+    def get_utc_ts(cls,
+                   p_compact: bool = False,
+                   p_epoch_ns: int = None) -> str:
+        """Get a UTC audit timestamp from a single clock read.
+
+        Cheap alternative to get_dttm() when only UTC is needed.
+        Inside pin_utc_ts(), returns the pinned time instead.
+
+        Args:
+            p_compact (bool): If True, return YYYYMMDDHHmmssSSSSS
+            p_epoch_ns (int, optional): nanoseconds since the epoch.
+                Defaults to now.
+
+        Returns:
+            string: UTC date time (YYYY-MM-DD HH:mm:ss.SSSSS ZZ)
+        """
+        if p_epoch_ns is None:
+            p_epoch_ns = getattr(cls.pinned, "epoch_ns", None)\
+                or time.time_ns()
+        secs, nsecs = divmod(p_epoch_ns, 10**9)
+        tm = time.gmtime(secs)
+        ts_format = "%04d%02d%02d%02d%02d%02d%05d" if p_compact\
+            else "%04d-%02d-%02d %02d:%02d:%02d.%05d +00:00"
+        return ts_format % (tm.tm_year, tm.tm_mon, tm.tm_mday,
+                            tm.tm_hour, tm.tm_min, tm.tm_sec, nsecs // 10000)
+
+    @classmethod
+    @contextmanager
+    def pin_utc_ts(cls):
+        """Give every get_utc_ts() call in this thread the same time.
+
+        Use around one bulk write so all its rows get one consistent
+        timestamp. Keep it to a single transaction: rows written
+        under one pin cannot be told apart by time. Nested calls keep
+        the outer pinned time.
+        """
+        if getattr(cls.pinned, "epoch_ns", None):
+            yield
+            return
+        cls.pinned.epoch_ns = time.time_ns()
+        try:
+            yield
+        finally:
+            cls.pinned.epoch_ns = None
+
+    @classmethod
+    def get_monotonic(cls) -> float:
+        """Get seconds from a clock that never goes backwards.
+
+        Use for timeouts and elapsed times, not for stored timestamps.
+
+        Returns:
+            float: fractional seconds, arbitrary reference point
+        """
+        return time.monotonic()
+
+    @classmethod
+    def get_past_utc(cls, p_days: int) -> str:
+        """Get UTC date time for a number of days before now.
+
+        Same format as get_dttm().curr_utc, so results compare
+        correctly against audit timestamps stored on the DB.
+
+        Args:
+            p_days (int): how many days to go back
+
+        Returns:
+            string: UTC date time (YYYY-MM-DD HH:mm:ss.SSSSS ZZ)
+        """
+        return cls.get_utc_ts(
+            p_epoch_ns=time.time_ns() - p_days * 86400 * 10**9)
+
+    @classmethod
+    def get_epoch(cls, p_utc_ts: str) -> int:
+        """Convert a UTC audit timestamp to seconds since the epoch.
+
+        Args:
+            p_utc_ts (str): UTC date time (YYYY-MM-DD HH:mm:ss.SSSSS ZZ)
+
+        Returns:
+            int: whole seconds since 1970-01-01 00:00:00 UTC
+        """
+        dttm = datetime.strptime(p_utc_ts[:19], "%Y-%m-%d %H:%M:%S")
+        return int(dttm.replace(tzinfo=timezone.utc).timestamp())
+
+    @classmethod
+    def cast_value(cls, p_val, p_type: type):
+        """Convert a value to the python type of its DB column.
+
+        Empty values, including the legacy "None" string, become None.
+        bool becomes 1 or 0, so flags store as INTEGER.
+
+        Args:
+            p_val (any): raw value, e.g. from eRep JSON or an old DB row
+            p_type (type): str, int or bool
+
+        Returns:
+            str, int or None
+        """
+        if p_val is None or (isinstance(p_val, (str, list, dict))
+                             and p_val in ("", "None", "[]", "{}", [], {})):
+            return None
+        if p_type is bool:
+            return 1 if p_val in (True, 1, "1", "true", "True") else 0
+        if p_type is int:
+            try:
+                return int(p_val)
+            except (TypeError, ValueError):
+                return None
+        return str(p_val)
 
     @classmethod
     def get_hash(cls,
@@ -89,6 +211,205 @@ class Utils(object):
         v_hash.update(p_data_in.encode("utf-8"))
         return v_hash.hexdigest()
 
+    @classmethod
+    def get_fingerprint(cls,
+                        p_values: list,
+                        p_algo: ST.FingerprintAlgo =
+                        ST.FingerprintAlgo.BLAKE2B_128) -> str:
+        """Create change-detection hash of a list of field values.
+
+        Values are joined with the ASCII unit separator (0x1F), so
+        field boundaries count: ["ab", "c"] and ["a", "bc"] differ.
+        In the rare case a value holds 0x1F itself, all values are
+        length-prefixed instead, which cannot collide with the
+        plain form. None and "" are both treated as empty.
+
+        Args:
+            p_values (list): field values, in a fixed column order
+            p_algo (ST.FingerprintAlgo -> str, optional):
+                Default is blake2b with a 16-byte digest.
+
+        Returns:
+            string: hex digest
+        """
+        vals = ["" if val is None else str(val) for val in p_values]
+        canon = "\x1f".join(vals)
+        if canon.count("\x1f") != len(vals) - 1:
+            canon = "\x1f" + ",".join([str(len(val)) for val in vals]) +\
+                "\x1f" + canon
+        data_in = canon.encode("utf-8")
+        if p_algo == ST.FingerprintAlgo.SHA256:
+            return hashlib.sha256(data_in).hexdigest()
+        digest_size = 8 if p_algo == ST.FingerprintAlgo.BLAKE2B_64 else 16
+        return hashlib.blake2b(data_in, digest_size=digest_size).hexdigest()
+
+    @classmethod
+    def iter_file_chunks(cls,
+                         p_file_path: str,
+                         p_chunk_size: int = 65536) -> object:
+        """Read a text file in chunks.
+
+        Args:
+            p_file_path (str): full path to the file
+            p_chunk_size (int): characters per chunk
+
+        Returns:
+            generator: str chunks
+        """
+        with open(p_file_path) as tf:
+            for chunk in iter(lambda: tf.read(p_chunk_size), ""):
+                yield chunk
+
+    @classmethod
+    def iter_tokens(cls,
+                    p_chunks: object,
+                    p_delims: str = " \t\r\n,;:~'\"") -> object:
+        """Split streamed text into tokens, in one pass.
+
+        A token cut off at the end of a chunk is carried over to the
+        next one.
+
+        Args:
+            p_chunks (iterable): str chunks, e.g. from a file
+            p_delims (str): every character that separates tokens
+
+        Returns:
+            generator: str tokens, never empty
+        """
+        token_re = re.compile("[^{}]+".format(re.escape(p_delims)))
+        tail = ""
+        for chunk in p_chunks:
+            buf = tail + chunk
+            tail = ""
+            for match in token_re.finditer(buf):
+                if match.end() == len(buf):
+                    tail = match.group()
+                else:
+                    yield match.group()
+        if tail:
+            yield tail
+
+    @classmethod
+    def iter_unique_ids(cls,
+                        p_tokens: object,
+                        p_counts: dict = None) -> object:
+        """Keep only numeric IDs, and each of those only once.
+
+        IDs seen so far are kept in a bitmap, one bit per ID up to the
+        largest seen, which is far smaller than a set for millions of
+        IDs. IDs of 2**27 and up go in a set instead, so one odd ID
+        cannot blow up the bitmap.
+
+        Args:
+            p_tokens (iterable): str tokens
+            p_counts (dict, optional): If set, updated with counts of
+                tokens "read", "invalid" and "duplicate"
+
+        Returns:
+            generator: str IDs, without leading zeroes
+        """
+        counts = p_counts if p_counts is not None else dict()
+        for key in ("read", "invalid", "duplicate"):
+            counts.setdefault(key, 0)
+        seen = bytearray()
+        seen_big = set()
+        for token in p_tokens:
+            counts["read"] += 1
+            if not (token.isascii() and token.isdigit()) or int(token) < 1:
+                counts["invalid"] += 1
+                continue
+            num = int(token)
+            if num >= 1 << 27:
+                is_dup = num in seen_big
+                seen_big.add(num)
+            else:
+                byte, bit = num >> 3, 1 << (num & 7)
+                if byte >= len(seen):
+                    seen.extend(bytes(max(byte + 1 - len(seen), len(seen))))
+                is_dup = bool(seen[byte] & bit)
+                seen[byte] |= bit
+            if is_dup:
+                counts["duplicate"] += 1
+                continue
+            yield str(num)
+
+    @classmethod
+    def iter_json_array(cls,
+                        p_chunks: object,
+                        p_marker: str) -> object:
+        """Yield the items of a JSON array embedded in streamed text.
+
+        Scans once for p_marker, then decodes the array after it one
+        item at a time, so callers can act on an item before the rest
+        has arrived. Only the current item is held in memory. Text
+        after the array is read and dropped, so the source is always
+        consumed to its end.
+
+        Args:
+            p_chunks (iterable): str chunks, e.g. from a file or response
+            p_marker (str): text just before the array's "["
+
+        Raises:
+            ValueError if the marker or a well-formed array is missing
+
+        Returns:
+            generator: decoded items
+        """
+        decoder = json.JSONDecoder(strict=False)
+        chunks = iter(p_chunks)
+        buf = ""
+        for chunk in chunks:
+            buf += chunk
+            found = buf.find(p_marker)
+            if found >= 0:
+                buf = buf[found + len(p_marker):]
+                break
+            buf = buf[max(0, len(buf) - len(p_marker) + 1):]
+        else:
+            raise Exception(ValueError, TX.shit.f_json_array + p_marker)
+        pos = 0
+        expect = "["
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            char = buf[pos] if pos < len(buf) else ""
+            item = end = None
+            is_item = char not in ("", "]") and expect in ("first", "item")
+            if is_item:
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    end = None
+            if not char or (is_item and end is None) or end == len(buf):
+                # Item may be cut off at the chunk boundary.
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    buf = buf[pos:] + chunk
+                    pos = 0
+                    continue
+                if end is None:
+                    raise Exception(ValueError,
+                                    TX.shit.f_json_array + p_marker)
+            if expect == "[" and char == "[":
+                expect = "first"
+                pos += 1
+            elif expect == "sep" and char == ",":
+                expect = "item"
+                pos += 1
+            elif expect in ("first", "sep") and char == "]":
+                break
+            elif expect in ("first", "item") and end is not None:
+                yield item
+                expect = "sep"
+                pos = end
+            else:
+                raise Exception(ValueError, TX.shit.f_json_array + p_marker)
+            if pos > 65536:
+                buf = buf[pos:]
+                pos = 0
+        for _ in chunks:
+            pass
+
     @classmethod
     def pluralize(cls, p_singular: str) -> str:
         """Return plural form of a singular-form English noun.
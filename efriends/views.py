@@ -8,23 +8,26 @@ Module:    views.py
 Class:     Views/0  inherits object
 Author:    PQ <pq_rfw @ pm.me>
 """
+import threading
 import tkinter as tk
 from dataclasses import dataclass
 from os import path
 from pprint import pprint as pp  # noqa: F401
 from tkinter import filedialog, messagebox, ttk
 
-import requests
 import webview
-from PIL import Image, ImageTk
 
 from controls import Controls
+from imagecache import ImageCache
+from profiler import Profiler
 from reports import Reports
 from structs import Structs
 from texts import Texts
 from utils import Utils
 
 CN = Controls()
+IC = ImageCache()
+PR = Profiler()
 RP = Reports()
 ST = Structs()
 TX = Texts()
@@ -44,6 +47,8 @@ class Views(object):
         CN.set_erep_headers()
         CN.configure_database()
         CN.create_log('INFO')
+        PR.configure(p_out_dir=path.join(UT.get_home(), TX.dbs.log_path),
+                     p_log=CN.LOG if CN.logme else None)
         CN.create_bkupdb()
         self.set_basic_interface()
         if not self.check_user():
@@ -56,6 +61,7 @@ class Views(object):
         """Data buffer for Views object."""
 
         current_frame: str = None
+        collect_thread: threading.Thread = None
 
     # Helpers
 
@@ -83,6 +89,49 @@ class Views(object):
             if p_item == TX.menu.i_viz:
                 self.win_menu.entryconfig(2, state=w_state)
 
+    def run_in_background(self,
+                          p_func: object,
+                          p_on_done: object,
+                          p_action: str = "collect"):
+        """Run a long collection call on a worker thread.
+
+        Keeps the GUI responsive, so reports can run while a refresh
+        writes to the DB. Only one collection runs at a time.
+        The result is handed to p_on_done back on the GUI thread.
+
+        Args:
+            p_func (object): callable doing the collection work
+            p_on_done (object): callable taking p_func's return value
+            p_action (str): action name, for the profiler
+        """
+        if (self.buffer.collect_thread is not None
+                and self.buffer.collect_thread.is_alive()):
+            self.show_message(ST.MsgLevel.WARN, TX.msg.n_problem,
+                              TX.shit.f_collect_busy)
+            return
+        outcome = dict()
+
+        def work():
+            try:
+                with PR.profile(p_action):
+                    outcome["result"] = p_func()
+            except Exception as err:
+                outcome["error"] = err
+
+        def poll():
+            if self.buffer.collect_thread.is_alive():
+                self.win_root.after(250, poll)
+            elif "error" in outcome:
+                self.show_message(ST.MsgLevel.ERROR, TX.msg.n_problem,
+                                  str(outcome["error"]))
+            else:
+                p_on_done(outcome["result"])
+
+        self.buffer.collect_thread = threading.Thread(target=work,
+                                                      daemon=True)
+        self.buffer.collect_thread.start()
+        poll()
+
     # Event handlers
 
     def exit_appl(self):
@@ -183,9 +232,13 @@ class Views(object):
     def collect_friends(self):
         """Login to and logout of erep using user credentials."""
         usrd, _ = CN.get_user_db_record()
-        detail = CN.get_erep_friends_data(usrd.user_erep_profile_id)
-        self.show_message(ST.MsgLevel.INFO, TX.msg.n_got_friends, detail)
+        self.run_in_background(
+            lambda: CN.sync_erep_friends(usrd.user_erep_profile_id),
+            lambda detail: self.show_message(
+                ST.MsgLevel.INFO, TX.msg.n_got_friends, detail),
+            "collect_friends")
 
+    @Profiler.wrap("get_citizen_by_id")
     def get_citizen_by_id(self):
         """Get user profile data from eRepublik."""
         msg = None
@@ -195,8 +248,7 @@ class Views(object):
             if ctzn_d is not None:
                 msg = TX.msg.n_citzn_on_db
                 detail = TX.msg.n_updating_citzn
-                is_friend = True if ctzn_d.is_user_friend == "True"\
-                    else False
+                is_friend = bool(ctzn_d.is_user_friend)
             else:
                 msg = TX.msg.n_new_citzn
                 detail = TX.msg.n_adding_citzn
@@ -207,6 +259,7 @@ class Views(object):
             if call_ok:
                 self.show_message(ST.MsgLevel.INFO, msg, detail)
 
+    @Profiler.wrap("get_citizen_by_name")
     def get_citizen_by_name(self):
         """Look up Citizen profile by Name."""
         msg = None
@@ -224,14 +277,13 @@ class Views(object):
                 if ctzn_d is not None:
                     msg = TX.msg.n_citzn_on_db
                     detail = TX.msg.n_updating_citzn
-                    is_friend = True if ctzn_d.is_user_friend == "True"\
-                        else False
+                    is_friend = bool(ctzn_d.is_user_friend)
                 else:
                     is_friend_val = self.isfriend_nm_chk.get()
                     is_friend = True if is_friend_val == 1 else False
-                    ok, detail =\
-                        CN.get_erep_citizen_by_nm(apikey, citizen_nm,
-                                                False, is_friend)
+                    ok = CN.get_erep_citizen_by_nm(apikey, citizen_nm,
+                                                   False, is_friend)
+                    detail = citizen_nm
                     if ok:
                         msg = TX.msg.n_new_citzn
                     else:
@@ -256,23 +308,54 @@ class Views(object):
         msg = None
         id_file_path = str(self.idf_loc.get()).strip()
         if id_file_path not in (None, "None", ""):
-            call_ok, detail =\
-                CN.refresh_citizen_data_from_file(id_file_path)
-            self.show_message(ST.MsgLevel.INFO,
-                              TX.msg.n_id_file_on, detail)
+            self.run_in_background(
+                lambda: CN.refresh_citizen_data_from_file(id_file_path),
+                lambda result: self.show_message(
+                    ST.MsgLevel.INFO, TX.msg.n_id_file_on, result[1]),
+                "refresh_from_file")
 
     def refresh_ctizns_from_db(self):
         """Refresh citizen data based on active profile IDs on DB."""
-        msg = None
-        msglvl = ST.MsgLevel.INFO
-        ok, detail = CN.refresh_ctzn_data_from_db()
-        if ok:
-            msg = TX.msg.n_id_data_on
-        else:
-            msg = TX.msg.n_problem
-            msglvl = ST.MsgLevel.WARN
-        self.show_message(msglvl, msg, detail)
+        def show_result(p_result: tuple):
+            ok, detail = p_result
+            if ok:
+                self.show_message(ST.MsgLevel.INFO,
+                                  TX.msg.n_id_data_on, detail)
+            else:
+                self.show_message(ST.MsgLevel.WARN,
+                                  TX.msg.n_problem, detail)
+
+        self.run_in_background(CN.refresh_ctzn_data_from_db, show_result,
+                               "refresh_from_db")
+
+    def refresh_due_citizens(self):
+        """Refresh citizen data for top due IDs, within the budget."""
+        def show_result(p_result: tuple):
+            ok, detail = p_result
+            if ok:
+                self.show_message(ST.MsgLevel.INFO,
+                                  TX.msg.n_due_data_on, detail)
+            else:
+                self.show_message(ST.MsgLevel.WARN,
+                                  TX.msg.n_problem, detail)
+
+        self.run_in_background(CN.refresh_due_citizens, show_result,
+                               "refresh_due")
+
+    def crawl_friend_graph(self):
+        """Crawl friends of friends, resuming any unfinished crawl."""
+        def show_result(p_result: tuple):
+            ok, detail = p_result
+            if ok:
+                self.show_message(ST.MsgLevel.INFO,
+                                  TX.msg.n_crawl_on, detail)
+            else:
+                self.show_message(ST.MsgLevel.WARN,
+                                  TX.msg.n_problem, detail)
 
+        self.run_in_background(CN.crawl_friend_graph, show_result, "crawl")
+
+    @Profiler.wrap("run_visualization")
     def run_visualization(self, p_sql_nm: str):
         """Execute processes to run, display results for selected query.
 
@@ -405,7 +488,9 @@ class Views(object):
                        TX.label.l_getcit_byid,
                        TX.label.l_getcit_bynm,
                        TX.label.l_idf_loc,
-                       TX.label.l_db_refresh]
+                       TX.label.l_db_refresh,
+                       TX.label.l_due_refresh,
+                       TX.label.l_crawl]
 
             for row_num, label_text in enumerate(lbl_txt):
                 ttk.Label(self.collect_frame, text=label_text).grid(
@@ -481,6 +566,20 @@ class Views(object):
                            command=self.refresh_ctizns_from_db).grid(
                                row=4, column=1, sticky=tk.W, padx=5)
 
+            def set_due_refresh_input():
+                """Refresh citizens most likely to have changed."""
+                ttk.Button(self.collect_frame,
+                           text=TX.button.b_get_ctzn_data,
+                           command=self.refresh_due_citizens).grid(
+                               row=5, column=1, sticky=tk.W, padx=5)
+
+            def set_crawl_input():
+                """Crawl outward from the user's friends."""
+                ttk.Button(self.collect_frame,
+                           text=TX.button.b_get_ctzn_data,
+                           command=self.crawl_friend_graph).grid(
+                               row=6, column=1, sticky=tk.W, padx=5)
+
             # set_inputs() main:
             set_friends_list_input()
             set_ctzn_by_id_input()
@@ -488,6 +587,8 @@ class Views(object):
                 set_ctzn_by_nm_input()
             set_id_by_list_input()
             set_db_refresh_input()
+            set_due_refresh_input()
+            set_crawl_input()
 
         # make_collect_frame() MAIN:
         self.close_frame()
@@ -623,12 +724,27 @@ class Views(object):
                                detail="\n{}".format(p_detail))
 
     def make_user_image(self):
-        """Construct the avatar-display."""
+        """Construct the avatar-display.
+
+        The avatar comes from the local image cache. If it is not
+        cached yet, it is downloaded in the background and shown
+        once it arrives.
+        """
         usrd, _ = CN.get_user_db_record()
         ctzd, _ = CN.get_ctzn_db_rec_by_id(usrd.user_erep_profile_id)
-        user_avatar_file =\
-            Image.open(requests.get(ctzd.avatar_link, stream=True).raw)
-        tk_img = ImageTk.PhotoImage(user_avatar_file)
+        if ctzd is None or not ctzd.avatar_link:
+            return
+        tk_img = IC.get_photo(ctzd.avatar_link, IC.MASTER_SIZE)
+        if tk_img is None:
+            future = IC.fetch_async(ctzd.avatar_link)
+
+            def poll():
+                if not future.done():
+                    self.win_root.after(250, poll)
+                elif future.result():
+                    self.make_user_image()
+            poll()
+            return
         user_avatar_img = ttk.Label(self.win_root, image=tk_img)
         user_avatar_img.image = tk_img
         user_avatar_img.place(x=750, y=450)
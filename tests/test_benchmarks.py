@@ -0,0 +1,26 @@
+# coding: utf-8
+"""Smoke test: every benchmark mode runs to completion on tiny inputs."""
+import json
+import os
+import subprocess
+import sys
+from os import path
+
+import pytest
+
+EFRIENDS_DIR = path.join(path.dirname(path.dirname(path.abspath(__file__))),
+                         "efriends")
+BENCH_MODES = ["db", "history", "profiles", "dims", "fingerprints", "collect"]
+
+
+@pytest.mark.parametrize("p_mode", BENCH_MODES)
+def test_bench_mode_runs(p_mode, tmp_path):
+    """Run one benchmark mode with a scratch HOME."""
+    env = dict(os.environ, HOME=str(tmp_path))
+    result = subprocess.run(
+        [sys.executable, "benchmarks.py", p_mode, "--citizens", "10",
+         "--depths", "2", "--lookups", "2"],
+        cwd=EFRIENDS_DIR, env=env, capture_output=True, text=True,
+        timeout=300)
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout)
@@ -0,0 +1,69 @@
+# coding: utf-8
+"""Main database creation and maintenance."""
+import sqlite3 as sq3
+import sys
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(path.dirname(
+    path.abspath(__file__))), "efriends"))
+
+from dbase import Dbase  # noqa: E402
+from utils import Utils  # noqa: E402
+
+
+def test_new_db_is_incremental_auto_vacuum(tmp_path):
+    """auto_vacuum is set before WAL, so a new DB keeps it."""
+    db_file = str(tmp_path / "efriends.db")
+    Dbase(db_file).create_main_db()
+    conn = sq3.connect(db_file)
+    try:
+        assert conn.execute("PRAGMA auto_vacuum;").fetchone()[0] == 2
+        assert conn.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+    finally:
+        conn.close()
+
+
+def test_purge_never_reports_negative_reclaim(tmp_path):
+    """Converting to incremental can grow the file; that is not reclaim."""
+    db_file = str(tmp_path / "efriends.db")
+    dbase = Dbase(db_file)
+    dbase.create_main_db()
+    conn = sq3.connect(db_file)
+    conn.execute("PRAGMA auto_vacuum = NONE;")
+    conn.execute("VACUUM;")
+    conn.close()
+    purge = dbase.purge_db(p_archive=False)
+    assert purge.bytes_reclaimed >= 0
+
+
+def test_upgrade_rewrites_text_flags_in_saved_sql(tmp_path):
+    """Saved 'True'/'False' flag tests become 1/0, re-hashed."""
+    sql = "SELECT name FROM citizen WHERE is_alive = 'True'\n" +\
+        "  AND is_party_member <> \"False\" AND name = 'True';"
+    sql_file = tmp_path / "q0100_alive.sql"
+    sql_file.write_text("-- {}\n-- q0100\n-- Alive\n{}\n".format(
+        Utils.get_hash(sql), sql))
+    Dbase(str(tmp_path / "efriends.db")).create_main_db()
+    lines = sql_file.read_text().splitlines(True)
+    new_sql = "".join(lines[3:]).strip()
+    assert new_sql == "SELECT name FROM citizen WHERE is_alive = 1\n" +\
+        "  AND is_party_member <> 0 AND name = 'True';"
+    assert Utils.get_hash(new_sql) in lines[0]
+
+
+def test_metrics_keep_last_version_per_second(tmp_path):
+    """Two versions in one second leave one sample, the later one."""
+    db_file = str(tmp_path / "efriends.db")
+    dbase = Dbase(db_file)
+    dbase.create_main_db()
+    audit = dict()
+    stmts = list()
+    for xp, frac in ((100, "10000"), (150, "90000")):
+        audit["update_ts"] = "2026-10-19 12:00:00.{} +00:00".format(frac)
+        data = {"profile_id": "1001", "level": 5, "xp": xp,
+                "friends_count": 1, "achievements_count": 0,
+                "militia_size": 0}
+        stmts.append(dbase.set_metrics_sql(data, audit))
+    dbase.execute_txn_sql(stmts)
+    assert [xp for _, xp in dbase.query_metric_series("1001", "xp")] ==\
+        [150]
@@ -0,0 +1,54 @@
+# coding: utf-8
+"""Friends sync against the local eRep stub."""
+import os
+import subprocess
+import sys
+from os import path
+
+EFRIENDS_DIR = path.join(path.dirname(path.dirname(path.abspath(__file__))),
+                         "efriends")
+
+UNFRIEND_SCRIPT = """
+import io
+import sqlite3 as sq3
+from contextlib import redirect_stdout
+from erepstub import ErepStub
+from controls import Controls
+from dbase import Dbase
+stub = ErepStub(None, 10)
+stub.start()
+CN = Controls()
+CN.request_delay = 0
+CN.set_erep_headers()
+CN.set_base_urls(stub.erep_url, stub.etools_url)
+CN.configure_database()
+CN.write_user_rec("1000", "sync@example.com", "sync")
+with redirect_stdout(io.StringIO()):
+    CN.sync_erep_friends("1000")
+    stub.friends = 6
+    CN.sync_erep_friends("1000")
+stub.stop()
+conn = sq3.connect(Dbase().get_main_db())
+print(conn.execute("SELECT COUNT(*) FROM citizen_current_fact"
+                   " WHERE is_user_friend = 1;").fetchone()[0],
+      conn.execute("SELECT COUNT(*) FROM citizen_history_fact"
+                   " WHERE is_user_friend = 1 AND delete_ts IS NULL;"
+                   ).fetchone()[0],
+      conn.execute("SELECT COUNT(*) FROM citizen_history_fact;"
+                   ).fetchone()[0])
+"""
+
+
+def test_sync_unfriends_without_new_versions(tmp_path):
+    """Dropped friends lose the flag in place, with no new version."""
+    env = dict(os.environ, HOME=str(tmp_path))
+    result = subprocess.run(
+        [sys.executable, "-c", UNFRIEND_SCRIPT],
+        cwd=EFRIENDS_DIR, env=env, capture_output=True, text=True,
+        timeout=300)
+    assert result.returncode == 0, result.stderr
+    current, active, versions = [
+        int(n) for n in result.stdout.split()[-3:]]
+    assert current == 6
+    assert active == 6
+    assert versions == 10
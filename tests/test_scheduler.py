@@ -0,0 +1,44 @@
+# coding: utf-8
+"""Scheduled refresh runs stay within their request budget."""
+import os
+import subprocess
+import sys
+from os import path
+
+EFRIENDS_DIR = path.join(path.dirname(path.dirname(path.abspath(__file__))),
+                         "efriends")
+
+BUDGET_SCRIPT = """
+import io
+from contextlib import redirect_stdout
+from erepstub import ErepStub
+from controls import Controls
+from dbase import Dbase
+stub = ErepStub(None, 40, 0, 0, 0.0, 0, 1)
+stub.start()
+CN = Controls()
+CN.request_delay = 0
+CN.set_base_urls(stub.erep_url, stub.etools_url)
+CN.configure_database()
+DB = Dbase()
+job_id = DB.enqueue_refresh_job("scheduled",
+                                [str(i) for i in range(2001, 2031)])
+before = stub.stats["requests"]
+with redirect_stdout(io.StringIO()):
+    CN.refresh_due_citizens(p_budget=7)
+print(stub.stats["requests"] - before, len(DB.query_job_queue(job_id)))
+stub.stop()
+"""
+
+
+def test_resumed_queue_counts_against_budget(tmp_path):
+    """A leftover queue larger than the budget is drained budget-wise."""
+    env = dict(os.environ, HOME=str(tmp_path))
+    result = subprocess.run(
+        [sys.executable, "-c", BUDGET_SCRIPT],
+        cwd=EFRIENDS_DIR, env=env, capture_output=True, text=True,
+        timeout=300)
+    assert result.returncode == 0, result.stderr
+    fetched, left = [int(n) for n in result.stdout.split()[-2:]]
+    assert fetched == 7
+    assert left == 30 - 7